@@ -0,0 +1,199 @@
+# authentication/async_views.py
+"""
+Versiones async (ASGI) de login, logout y las vistas de lectura.
+
+No pasan por DRF: usan el token ya validado por ``JWTAuthenticationMiddleware``
+para construir el ``ClaimsUser`` y el ORM async de Django, de modo que bajo
+ASGI no ocupan un hilo de ``sync_to_async`` por petición. Las respuestas son
+las mismas que las de sus equivalentes en views.py.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate, get_user_model
+from django.http import JsonResponse
+from django.utils import timezone
+from django.conf import settings
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import ClaimsUser
+from .blacklist import BloomRefreshToken, revoke_access_tokens_enabled, revoke_token
+from .claims import has_permissions
+from .etags import change_counters, role_list_etag, user_info_etag
+from .hashing import HashingBusy
+from .models import Role, UserRole
+from .projections import fast_reads_enabled, get_projection
+from .queries import plan_queryset
+from .routes import PERMISSION, PUBLIC, get_request_policy, route_policy
+from .throttling import acheck_throttles, areset_username
+from .serializers import CustomTokenObtainPairSerializer, RoleSerializer, UserInfoSerializer, UserRoleSerializer
+from .views import HASHING_BUSY_RESPONSE, set_auth_cookies
+
+
+User = get_user_model()
+
+
+def async_authenticated(view):
+    """
+    Equivalente async de ``ClaimsJWTAuthentication`` + ``RoutePolicyPermission``:
+    asigna ``request.user`` desde los claims y aplica la política de la ruta.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        token = getattr(request, 'jwt_token', None)
+        if token is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'No autorizado - Token no encontrado'
+            }, status=401)
+
+        request.user = ClaimsUser(token)
+        request.auth = token
+        policy = get_request_policy(request)
+        if policy.kind == PERMISSION:
+            # Bits del token o caché de permisos (el registro puede tener que cargarse)
+            if not await sync_to_async(has_permissions)(request, policy.codenames):
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'No tiene permiso para realizar esta acción'
+                }, status=403)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+# Vista de login asíncrona (ASGI): la consulta del usuario usa el ORM async y
+# la verificación de la contraseña corre en el pool de hashing sin bloquear
+# el event loop. Misma respuesta y cookies que LoginView.
+@route_policy(PUBLIC)
+@csrf_exempt
+@require_POST
+async def login_async(request):
+    try:
+        credentials = json.loads(request.body or b'{}')
+        username, password = credentials['username'], credentials['password']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Se requieren username y password'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Mismo límite y misma respuesta 429 que LoginThrottle, antes de tocar la base
+    wait = await acheck_throttles(request, 'login', username)
+    if wait:
+        throttled = Throttled(wait)
+        return JsonResponse({'detail': str(throttled.detail)}, status=throttled.status_code,
+                            headers={'Retry-After': '%d' % throttled.wait})
+
+    try:
+        user = await aauthenticate(request, username=username, password=password)
+    except HashingBusy:
+        return JsonResponse(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': '1'})
+    if user is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Credenciales inválidas'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
+    await areset_username('login', username)
+    refresh = await sync_to_async(CustomTokenObtainPairSerializer.get_token)(user)
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        await User.objects.filter(pk=user.pk).aupdate(last_login=timezone.now())
+        change_counters.bump(User)  # update() no emite post_save
+
+    response = JsonResponse({
+        'status': 'success',
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_active': user.is_active,
+        },
+        'message': 'Login exitoso'
+    })
+    return set_auth_cookies(response, str(refresh.access_token), str(refresh))
+
+
+# Vista async para información del usuario actual
+@cache_control(private=True, no_cache=True)
+@require_GET
+@async_authenticated
+@condition(etag_func=user_info_etag)
+async def get_user_info_async(request):
+    if fast_reads_enabled():
+        projection = get_projection(UserInfoSerializer, exclude=('roles',))
+        data = projection.row(await User.objects.values(*projection.columns).aget(pk=request.user.id))
+        data['roles'] = await get_projection(RoleSerializer).arows(
+            Role.objects.filter(user_roles__user_id=request.user.id, is_active=True)
+        )
+        return JsonResponse({'status': 'success', 'user': data})
+    user = await User.objects.aget(pk=request.user.id)
+    roles = [role async for role in Role.objects.filter(user_roles__user_id=user.id, is_active=True)]
+    serializer = UserInfoSerializer(user, context={'roles': roles})
+    return JsonResponse({
+        'status': 'success',
+        'user': serializer.data
+    })
+
+
+# Vista async para obtener roles del usuario
+@require_GET
+@async_authenticated
+async def get_user_roles_async(request):
+    user_roles = plan_queryset(
+        UserRole.objects.filter(user_id=request.user.id, role__is_active=True),
+        UserRoleSerializer
+    )
+    user_roles = [user_role async for user_role in user_roles]
+    return JsonResponse(UserRoleSerializer(user_roles, many=True).data, safe=False)
+
+
+# Vista async para listar roles
+@cache_control(private=True, max_age=getattr(settings, 'ROLE_LIST_MAX_AGE', 30))
+@require_GET
+@async_authenticated
+@condition(etag_func=role_list_etag)
+async def role_list_async(request):
+    if fast_reads_enabled():
+        roles = await get_projection(RoleSerializer).arows(Role.objects.filter(is_active=True))
+        return JsonResponse(roles, safe=False)
+    roles = [role async for role in Role.objects.filter(is_active=True)]
+    return JsonResponse(RoleSerializer(roles, many=True).data, safe=False)
+
+
+# Vista async de Logout
+@csrf_exempt
+@require_POST
+@async_authenticated
+async def logout_async(request):
+    try:
+        # Obtener el token de refresco de la cookie
+        refresh_token = request.COOKIES.get('refresh_token')
+        if refresh_token:
+            token = await sync_to_async(BloomRefreshToken)(refresh_token)
+            await sync_to_async(token.blacklist)()
+
+        if revoke_access_tokens_enabled():
+            await sync_to_async(revoke_token)(request.user.token)
+
+        response = JsonResponse({
+            'status': 'success',
+            'message': 'Logout exitoso'
+        })
+
+        # Eliminar las cookies
+        response.delete_cookie('access_token')
+        response.delete_cookie('refresh_token')
+
+        return response
+    except Exception:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Error al cerrar sesión'
+        }, status=400)
@@ -0,0 +1,99 @@
+# authentication/authentication.py
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework import HTTP_HEADER_ENCODING
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import revoke_access_tokens_enabled, revoked_tokens
+
+
+User = get_user_model()
+
+
+def get_raw_token(request):
+    """
+    Obtiene el token de acceso sin validar: primero de la cookie HttpOnly
+    ``access_token`` y, si no existe, del encabezado ``Authorization: Bearer``.
+    """
+    raw_token = request.COOKIES.get('access_token')
+    if raw_token:
+        return raw_token
+
+    header = request.META.get(api_settings.AUTH_HEADER_NAME, '')
+    if isinstance(header, bytes):
+        header = header.decode(HTTP_HEADER_ENCODING)
+    parts = header.split()
+    if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+        return parts[1]
+    return None
+
+
+class ClaimsUser(TokenUser):
+    """
+    Usuario ligero construido a partir de los claims del token de acceso
+    (id, username, email, is_staff, roles, perms; ver ``CustomTokenObtainPairSerializer``).
+
+    Los atributos que no vienen en el token (``last_login``, ``user_roles``,
+    ``password``...) se resuelven cargando el ``User`` real la primera vez que
+    se piden, así que las vistas de sólo lectura que usan los claims no hacen
+    ninguna consulta a ``auth_user``.
+    """
+
+    def __str__(self):
+        return self.username
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def roles(self):
+        return list(self.token.get('roles', []))
+
+    @cached_property
+    def user(self):
+        """
+        Instancia real del modelo ``User``, cargada bajo demanda.
+        """
+        return User.objects.get(**{api_settings.USER_ID_FIELD: self.id})
+
+    def save(self, *args, **kwargs):
+        return self.user.save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        return self.user.set_password(raw_password)
+
+    def check_password(self, raw_password):
+        return self.user.check_password(raw_password)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Autenticación DRF que reutiliza el token ya validado por
+    ``JWTAuthenticationMiddleware`` (``request.jwt_token``), de modo que cada
+    petición se decodifica una sola vez. Si el middleware no se ejecutó
+    (p. ej. en rutas públicas), valida el token de la cookie o del encabezado.
+    """
+
+    def authenticate(self, request):
+        validated_token = getattr(request._request, 'jwt_token', None)
+        if validated_token is None:
+            raw_token = get_raw_token(request)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            # Sin el middleware, la revocación de tokens de acceso se revisa aquí
+            if revoke_access_tokens_enabled() and revoked_tokens.is_revoked(validated_token[api_settings.JTI_CLAIM]):
+                raise InvalidToken('Token revocado')
+
+        return self.get_user(validated_token), validated_token
@@ -0,0 +1,107 @@
+# authentication/benchmarking.py
+"""
+Utilidades mínimas para micro-benchmarks.
+
+Cada app puede declarar sus casos en un módulo ``benchmarks.py`` usando el
+decorador ``benchmark``; el comando ``python manage.py bench`` los descubre y
+los ejecuta sobre una base de datos de pruebas desechable. Los resultados se
+pueden guardar como línea base en JSON y compararse en corridas posteriores
+(``compare``) para detectar regresiones.
+"""
+import json
+import statistics
+import time
+
+
+registry = {}
+
+
+def benchmark(name):
+    """
+    Registra una función como benchmark con el nombre dado. La función recibe
+    el número de iteraciones y retorna una lista de resultados (ver ``measure``).
+    """
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def percentile(samples, pct):
+    """
+    Percentil ``pct`` (0-100) de una lista de muestras ya ordenada.
+    """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def summarize(label, samples):
+    """
+    Resume una lista de duraciones (segundos) en microsegundos y ops/seg.
+    """
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        'label': label,
+        'iterations': len(samples),
+        'mean_us': statistics.fmean(samples) * 1e6 if samples else 0.0,
+        'p50_us': percentile(samples, 50) * 1e6,
+        'p95_us': percentile(samples, 95) * 1e6,
+        'p99_us': percentile(samples, 99) * 1e6,
+        'ops_per_sec': len(samples) / total if total else 0.0,
+    }
+
+
+def measure(label, func, iterations, warmup=None):
+    """
+    Ejecuta ``func`` ``iterations`` veces (más un calentamiento) y retorna el
+    resumen de latencias.
+    """
+    for _ in range(warmup if warmup is not None else min(iterations, 50)):
+        func()
+
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        start = clock()
+        func()
+        samples.append(clock() - start)
+    return summarize(label, samples)
+
+
+def save_baseline(path, results, metric='p50_us'):
+    """
+    Guarda ``{benchmark: [resultado, ...]}`` como línea base en JSON.
+    """
+    data = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'metric': metric,
+        'results': {name: {result['label']: result for result in runs} for name, runs in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(data, baseline, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def compare(results, baseline, threshold=0.2, metric=None):
+    """
+    Compara ``{benchmark: [resultado, ...]}`` con una línea base. Retorna las
+    regresiones ``(benchmark, etiqueta, antes, ahora)``: casos cuyo
+    ``metric`` (por defecto el de la línea base) creció más de ``threshold``
+    (0.2 = 20 %). Los casos que no están en la línea base se ignoran.
+    """
+    metric = metric or baseline.get('metric', 'p50_us')
+    regressions = []
+    for name, runs in results.items():
+        previous = baseline['results'].get(name, {})
+        for result in runs:
+            before = previous.get(result['label'], {}).get(metric)
+            if before and result[metric] > before * (1 + threshold):
+                regressions.append((name, result['label'], before, result[metric]))
+    return regressions
@@ -0,0 +1,696 @@
+# authentication/benchmarks.py
+"""
+Benchmarks de la app authentication. Ejecutar con ``python manage.py bench``.
+"""
+import asyncio
+import itertools
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections, transaction
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.sqlite import sqlite_options
+from . import views
+from .authentication import ClaimsJWTAuthentication
+from .benchmarking import benchmark, measure, summarize
+from .blacklist import RevokedTokens
+from .hashing import HashingBusy, OffloadedModelBackend
+from .menus import MenuTreeCache
+from .models import Menu, Role, UserRole
+from .routes import RouteTable
+from .serializers import CustomTokenObtainPairSerializer, MenuSerializer
+from .testing import register_sqlite_alias, unregister_alias
+
+
+User = get_user_model()
+
+
+def get_bench_user(username='bench'):
+    user, created = User.objects.get_or_create(username=username, defaults={'email': '%s@example.com' % username})
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return user
+
+
+def get_access_token(user):
+    return str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+
+@benchmark('jwt')
+def bench_jwt(iterations):
+    """
+    Costo de autenticar una petición: antes (middleware + JWTAuthentication,
+    dos decodificaciones y un SELECT a auth_user) y después (una decodificación
+    en el middleware reutilizada por ClaimsJWTAuthentication, sin consultas).
+    """
+    raw_token = get_access_token(get_bench_user())
+    factory = RequestFactory()
+
+    def before():
+        request = factory.get('/auth/roles/', HTTP_AUTHORIZATION='Bearer %s' % raw_token)
+        AccessToken(raw_token)
+        JWTAuthentication().authenticate(Request(request))
+
+    def after():
+        request = factory.get('/auth/roles/')
+        request.jwt_token = AccessToken(raw_token)
+        user, _ = ClaimsJWTAuthentication().authenticate(Request(request))
+        user.username
+
+    results = [
+        measure('auth layer (antes)', before, iterations),
+        measure('auth layer (después)', after, iterations),
+    ]
+
+    client = Client(HTTP_AUTHORIZATION='Bearer %s' % raw_token)
+    client.cookies['access_token'] = raw_token
+    with mock.patch.object(views.role_list.cls, 'authentication_classes', [JWTAuthentication]):
+        results.append(measure('GET /auth/roles/ (antes)', lambda: client.get('/auth/roles/'), iterations))
+    results.append(measure('GET /auth/roles/ (después)', lambda: client.get('/auth/roles/'), iterations))
+    return results
+
+
+@benchmark('routes')
+def bench_routes(iterations, prefixes=500):
+    """
+    Resolución de la política de una ruta con cientos de prefijos registrados:
+    búsqueda lineal con ``startswith`` (middleware anterior) contra el trie,
+    en frío (sin memo) y en caliente (lru_cache).
+    """
+    public_urls = ['/api/v1/modulo%d/recurso%d/' % (i // 10, i) for i in range(prefixes)]
+    table = RouteTable()
+    for url in public_urls:
+        table.add(url, 'public')
+    path = '/auth/roles/user/'  # Ruta no pública: la búsqueda lineal recorre toda la lista
+
+    return [
+        measure('startswith lineal (%d prefijos)' % prefixes,
+                lambda: any(path.startswith(url) for url in public_urls), iterations),
+        measure('trie sin memo', lambda: table._match(path), iterations),
+        measure('trie con memo', lambda: table.match(path), iterations),
+    ]
+
+
+def seed_menus(total=2000, fan_out=8, roles=None):
+    """
+    Crea un árbol de ``total`` menús con ``fan_out`` hijos por nodo, cada uno
+    asignado a todos los ``roles`` dados.
+    """
+    roles = roles or [Role.objects.create(name='Menú bench')]
+    menus = Menu.objects.bulk_create(
+        Menu(name='Menú %d' % i, path='/m%d' % i, component='View%d' % i, sort_order=i % fan_out)
+        for i in range(total)
+    )
+    for i, menu in enumerate(menus[1:], start=1):
+        menu.parent_id = menus[(i - 1) // fan_out].id
+    Menu.objects.bulk_update(menus[1:], ['parent'])
+    Menu.roles.through.objects.bulk_create(
+        Menu.roles.through(menu_id=menu.id, role_id=role.id) for menu in menus for role in roles
+    )
+    return menus, roles
+
+
+@benchmark('menus')
+def bench_menus(iterations, total=2000):
+    """
+    Árbol de navegación de 2k nodos: MenuSerializer recursivo (N+1), carga y
+    construcción del árbol en frío (dos consultas) y respuesta desde caché.
+    """
+    menus, roles = seed_menus(total)
+    role_ids = {role.id for role in roles}
+    cache = MenuTreeCache()
+
+    def cold():
+        cache.invalidate()
+        cache.render(role_ids)
+
+    return [
+        measure('MenuSerializer recursivo', lambda: MenuSerializer(menus[0]).data,
+                min(iterations, 5), warmup=1),
+        measure('árbol en frío (2 consultas)', cold, min(iterations, 100), warmup=5),
+        measure('árbol en caché', lambda: cache.render(role_ids), iterations),
+    ]
+
+
+@benchmark('bulk')
+def bench_bulk(iterations, size=200):
+    """
+    Alta de ``size`` usuarios y ``size`` asignaciones de rol: una petición por
+    elemento contra una sola petición masiva. Cada operación medida es un lote
+    completo. Se usa MD5 como hasher para medir el costo de HTTP y base de
+    datos, no el de PBKDF2 (igual en ambos caminos).
+    """
+    admin = get_bench_user('bench-admin')
+    raw_token = get_access_token(admin)
+    client = Client()
+    client.cookies['access_token'] = raw_token
+    role = Role.objects.create(name='Bulk bench')
+    counter = itertools.count()
+
+    def new_users():
+        batch = next(counter)
+        return [
+            {'username': 'b%d-%d' % (batch, i), 'email': 'b%d-%d@example.com' % (batch, i), 'password': 'Cl4ve-Segura!'}
+            for i in range(size)
+        ]
+
+    def single_users():
+        for item in new_users():
+            client.post('/auth/create/', item, content_type='application/json')
+
+    def bulk_users():
+        client.post('/auth/create/bulk/', new_users(), content_type='application/json')
+
+    def assignments():
+        UserRole.objects.filter(role=role).delete()
+        user_ids = User.objects.order_by('-id').values_list('id', flat=True)[:size]
+        return [{'user_id': user_id, 'role_id': role.id} for user_id in user_ids]
+
+    def single_assign():
+        for item in assignments():
+            client.post('/auth/roles/assign/', item, content_type='application/json')
+
+    def bulk_assign():
+        client.post('/auth/roles/assign/bulk/', assignments(), content_type='application/json')
+
+    iterations = min(iterations, 5)
+    with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+        return [
+            measure('%d usuarios, uno por petición' % size, single_users, iterations, warmup=1),
+            measure('%d usuarios, petición masiva' % size, bulk_users, iterations, warmup=1),
+            measure('%d roles, uno por petición' % size, single_assign, iterations, warmup=1),
+            measure('%d roles, petición masiva' % size, bulk_assign, iterations, warmup=1),
+        ]
+
+
+@benchmark('logins')
+def bench_logins(iterations, levels=(1, 4, 16)):
+    """
+    Logins por segundo con distintos niveles de concurrencia (hilos que llaman
+    a OffloadedModelBackend.authenticate) con el hasher vigente. Las peticiones
+    rechazadas por la cola de hashing (503) se reportan en la etiqueta.
+    """
+    logins = min(iterations, 16)
+    backend = OffloadedModelBackend()
+    encoded = make_password('Cl4ve-Segura!')
+    User.objects.filter(username__startswith='login-').delete()
+    User.objects.bulk_create(User(username='login-%d' % i, password=encoded) for i in range(logins))
+    label = '%s %d it.' % (PBKDF2PasswordHasher.algorithm, settings.PASSWORD_HASH_ITERATIONS)
+
+    def login(i):
+        start = time.perf_counter()
+        try:
+            backend.authenticate(None, username='login-%d' % i, password='Cl4ve-Segura!')
+        except HashingBusy:
+            return None
+        return time.perf_counter() - start
+
+    results = []
+    for level in levels:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(level) as pool:
+            samples = list(pool.map(login, range(logins)))
+        wall = time.perf_counter() - start
+        ok = [sample for sample in samples if sample is not None]
+        result = summarize('%s, %d concurrentes (%d rechazados)' % (label, level, len(samples) - len(ok)), ok)
+        result['ops_per_sec'] = len(ok) / wall
+        results.append(result)
+    return results
+
+
+@benchmark('sqlite')
+def bench_sqlite(iterations, threads=8):
+    """
+    Escrituras concurrentes sobre una base SQLite en archivo: ``threads``
+    hilos que mezclan logins (UPDATE de last_login), asignaciones de roles
+    (transacción que lee y luego inserta) y lecturas de roles, con el perfil
+    por defecto de Django y con el de settings.py (WAL, IMMEDIATE, busy
+    timeout). Los "database is locked" se reportan en la etiqueta.
+    """
+    operations = max(50, min(iterations, 400))
+    profiles = [
+        ('django por defecto', {}),
+        ('perfil ajustado', sqlite_options(settings.SQLITE_PRAGMAS, settings.SQLITE_BUSY_TIMEOUT)),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for index, (label, options) in enumerate(profiles):
+            alias = 'bench_sqlite_%d' % index
+            register_sqlite_alias(alias, '%s/%s.sqlite3' % (directory, alias), options)
+            call_command('migrate', database=alias, verbosity=0)
+            users = User.objects.using(alias).bulk_create(User(username='u-%d' % i) for i in range(threads * 4))
+            roles = Role.objects.using(alias).bulk_create(Role(name='rol-%d' % i) for i in range(20))
+
+            def worker(seed):
+                rng = random.Random(seed)
+                samples, errors = [], 0
+                for _ in range(operations // threads):
+                    user, role = rng.choice(users), rng.choice(roles)
+                    kind = rng.random()
+                    start = time.perf_counter()
+                    try:
+                        if kind < 0.4:
+                            User.objects.using(alias).filter(pk=user.pk).update(last_login=timezone.now())
+                        elif kind < 0.7:
+                            with transaction.atomic(using=alias):
+                                query = UserRole.objects.using(alias).filter(user=user, role=role)
+                                if query.exists():
+                                    query.delete()
+                                else:
+                                    UserRole.objects.using(alias).create(user=user, role=role, assigned_by=user)
+                        else:
+                            list(Role.objects.using(alias).values_list('name', flat=True))
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    samples.append(time.perf_counter() - start)
+                connections[alias].close()
+                return samples, errors
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                outcomes = list(pool.map(worker, range(threads)))
+            wall = time.perf_counter() - start
+            samples = [sample for thread_samples, _ in outcomes for sample in thread_samples]
+            errors = sum(thread_errors for _, thread_errors in outcomes)
+            result = summarize('%s (%d bloqueos)' % (label, errors), samples)
+            result['ops_per_sec'] = len(samples) / wall
+            results.append(result)
+            unregister_alias(alias)
+    return results
+
+
+@benchmark('asgi')
+def bench_asgi(iterations, levels=(1, 10, 50)):
+    """
+    Peticiones por segundo bajo ASGI (AsyncClient) con 1, 10 y 50 peticiones
+    concurrentes: vistas DRF síncronas (cada una ocupa el hilo de
+    sync_to_async) contra las versiones de async_views.py.
+    """
+    user = get_bench_user()
+    for name in ('ASGI bench A', 'ASGI bench B'):
+        UserRole.objects.get_or_create(user=user, role=Role.objects.get_or_create(name=name)[0])
+    raw_token = get_access_token(user)
+    requests = min(iterations, 500)
+    routes = [
+        ('info', '/auth/info/', '/auth/info/async/'),
+        ('roles', '/auth/roles/', '/auth/roles/async/'),
+    ]
+
+    async def run(url, level):
+        client = AsyncClient()
+        client.cookies['access_token'] = raw_token
+        semaphore = asyncio.Semaphore(level)
+        clock = time.perf_counter
+
+        async def one():
+            async with semaphore:
+                start = clock()
+                await client.get(url)
+                return clock() - start
+
+        await one()
+        start = clock()
+        samples = await asyncio.gather(*(one() for _ in range(requests)))
+        return samples, clock() - start
+
+    results = []
+    for name, sync_url, async_url in routes:
+        for label, url in (('sync', sync_url), ('async', async_url)):
+            for level in levels:
+                samples, wall = asyncio.run(run(url, level))
+                result = summarize('%s %s, %d concurrentes' % (name, label, level), samples)
+                result['ops_per_sec'] = len(samples) / wall
+                results.append(result)
+    return results
+
+
+def seed_blacklist(size, batch_size=50000):
+    """
+    Inserta ``size`` tokens revocados (sin el JWT completo) y retorna sus jti.
+    """
+    expires_at = timezone.now() + timedelta(days=1)
+    jtis = [uuid.uuid4().hex for _ in range(size)]
+    for start in range(0, size, batch_size):
+        with transaction.atomic():
+            outstanding = OutstandingToken.objects.bulk_create(
+                OutstandingToken(jti=jti, token='', expires_at=expires_at)
+                for jti in jtis[start:start + batch_size]
+            )
+            BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in outstanding)
+    return jtis
+
+
+@benchmark('blacklist')
+def bench_blacklist(iterations, size=1000000):
+    """
+    Verificación de la lista negra con ``size`` tokens revocados: consulta
+    directa a BlacklistedToken (simplejwt) contra el filtro de Bloom de
+    RevokedTokens, para jti no revocados (el caso común) y revocados. Las
+    etiquetas incluyen la memoria del filtro frente a un ``set`` de jti y el
+    tiempo de reconstrucción completa.
+    """
+    jtis = seed_blacklist(size)
+    tokens = RevokedTokens(capacity=size, refresh_interval=3600, rebuild_interval=3600)
+    start = time.perf_counter()
+    tokens.rebuild()
+    rebuild = time.perf_counter() - start
+    stats = tokens.stats()
+    set_bytes = sys.getsizeof(set(jtis)) + sum(sys.getsizeof(jti) for jti in jtis)
+
+    misses = (uuid.uuid4().hex for _ in itertools.count())
+    hits = itertools.cycle(jtis[::max(1, size // 1000)])
+    exists = BlacklistedToken.objects.filter
+    return [
+        measure('simplejwt, no revocado', lambda: exists(token__jti=next(misses)).exists(), iterations),
+        measure('simplejwt, revocado', lambda: exists(token__jti=next(hits)).exists(), iterations),
+        measure('bloom, no revocado', lambda: tokens.is_revoked(next(misses)), iterations),
+        measure('bloom, revocado', lambda: tokens.is_revoked(next(hits)), iterations),
+        dict(summarize('rebuild %d jti (%.1fs)' % (stats['entries'], rebuild), [rebuild]),
+             label='filtro %.1f MB (%d hashes) vs set %.1f MB; rebuild %.1fs' % (
+                 stats['bytes'] / 2 ** 20, stats['hashes'], set_bytes / 2 ** 20, rebuild)),
+    ]
+
+
+@benchmark('metrics')
+def bench_metrics(iterations):
+    """
+    Sobrecarga de RequestMetricsMiddleware en GET /auth/roles/: sin el
+    middleware, con la fracción de muestreo configurada y midiendo todas las
+    peticiones.
+    """
+    raw_token = get_access_token(get_bench_user())
+    cases = [
+        ('sin métricas', {'METRICS_ENABLED': False}),
+        ('muestreo %g' % settings.METRICS_SAMPLE_RATE, {'METRICS_ENABLED': True}),
+        ('muestreo 1', {'METRICS_ENABLED': True, 'METRICS_SAMPLE_RATE': 1.0}),
+    ]
+    clients = []
+    for label, overrides in cases:
+        with override_settings(**overrides):
+            # El middleware se instancia con la primera petición del cliente
+            client = Client()
+            client.cookies['access_token'] = raw_token
+            client.get('/auth/roles/')
+            clients.append((label, client))
+
+    # Rondas intercaladas para que el ruido afecte por igual a los tres casos
+    samples = {label: [] for label, _ in cases}
+    clock = time.perf_counter
+    for _ in range(iterations):
+        for label, client in clients:
+            start = clock()
+            client.get('/auth/roles/')
+            samples[label].append(clock() - start)
+    return [summarize(label, samples[label]) for label, _ in cases]
+
+
+@benchmark('etags')
+def bench_etags(iterations, roles=50):
+    """
+    Consola que refresca roles, usuario actual y menú sin cambios: respuesta
+    completa contra revalidación con If-None-Match (304). La etiqueta incluye
+    los bytes del cuerpo y el tiempo de CPU por petición.
+    """
+    user = get_bench_user()
+    for i in range(roles):
+        role = Role.objects.get_or_create(name='ETag bench %02d' % i, defaults={'description': 'Rol de prueba ' * 4})[0]
+        if i < 5:
+            UserRole.objects.get_or_create(user=user, role=role)
+            Menu.objects.get_or_create(name='ETag bench %d' % i, path='/etag/%d' % i, component='Bench')[0].roles.add(role)
+    client = Client()
+    client.cookies['access_token'] = get_access_token(user)
+
+    results = []
+    for url in ('/auth/roles/', '/auth/info/', '/auth/menus/'):
+        response = client.get(url)
+        for label, headers in (('completa', {}), ('304', {'HTTP_IF_NONE_MATCH': response['ETag']})):
+            size = len(client.get(url, **headers).content)
+            cpu = time.process_time()
+            result = measure('%s %s' % (url, label), lambda: client.get(url, **headers), iterations, warmup=0)
+            cpu = (time.process_time() - cpu) / iterations
+            result['label'] += ' (%d B, cpu %.0fus)' % (size, cpu * 1e6)
+            results.append(result)
+    return results
+
+
+@benchmark('reads')
+def bench_reads(iterations, roles=200, users=500):
+    """
+    Listados de roles y usuarios (página de ``users``): serializadores DRF con
+    JSONRenderer contra proyecciones ``.values()`` con FastJSONRenderer
+    (orjson si está instalado), a nivel de función y de endpoint.
+    """
+    from rest_framework.renderers import JSONRenderer
+    from .projections import get_projection
+    from .renderers import FastJSONRenderer, orjson
+    from .serializers import RoleSerializer, UserSerializer
+
+    Role.objects.bulk_create(
+        [Role(name='Lectura bench %03d' % i, description='Rol de prueba número %d' % i) for i in range(roles)],
+        ignore_conflicts=True,
+    )
+    User.objects.bulk_create(
+        [User(username='lectura%04d' % i, email='lectura%04d@example.com' % i) for i in range(users)],
+        ignore_conflicts=True,
+    )
+    role_qs = Role.objects.filter(is_active=True)
+    user_qs = User.objects.order_by('id')[:users]
+    stdlib, fast = JSONRenderer(), FastJSONRenderer()
+    client = Client()
+    client.cookies['access_token'] = get_access_token(get_bench_user())
+    role_url, user_url = '/auth/roles/', '/auth/list/?page_size=%d' % users
+
+    def endpoint(url, fast_reads):
+        with override_settings(FAST_READ_PATHS=fast_reads, REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_RENDERER_CLASSES': ['authentication.renderers.FastJSONRenderer' if fast_reads
+                                         else 'rest_framework.renderers.JSONRenderer'],
+        }):
+            return measure('%s %s' % (url, 'rápido' if fast_reads else 'DRF'), lambda: client.get(url), iterations)
+
+    encoder = 'orjson' if orjson is not None else 'json'
+    return [
+        measure('roles serializador + json', lambda: stdlib.render(RoleSerializer(role_qs, many=True).data), iterations),
+        measure('roles proyección + %s' % encoder, lambda: fast.render(get_projection(RoleSerializer).rows(role_qs)),
+                iterations),
+        measure('usuarios serializador + json', lambda: stdlib.render(UserSerializer(user_qs, many=True).data),
+                iterations),
+        measure('usuarios proyección + %s' % encoder, lambda: fast.render(get_projection(UserSerializer).rows(user_qs)),
+                iterations),
+        endpoint(role_url, False),
+        endpoint(role_url, True),
+        endpoint(user_url, False),
+        endpoint(user_url, True),
+    ]
+
+
+@benchmark('claims')
+def bench_claims(iterations, permissions=250):
+    """
+    Permisos en el token con ``permissions`` codenames registrados y todos
+    otorgados: tamaño del token (sin permisos, con la lista de codenames y
+    con la máscara) y costo de verificar un permiso con los bits del token,
+    con la caché de permisos en caliente y en frío.
+    """
+    from .cache import get_effective_permissions, permissions_cache
+    from .claims import PERMISSIONS_CLAIM, PERMISSIONS_VERSION_CLAIM, permission_registry, token_has_permissions
+    from .models import Permission, RolePermission
+
+    user = get_bench_user()
+    role = Role.objects.get_or_create(name='Claims bench')[0]
+    Permission.objects.bulk_create(
+        [Permission(name='Claims bench %03d' % i, codename='claims_bench_%03d' % i) for i in range(permissions)],
+        ignore_conflicts=True,
+    )
+    RolePermission.objects.bulk_create(
+        [RolePermission(role=role, permission=permission)
+         for permission in Permission.objects.filter(codename__startswith='claims_bench_')],
+        ignore_conflicts=True,
+    )
+    UserRole.objects.get_or_create(user=user, role=role)
+    permissions_cache.invalidate_all()
+    permission_registry.invalidate()
+
+    token = CustomTokenObtainPairSerializer.get_token(user).access_token
+    plain = AccessToken(str(token))
+    for claim in (PERMISSIONS_CLAIM, PERMISSIONS_VERSION_CLAIM):
+        del plain[claim]
+    listed = AccessToken(str(plain))
+    listed['permissions'] = sorted(get_effective_permissions(user).permissions)
+    sizes = ', '.join('%s %d B' % (label, len(str(value))) for label, value in (
+        ('sin permisos', plain), ('codenames', listed), ('máscara', token),
+    ))
+    required = frozenset({'claims_bench_%03d' % (permissions - 1)})
+
+    def cold():
+        permissions_cache.invalidate_all()
+        return required <= get_effective_permissions(user).permissions
+
+    return [
+        measure('bits del token (%s)' % sizes, lambda: token_has_permissions(token, required, user), iterations),
+        measure('caché en caliente', lambda: required <= get_effective_permissions(user).permissions, iterations),
+        measure('caché en frío (2 consultas)', cold, iterations),
+    ]
+
+
+@benchmark('throttle')
+def bench_throttle(iterations, keys=100000):
+    """
+    Límite de intentos de login: costo de ``hit`` (clave existente, clave
+    nueva con la tabla llena y caché de Django en memoria), sobrecarga en
+    POST /auth/login/ (MD5, login exitoso), costo de un rechazo y memoria
+    con ``keys`` IPs registradas contra un dict de listas de tiempos.
+    """
+    import tracemalloc
+    from . import throttling
+    from .throttling import CacheSlidingWindow, SlidingWindow
+
+    ips = ['10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255) for i in range(keys)]
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    window = SlidingWindow(5, 60, 60, 3600, max_keys=keys)
+    for ip in ips:
+        window.hit(ip)
+    compact = tracemalloc.get_traced_memory()[0] - start
+    start = tracemalloc.get_traced_memory()[0]
+    lists = {ip: [time.monotonic() for _ in range(5)] for ip in ips}
+    naive = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del lists
+    memory = '%d claves: %.1f MB anillos, %.1f MB dict de listas' % (keys, compact / 1e6, naive / 1e6)
+
+    fresh = itertools.count()
+    # Límites que no se alcanzan: se mide el costo de contar, no el rechazo
+    limit = iterations * 2 + 100
+    cached = CacheSlidingWindow(limit, 60, cache_alias='default', prefix='bench')
+    data = {'username': 'throttle', 'password': 'Cl4ve-Segura!'}
+    client = Client()
+
+    # Rondas intercaladas: el costo del login varía más que el del límite
+    samples = {False: [], True: []}
+    clock = time.perf_counter
+    with override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        LOGIN_THROTTLE_RATES={'login-ip': (limit, 60), 'login-username': (limit, 60)},
+    ):
+        user = get_bench_user('throttle')
+        user.set_password('Cl4ve-Segura!')
+        user.save()
+        for _ in range(iterations):
+            for enabled in (False, True):
+                with mock.patch.object(throttling, 'throttling_enabled', lambda: enabled):
+                    start = clock()
+                    client.post('/auth/login/', data, content_type='application/json')
+                    samples[enabled].append(clock() - start)
+    with override_settings(LOGIN_THROTTLE_RATES={'login-ip': (1, 3600)}):
+        client.post('/auth/login/', data, content_type='application/json')
+        rejected = measure('POST /auth/login/ rechazado (429)',
+                           lambda: client.post('/auth/login/', data, content_type='application/json'), iterations)
+    return [
+        measure('hit clave existente (%s)' % memory, lambda: window.hit(ips[0]), iterations),
+        measure('hit clave nueva, tabla llena', lambda: window.hit('nueva-%d' % next(fresh)), iterations),
+        measure('hit caché de Django (locmem)', lambda: cached.hit('10.0.0.1'), iterations),
+        summarize('POST /auth/login/ sin límite', samples[False]),
+        summarize('POST /auth/login/ con límite', samples[True]),
+        rejected,
+    ]
+
+
+@benchmark('registration')
+def bench_registration(iterations, users=1000000):
+    """
+    Verificación de unicidad del registro con ``users`` usuarios: un
+    ``exists()`` por campo (con índice exacto de email y con ``iexact``, que
+    recorre la tabla) contra la consulta combinada de ``find_taken``. También
+    POST /auth/register/ e importación de 100 registros (MD5) y el costo de
+    traducir un choque en el INSERT.
+    """
+    from django.db import connection
+    from rest_framework.exceptions import ValidationError
+    from .registration import find_taken, save_new_user
+    from .seeding import SeedGenerator
+
+    generator = SeedGenerator(prefix='registro', chunk_size=50000)
+    start = time.perf_counter()
+    generator.users(users)
+    seeded = time.perf_counter() - start
+    # Emails en mayúsculas: el registro los debe reconocer igual
+    probes = itertools.cycle([
+        (generator.username(i), '%s@example.com' % generator.username(i).upper())
+        for i in range(0, users, max(1, users // 1000))
+    ])
+    fresh = itertools.count()
+
+    def per_field(lookup):
+        def check():
+            username, email = next(probes)
+            return (User.objects.filter(username=username).exists(),
+                    User.objects.filter(**{lookup: email}).exists())
+        return check
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE INDEX bench_user_email_idx ON auth_user (email)')
+    exact = measure('exists() por campo, índice exacto', per_field('email'), iterations)
+    with connection.cursor() as cursor:
+        cursor.execute('DROP INDEX bench_user_email_idx')
+    scans = min(iterations, 20)
+    iexact = measure('exists() por campo, email__iexact (SCAN)', per_field('email__iexact'), scans, warmup=1)
+
+    def combined():
+        username, email = next(probes)
+        return find_taken([username], [email])
+    combined = measure('find_taken (una consulta, %d usuarios en %.0fs)' % (users, seeded), combined, iterations)
+
+    def conflict():
+        username, email = next(probes)
+        try:
+            save_new_user(User(username=username, email=email.lower()))
+        except ValidationError:
+            pass
+
+    client = Client()
+
+    def register():
+        username = 'nuevo-%d' % next(fresh)
+        return client.post('/auth/register/', {
+            'username': username, 'email': '%s@example.com' % username,
+            'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!',
+        }, content_type='application/json')
+
+    def import_batch():
+        batch = next(fresh)
+        return client.post('/auth/create/import/', [{
+            'username': 'importado-%d-%d' % (batch, i), 'email': 'importado-%d-%d@example.com' % (batch, i),
+            'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!',
+        } for i in range(100)], content_type='application/json')
+
+    with override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], LOGIN_THROTTLE_ENABLED=False,
+    ):
+        admin = get_bench_user('registro-admin')
+        client.cookies['access_token'] = get_access_token(admin)
+        results = [
+            exact, iexact, combined,
+            measure('choque en el INSERT (traducido)', conflict, iterations),
+            measure('POST /auth/register/', register, iterations),
+            measure('POST /auth/create/import/ (100 registros)', import_batch, max(1, iterations // 10)),
+        ]
+    return results
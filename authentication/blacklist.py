@@ -0,0 +1,265 @@
+# authentication/blacklist.py
+"""
+Lista negra de tokens con un filtro de Bloom en memoria.
+
+``token_blacklist`` de simplejwt consulta ``BlacklistedToken`` cada vez que se
+valida un refresh token. ``RevokedTokens`` mantiene en cada proceso un filtro
+de Bloom con los ``jti`` revocados: si el ``jti`` no está en el filtro el token
+no está revocado (sin consulta); sólo ante un acierto del filtro se confirma
+contra la base de datos. El filtro se actualiza en forma incremental (filas
+nuevas por id) cada ``TOKEN_BLACKLIST_REFRESH_INTERVAL`` segundos y se
+reconstruye completo cada ``TOKEN_BLACKLIST_REBUILD_INTERVAL`` segundos, tras
+una compactación o cuando supera su capacidad.
+
+Con ``TOKEN_BLACKLIST_REVOKE_ACCESS = True`` los tokens de acceso también se
+pueden revocar (logout) y el middleware los rechaza.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+from .claims import PERMISSIONS_CLAIM, ROLES_CLAIM, embed_permissions, embed_roles, permission_claims_enabled
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un ``bytearray``. ``capacity`` y ``error_rate``
+    determinan el número de bits y de funciones hash.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Doble hashing (Kirsch-Mitzenmacher) a partir de un solo blake2b
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+
+class RevokedTokens:
+    """
+    Conjunto de ``jti`` revocados del proceso, respaldado por ``BlacklistedToken``.
+    """
+
+    # Las filas con id menor que el último leído pueden confirmarse tarde si
+    # dos transacciones se cruzan; se relee un margen en cada actualización.
+    refresh_overlap = 64
+
+    def __init__(self, capacity=100000, error_rate=0.001, refresh_interval=1, rebuild_interval=3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            capacity=getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000),
+            error_rate=getattr(settings, 'TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.001),
+            refresh_interval=getattr(settings, 'TOKEN_BLACKLIST_REFRESH_INTERVAL', 1),
+            rebuild_interval=getattr(settings, 'TOKEN_BLACKLIST_REBUILD_INTERVAL', 3600),
+        )
+
+    def reset(self):
+        """
+        Descarta el filtro; se reconstruye en la próxima consulta.
+        """
+        with self._lock:
+            self._bloom = None
+            self._last_id = 0
+            self._refreshed_at = 0.0
+            self._rebuilt_at = 0.0
+
+    def _load(self, bloom, since_id):
+        last_id = since_id
+        rows = (
+            BlacklistedToken.objects.filter(id__gt=since_id)
+            .order_by('id').values_list('id', 'token__jti')
+        )
+        for blacklisted_id, jti in rows.iterator(chunk_size=10000):
+            bloom.add(jti)
+            last_id = blacklisted_id
+        return last_id
+
+    def rebuild(self):
+        """
+        Reconstruye el filtro con todas las filas de ``BlacklistedToken``.
+        """
+        total = BlacklistedToken.objects.count()
+        bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+        last_id = self._load(bloom, 0)
+        now = time.monotonic()
+        with self._lock:
+            self._bloom, self._last_id = bloom, last_id
+            self._refreshed_at = self._rebuilt_at = now
+
+    def refresh(self):
+        """
+        Agrega al filtro las filas nuevas desde la última lectura, o lo
+        reconstruye si corresponde.
+        """
+        now = time.monotonic()
+        if (self._bloom is None or self._bloom.saturated
+                or now - self._rebuilt_at >= self.rebuild_interval):
+            self.rebuild()
+            return
+        last_id = self._load(self._bloom, max(0, self._last_id - self.refresh_overlap))
+        with self._lock:
+            self._last_id = max(self._last_id, last_id)
+            self._refreshed_at = now
+
+    @property
+    def stale(self):
+        return self._bloom is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+
+    def might_be_revoked(self, jti):
+        """
+        ``False`` si el ``jti`` seguro no está revocado; ``True`` si hay que
+        confirmarlo contra la base de datos.
+        """
+        if self.stale:
+            self.refresh()
+        return jti in self._bloom
+
+    def is_revoked(self, jti):
+        if not self.might_be_revoked(jti):
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    async def ais_revoked(self, jti):
+        # La ruta rápida (filtro vigente y sin acierto) no toca la base de datos
+        if not self.stale and jti not in self._bloom:
+            return False
+        return await sync_to_async(self.is_revoked)(jti)
+
+    def add(self, jti):
+        """
+        Registra un ``jti`` recién revocado en este proceso (los demás lo
+        verán en su próxima actualización).
+        """
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def compact(self):
+        """
+        Elimina los tokens vencidos (y su entrada en la lista negra) y
+        reconstruye el filtro. Retorna el número de tokens eliminados.
+        """
+        _, deleted = OutstandingToken.objects.filter(expires_at__lte=aware_utcnow()).delete()
+        self.rebuild()
+        return deleted.get(OutstandingToken._meta.label, 0)
+
+    def stats(self):
+        bloom = self._bloom
+        if bloom is None:
+            return {'entries': 0, 'bits': 0, 'bytes': 0, 'hashes': 0}
+        return {
+            'entries': bloom.count,
+            'bits': bloom.size,
+            'bytes': len(bloom.bits),
+            'hashes': bloom.hashes,
+        }
+
+
+revoked_tokens = RevokedTokens.from_settings()
+
+
+def outstand_token(token):
+    """
+    Registra ``token`` en ``OutstandingToken`` si no existe. A diferencia de
+    simplejwt no carga el usuario: basta con el id del claim.
+    """
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token[api_settings.JTI_CLAIM],
+        defaults={
+            'user_id': token.get(api_settings.USER_ID_CLAIM),
+            'created_at': token.current_time,
+            'token': str(token),
+            'expires_at': datetime_from_epoch(token['exp']),
+        },
+    )
+    return outstanding
+
+
+def revoke_token(token):
+    """
+    Agrega ``token`` (refresh o de acceso) a la lista negra.
+    """
+    outstanding = outstand_token(token)
+    # ignore_conflicts: revocar dos veces el mismo token no es un error
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)], ignore_conflicts=True)
+    revoked_tokens.add(outstanding.jti)
+
+
+def revoke_access_tokens_enabled():
+    return getattr(settings, 'TOKEN_BLACKLIST_REVOKE_ACCESS', False)
+
+
+class BloomRefreshToken(RefreshToken):
+    """
+    ``RefreshToken`` que consulta la lista negra a través del filtro de Bloom.
+    """
+
+    def check_blacklist(self):
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        revoke_token(self)
+
+    def outstand(self):
+        return outstand_token(self)
+
+    @property
+    def access_token(self):
+        # Al renovar, los roles y permisos del token (y del refresh rotado) se
+        # resuelven de nuevo con los roles y el registro actuales
+        user_id = self.payload[api_settings.USER_ID_CLAIM]
+        if ROLES_CLAIM in self.payload:
+            embed_roles(self, user_id)
+        if permission_claims_enabled() and PERMISSIONS_CLAIM in self.payload:
+            embed_permissions(self, user_id)
+        return super().access_token
+
+
+class BloomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = BloomRefreshToken
@@ -0,0 +1,173 @@
+# authentication/bulk.py
+"""
+Altas masivas de usuarios y asignaciones de roles.
+
+Cada elemento se valida por separado, pero las verificaciones contra la base
+de datos se hacen en bloque (una consulta por tabla para todo el lote) y la
+inserción es un único ``bulk_create`` dentro de una transacción. La
+importación de registros (``BulkRegisterSerializer``) usa el mismo camino con
+las reglas del registro. El resultado
+es una lista con el estado de cada elemento, en el mismo orden de entrada.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .cache import permissions_cache
+from .etags import change_counters
+from .hashing import bulk_hashing_executor
+from .models import Role, UserRole
+from .registration import USERNAME_TAKEN, conflict_errors, email_key, find_taken
+from .serializers import BulkUserSerializer, BulkUserRoleSerializer
+
+
+User = get_user_model()
+
+CREATED = 'created'
+EXISTS = 'exists'
+ERROR = 'error'
+
+
+def item_error(index, errors):
+    return {'index': index, 'status': ERROR, 'errors': errors}
+
+
+def bulk_create_users(items, serializer_class=BulkUserSerializer):
+    """
+    Crea los usuarios válidos de ``items`` (dicts con username, email y
+    password, validados con ``serializer_class``). Los usernames o emails
+    repetidos en el lote o ya registrados se reportan como error.
+    """
+    results = [None] * len(items)
+    pending = {}
+    passwords = {}
+    emails = set()
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item)
+        if not serializer.is_valid():
+            results[index] = item_error(index, serializer.errors)
+            continue
+        data = serializer.validated_data
+        username = User.normalize_username(data['username'])
+        email = User.objects.normalize_email(data.get('email', ''))
+        key = email_key(email)
+        if username in pending:
+            results[index] = item_error(index, {'username': ['Usuario repetido en la carga.']})
+            continue
+        if key in emails:
+            results[index] = item_error(index, {'email': ['Email repetido en la carga.']})
+            continue
+        if key is not None:
+            emails.add(key)
+        pending[username] = (index, User(username=username, email=email))
+        passwords[username] = data['password']
+
+    # Usernames y emails ya registrados, en una sola consulta
+    taken = find_taken(pending, (user.email for _, user in pending.values()))
+    for username, (index, user) in list(pending.items()):
+        errors = conflict_errors(username, user.email, taken)
+        if errors:
+            del pending[username]
+            results[index] = item_error(index, errors)
+
+    # Los hashes se calculan en el pool de altas masivas, aparte del de login
+    new_users = [user for _, user in pending.values()]
+    hashes = bulk_hashing_executor.map(make_password, [passwords[user.username] for user in new_users])
+    for user, encoded in zip(new_users, hashes):
+        user.password = encoded
+
+    with transaction.atomic():
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+
+    # Con ignore_conflicts no se obtienen los ids; se recuperan en una consulta.
+    # El hash (con sal aleatoria) distingue a los usuarios creados por este
+    # lote de los que otra petición haya insertado en paralelo.
+    created = {
+        username: (user_id, password)
+        for username, user_id, password in
+        User.objects.filter(username__in=pending).values_list('username', 'id', 'password')
+    }
+    lost = []
+    for username, (index, user) in pending.items():
+        user_id, password = created.get(username, (None, None))
+        if password == user.password:
+            results[index] = {'index': index, 'status': CREATED, 'id': user_id, 'username': username}
+        else:
+            lost.append((index, user))
+    if lost:
+        # Otra petición registró el username o el email entre la verificación y el INSERT
+        taken = find_taken((user.username for _, user in lost), (user.email for _, user in lost))
+        for index, user in lost:
+            errors = conflict_errors(user.username, user.email, taken) or {'username': [USERNAME_TAKEN]}
+            results[index] = item_error(index, errors)
+    return results
+
+
+def bulk_assign_roles(items, assigned_by_id=None):
+    """
+    Asigna roles según ``items`` (dicts con user_id y role_id). Las
+    asignaciones que ya existían se reportan como ``exists``.
+    """
+    results = [None] * len(items)
+    pending = {}
+    for index, item in enumerate(items):
+        serializer = BulkUserRoleSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = item_error(index, serializer.errors)
+            continue
+        key = (serializer.validated_data['user_id'], serializer.validated_data['role_id'])
+        if key in pending:
+            results[index] = item_error(index, {'non_field_errors': ['Asignación repetida en la carga.']})
+            continue
+        pending[key] = index
+
+    user_ids = {user_id for user_id, _ in pending}
+    role_ids = {role_id for _, role_id in pending}
+    users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    roles = set(Role.objects.filter(id__in=role_ids, is_active=True).values_list('id', flat=True))
+    existing = set(
+        UserRole.objects.filter(user_id__in=user_ids, role_id__in=role_ids).values_list('user_id', 'role_id')
+    )
+
+    new_assignments = []
+    for (user_id, role_id), index in pending.items():
+        if user_id not in users:
+            results[index] = item_error(index, {'user_id': ['Usuario no encontrado.']})
+        elif role_id not in roles:
+            results[index] = item_error(index, {'role_id': ['Rol no encontrado o inactivo.']})
+        elif (user_id, role_id) in existing:
+            results[index] = {'index': index, 'status': EXISTS, 'user_id': user_id, 'role_id': role_id}
+        else:
+            new_assignments.append(UserRole(user_id=user_id, role_id=role_id, assigned_by_id=assigned_by_id))
+    if not new_assignments:
+        return results
+
+    # unique_together('user', 'role') resuelve asignaciones concurrentes
+    with transaction.atomic():
+        UserRole.objects.bulk_create(new_assignments, ignore_conflicts=True)
+
+    # Con ignore_conflicts no se sabe qué filas se insertaron. Como el hash en
+    # bulk_create_users, assigned_at (auto_now_add, en microsegundos) distingue
+    # las de este lote de las que otra petición insertó en paralelo.
+    stored = {
+        (user_id, role_id): assigned_at
+        for user_id, role_id, assigned_at in UserRole.objects.filter(
+            user_id__in={assignment.user_id for assignment in new_assignments},
+            role_id__in={assignment.role_id for assignment in new_assignments},
+        ).values_list('user_id', 'role_id', 'assigned_at')
+    }
+    created = []
+    for assignment in new_assignments:
+        key = (assignment.user_id, assignment.role_id)
+        inserted = stored.get(key) == assignment.assigned_at
+        if inserted:
+            created.append(assignment)
+        results[pending[key]] = {'index': pending[key], 'status': CREATED if inserted else EXISTS,
+                                 'user_id': key[0], 'role_id': key[1]}
+
+    # bulk_create no emite post_save: se invalidan la caché y las ETags a mano
+    for user_id in {assignment.user_id for assignment in created}:
+        permissions_cache.invalidate_user(user_id)
+    if created:
+        change_counters.bump(UserRole)
+    return results
@@ -0,0 +1,142 @@
+# authentication/cache.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import UserRole, RolePermission
+
+
+# Resultado compilado para un usuario: ids y nombres de sus roles activos y
+# codenames de los permisos que esos roles otorgan.
+EffectivePermissions = namedtuple('EffectivePermissions', ['role_ids', 'roles', 'permissions'])
+
+EMPTY_PERMISSIONS = EffectivePermissions(frozenset(), frozenset(), frozenset())
+
+
+class EffectivePermissionsCache:
+    """
+    Caché en memoria (por proceso) de los permisos efectivos de cada usuario.
+
+    Las entradas se indexan por id de usuario y se desalojan con política LRU
+    cuando se supera ``max_size``. La invalidación es por versión: cualquier
+    cambio en roles, permisos o en la relación rol-permiso incrementa la versión
+    global y deja obsoletas todas las entradas; un cambio en ``UserRole`` sólo
+    descarta la entrada del usuario afectado.
+
+    Como las señales de Django sólo llegan al proceso que hizo el cambio,
+    ``ttl`` (segundos) acota cuánto puede tardar otro worker en ver el cambio.
+
+    ``role_changes`` cuenta las invalidaciones de cada usuario vistas por el
+    proceso; los tokens lo guardan (claim ``roles_v``) para notar, sin
+    compilar los permisos, que los roles cambiaron después de emitirlos.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._user_epoch = 0
+        self._role_changes = {}
+
+    @property
+    def version(self):
+        return self._version
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """
+        Retorna los ``EffectivePermissions`` del usuario, compilándolos desde
+        la base de datos si no están en caché o quedaron obsoletos.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                version, expires_at, perms = entry
+                if version == self._version and (expires_at is None or expires_at > time.monotonic()):
+                    self._entries.move_to_end(user_id)
+                    return perms
+                del self._entries[user_id]
+            version, epoch = self._version, self._user_epoch
+
+        perms = self.compile(user_id)
+
+        with self._lock:
+            # Si hubo una invalidación mientras se compilaba, no se guarda el
+            # resultado para no dejar en caché un estado viejo.
+            if version == self._version and epoch == self._user_epoch:
+                expires_at = time.monotonic() + self.ttl if self.ttl else None
+                self._entries[user_id] = (version, expires_at, perms)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return perms
+
+    @staticmethod
+    def compile(user_id):
+        """
+        Resuelve roles activos y permisos del usuario con dos consultas. Lee
+        del primario: tras una invalidación, una réplica atrasada volvería a
+        llenar la caché con los roles viejos durante ``ttl`` segundos.
+        """
+        rows = list(
+            UserRole.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id, role__is_active=True)
+            .values_list('role_id', 'role__name')
+        )
+        if not rows:
+            return EMPTY_PERMISSIONS
+
+        role_ids = frozenset(role_id for role_id, _ in rows)
+        codenames = RolePermission.objects.using(DEFAULT_DB_ALIAS).filter(role_id__in=role_ids).values_list(
+            'permission__codename', flat=True
+        )
+        return EffectivePermissions(
+            role_ids=role_ids,
+            roles=frozenset(name for _, name in rows),
+            permissions=frozenset(codenames),
+        )
+
+    def role_changes(self, user_id):
+        """
+        Cuántas veces este proceso vio cambiar los roles del usuario.
+        """
+        return self._role_changes.get(user_id, 0)
+
+    def invalidate_user(self, user_id):
+        """
+        Descarta la entrada de un usuario (p. ej. al asignarle o quitarle un rol).
+        """
+        with self._lock:
+            self._user_epoch += 1
+            self._entries.pop(user_id, None)
+            self._role_changes[user_id] = self._role_changes.get(user_id, 0) + 1
+
+    def invalidate_all(self):
+        """
+        Deja obsoletas todas las entradas incrementando la versión global.
+        """
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+
+permissions_cache = EffectivePermissionsCache(
+    max_size=getattr(settings, 'PERMISSIONS_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PERMISSIONS_CACHE_TTL', 300),
+)
+
+
+def get_effective_permissions(user):
+    """
+    Atajo para obtener los permisos efectivos de ``user`` (o de un id de usuario).
+    """
+    user_id = getattr(user, 'id', user)
+    if user_id is None:
+        return EMPTY_PERMISSIONS
+    return permissions_cache.get(user_id)
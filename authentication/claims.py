@@ -0,0 +1,192 @@
+# authentication/claims.py
+"""
+Permisos efectivos embebidos en los tokens.
+
+``PermissionRegistry`` asigna a cada codename un bit según el orden de id de
+``Permission``. Al emitir o renovar un token, los permisos del usuario
+(resueltos por ``RolePermission`` en la caché de permisos) se guardan como
+máscara de bits en base64 (claim ``perms``). Con 250 permisos son 43
+caracteres, no ~5 KB de codenames (las cookies admiten unos 4 KB). El claim
+``perms_v`` guarda la versión del registro.
+
+La versión resume los codenames y las asignaciones rol-permiso de los roles
+activos. Si se crea o borra un permiso, o cambia lo que otorga un rol, los
+tokens ya emitidos quedan obsoletos: ``token_has_permissions`` retorna
+``None`` y la verificación vuelve a la caché de permisos, hasta que el token
+se renueve.
+
+Los bits se verifican sin consultar la caché de permisos ni la base de
+datos. Para notar que al usuario se le quitó (o agregó) un rol, el claim
+``roles_v`` guarda ``permissions_cache.role_changes(user)`` al emitir el
+token. Las señales de ``UserRole`` lo incrementan, así que en el proceso que
+hizo el cambio los bits dejan de usarse de inmediato. Los demás procesos no
+reciben la señal: en ellos sólo se confía en los bits de tokens emitidos hace
+menos de ``PERMISSIONS_CACHE_TTL`` segundos, el mismo retraso que tendría su
+caché de permisos. Con tokens más viejos se usa la caché.
+
+El registro se carga con dos consultas y se guarda en memoria por proceso.
+Las señales lo invalidan, y ``ttl`` acota cuánto tarda otro worker en ver un
+cambio, como en la caché de permisos.
+"""
+import base64
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import get_effective_permissions, permissions_cache
+from .models import Permission, RolePermission
+
+
+PERMISSIONS_CLAIM = 'perms'
+PERMISSIONS_VERSION_CLAIM = 'perms_v'
+ROLES_VERSION_CLAIM = 'roles_v'
+ROLES_CLAIM = 'roles'
+
+
+def permission_claims_enabled():
+    return getattr(settings, 'TOKEN_PERMISSION_CLAIMS', True)
+
+
+def encode_mask(mask):
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+@lru_cache(maxsize=4096)
+def decode_mask(value):
+    return int.from_bytes(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)), 'little')
+
+
+class PermissionRegistry:
+    def __init__(self, codenames, grants=()):
+        self.codenames = tuple(codenames)
+        self.bits = {codename: 1 << i for i, codename in enumerate(self.codenames)}
+        digest = hashlib.sha1('\n'.join(self.codenames).encode())
+        for role_id, permission_id in grants:
+            digest.update(b'%d:%d;' % (role_id, permission_id))
+        self.version = digest.hexdigest()[:12]
+
+    @classmethod
+    def load(cls):
+        # Del primario, como la caché de permisos (ver cache.py)
+        return cls(
+            Permission.objects.using(DEFAULT_DB_ALIAS).order_by('id').values_list('codename', flat=True),
+            RolePermission.objects.using(DEFAULT_DB_ALIAS).filter(role__is_active=True)
+            .order_by('role_id', 'permission_id').values_list('role_id', 'permission_id'),
+        )
+
+    def encode(self, codenames):
+        mask = 0
+        for codename in codenames:
+            mask |= self.bits.get(codename, 0)
+        return encode_mask(mask)
+
+    def decode(self, value):
+        """
+        Codenames de una máscara codificada con ``encode``.
+        """
+        mask = decode_mask(value)
+        return frozenset(codename for codename, bit in self.bits.items() if mask & bit)
+
+    def mask(self, codenames):
+        """
+        Máscara de ``codenames``; ``None`` si alguno no existe (nadie lo tiene).
+        """
+        mask = 0
+        for codename in codenames:
+            bit = self.bits.get(codename)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+
+class PermissionRegistryCache:
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = 0
+        self._registry = None
+        self._expires_at = None
+
+    def get(self):
+        # Lectura sin lock: en cada petición sólo se leen dos atributos
+        registry, expires_at, version = self._registry, self._expires_at, self._version
+        if registry is not None and (expires_at is None or expires_at > time.monotonic()):
+            return registry
+        registry = PermissionRegistry.load()
+        with self._lock:
+            # Si hubo una invalidación mientras se cargaba, no se guarda
+            if version == self._version:
+                self._registry = registry
+                self._expires_at = time.monotonic() + self.ttl if self.ttl else None
+        return registry
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._registry = None
+
+
+permission_registry = PermissionRegistryCache(ttl=getattr(settings, 'PERMISSIONS_CACHE_TTL', 300))
+
+
+def embed_permissions(token, user):
+    """
+    Guarda en ``token`` la máscara de permisos efectivos de ``user`` (o de un
+    id de usuario), la versión del registro y la de sus roles.
+    """
+    user_id = getattr(user, 'id', user)
+    # Antes que los permisos: un cambio en medio deja el token con la versión vieja
+    token[ROLES_VERSION_CLAIM] = permissions_cache.role_changes(user_id)
+    registry = permission_registry.get()
+    token[PERMISSIONS_CLAIM] = registry.encode(get_effective_permissions(user_id).permissions)
+    token[PERMISSIONS_VERSION_CLAIM] = registry.version
+    return token
+
+
+def embed_roles(token, user):
+    """
+    Guarda en ``token`` los nombres de los roles activos de ``user`` (o de un
+    id de usuario), tomados de la caché de permisos.
+    """
+    token[ROLES_CLAIM] = sorted(get_effective_permissions(user).roles)
+    return token
+
+
+def token_has_permissions(token, codenames, user):
+    """
+    ``True`` o ``False`` según los bits del token; ``None`` si el token no
+    trae los claims, son de otra versión del registro, los roles de ``user``
+    cambiaron desde que se emitió o es más viejo que la caché de permisos.
+    """
+    if token is None or not permission_claims_enabled():
+        return None
+    value = token.get(PERMISSIONS_CLAIM)
+    if value is None:
+        return None
+    if token.get(ROLES_VERSION_CLAIM) != permissions_cache.role_changes(getattr(user, 'id', user)):
+        return None
+    ttl = permissions_cache.ttl
+    if ttl and token.get('iat', 0) + ttl <= time.time():
+        return None
+    registry = permission_registry.get()
+    if token.get(PERMISSIONS_VERSION_CLAIM) != registry.version:
+        return None
+    required = registry.mask(codenames)
+    return required is not None and decode_mask(value) & required == required
+
+
+def has_permissions(request, codenames):
+    """
+    Verifica ``codenames`` con los claims del token de la petición y, si no
+    sirven, con la caché de permisos efectivos.
+    """
+    allowed = token_has_permissions(getattr(request, 'auth', None), codenames, request.user)
+    if allowed is None:
+        allowed = codenames <= get_effective_permissions(request.user).permissions
+    return allowed
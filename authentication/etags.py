@@ -0,0 +1,70 @@
+# authentication/etags.py
+"""
+ETags por versión para las lecturas que las consolas consultan en cada
+refresco (roles, usuario actual y menú).
+
+``ChangeCounters`` lleva un contador por modelo que las señales incrementan al
+guardar o borrar; la ETag de cada vista se arma con los contadores de los
+modelos de los que depende su respuesta, sin tocar la base de datos. Con
+``condition`` un ``If-None-Match`` que coincide responde 304 antes de
+consultar o serializar nada.
+
+Los contadores son por proceso, así que las ETags llevan la época del proceso
+(una ETag de otro worker nunca coincide) y la ventana de ``ETAG_TTL``
+segundos: un cambio hecho en otro worker se ve como mucho una ventana
+después, igual que ``PERMISSIONS_CACHE_TTL`` en la caché de permisos.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .cache import get_effective_permissions
+from .models import Menu, Role, UserRole
+
+
+class ChangeCounters:
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.epoch = '%x' % int(time.time() * 1000)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(ttl=getattr(settings, 'ETAG_TTL', 300))
+
+    def bump(self, model):
+        label = model._meta.label_lower
+        with self._lock:
+            self._counts[label] = self._counts.get(label, 0) + 1
+
+    def count(self, model):
+        return self._counts.get(model._meta.label_lower, 0)
+
+    def token(self, *models):
+        """
+        Versión combinada de ``models``; cambia si cambia cualquiera de ellos.
+        """
+        window = int(time.time() // self.ttl) if self.ttl else 0
+        counts = '.'.join(str(self.count(model)) for model in models)
+        return '%s.%x.%s' % (self.epoch, window, counts)
+
+
+change_counters = ChangeCounters.from_settings()
+
+
+def role_list_etag(request, *args, **kwargs):
+    return '"roles-%s"' % change_counters.token(Role)
+
+
+def user_info_etag(request, *args, **kwargs):
+    return '"info-%d-%s"' % (request.user.id, change_counters.token(get_user_model(), UserRole, Role))
+
+
+def user_menu_etag(request, *args, **kwargs):
+    # El menú depende sólo del árbol y del conjunto de roles del usuario, que
+    # ya está en la caché de permisos
+    role_ids = '.'.join(str(role_id) for role_id in sorted(get_effective_permissions(request.user).role_ids))
+    return '"menu-%s-%s"' % (change_counters.token(Menu), role_ids)
@@ -0,0 +1,196 @@
+# authentication/hashing.py
+"""
+Hashing de contraseñas fuera del hilo que atiende la petición.
+
+``HashingExecutor`` ejecuta ``verify_password`` / ``make_password`` en un pool
+de hilos (PBKDF2 libera el GIL) o de procesos, con una cola acotada: si hay más
+trabajos pendientes que ``workers + queue_size`` durante ``timeout`` segundos
+se lanza ``HashingBusy`` y la vista responde 503 en lugar de acumular
+peticiones. Las altas masivas usan su propio executor (``bulk_hashing_executor``,
+``PASSWORD_BULK_HASHING_*``), más chico: una importación de mil usuarios no
+ocupa la cola del login. ``OffloadedModelBackend`` usa el executor para autenticar y
+re-hashea de forma transparente las contraseñas guardadas con otro perfil.
+"""
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, must_update_salt, verify_password
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Alias de ``PBKDF2PasswordHasher`` de Django (mismo algoritmo
+    ``pbkdf2_sha256``, mismas iteraciones salvo que ``PASSWORD_HASH_ITERATIONS``
+    diga otra cosa). No es un perfil ajustado: sólo existe porque
+    ``must_update`` no degrada los hashes con más iteraciones (p. ej. los
+    creados con el valor por defecto de una versión más nueva de Django); los
+    que tienen menos se re-hashean al iniciar sesión.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return decoded['iterations'] < self.iterations or must_update_salt(decoded['salt'], self.salt_entropy)
+
+
+class HashingBusy(Exception):
+    """
+    La cola de hashing está llena; el cliente debe reintentar más tarde.
+    """
+
+
+def _setup_worker():
+    # Los procesos creados con 'spawn' no heredan la configuración de Django
+    import django
+    if not settings.configured or not django.apps.apps.ready:
+        django.setup()
+
+
+class HashingExecutor:
+    """
+    Pool acotado para operaciones de hashing de contraseñas.
+    """
+
+    def __init__(self, mode='thread', workers=4, queue_size=64, timeout=5):
+        if mode not in ('thread', 'process', 'inline'):
+            raise ValueError('Modo de hashing desconocido: %r' % mode)
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, prefix='PASSWORD_HASHING', workers=4, queue_size=64):
+        return cls(
+            mode=getattr(settings, 'PASSWORD_HASHING_MODE', 'thread'),
+            workers=getattr(settings, '%s_WORKERS' % prefix, workers),
+            queue_size=getattr(settings, '%s_QUEUE_SIZE' % prefix, queue_size),
+            timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 5),
+        )
+
+    @property
+    def pool(self):
+        # Se crea al primer uso para no abrir hilos/procesos al importar
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.mode == 'process':
+                        self._pool = ProcessPoolExecutor(self.workers, initializer=_setup_worker)
+                    else:
+                        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='hashing')
+        return self._pool
+
+    def submit(self, func, *args):
+        """
+        Encola ``func(*args)`` y retorna el ``Future``. Lanza ``HashingBusy``
+        si no hay lugar en la cola dentro de ``timeout`` segundos.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Demasiadas operaciones de hashing pendientes')
+        try:
+            future = self.pool.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, func, *args):
+        if self.mode == 'inline':
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        """
+        Versión para vistas async: espera el resultado sin bloquear el loop.
+        """
+        if self.mode == 'inline':
+            return func(*args)
+        # submit puede esperar por un lugar en la cola; se hace fuera del loop
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, func, *args)
+        return await asyncio.wrap_future(future)
+
+    def map(self, func, iterable):
+        """
+        Aplica ``func`` a cada elemento en paralelo (p. ej. altas masivas).
+        """
+        if self.mode == 'inline':
+            return [func(item) for item in iterable]
+        futures = [self.submit(func, item) for item in iterable]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+hashing_executor = HashingExecutor.from_settings()
+bulk_hashing_executor = HashingExecutor.from_settings('PASSWORD_BULK_HASHING', workers=1, queue_size=4)
+
+
+def hash_password(raw_password):
+    """
+    ``make_password`` ejecutado en el executor de hashing.
+    """
+    return hashing_executor.run(make_password, raw_password)
+
+
+class OffloadedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` que verifica la contraseña en el executor de hashing y
+    la re-hashea con el perfil actual (``PASSWORD_HASHERS[0]``) si fue guardada
+    con otro algoritmo o número de iteraciones.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Mismo costo que con un usuario existente (evita enumeración por tiempo)
+            hashing_executor.run(make_password, password)
+            return None
+
+        is_correct, must_update = hashing_executor.run(verify_password, password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hashing_executor.run(make_password, password)
+            user.save(update_fields=['password'])
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await hashing_executor.arun(make_password, password)
+            return None
+
+        is_correct, must_update = await hashing_executor.arun(verify_password, password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = await hashing_executor.arun(make_password, password)
+            await user.asave(update_fields=['password'])
+        return user
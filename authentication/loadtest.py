@@ -0,0 +1,208 @@
+# authentication/loadtest.py
+"""
+Prueba de carga en proceso de las rutas de authentication/urls.py.
+
+``seed`` crea usuarios, roles, permisos y menús con ``SeedGenerator``;
+``run_wsgi`` y ``run_asgi`` envían ``requests`` peticiones a una ruta con
+``concurrency`` clientes simultáneos (hilos con ``Client`` o tareas con
+``AsyncClient``) y resumen la latencia de cada petición y el throughput total como ``summarize``, más el
+número de respuestas con error. Lo usa el comando ``loadtest``.
+
+``ROUTE_CASES`` declara cómo se llama cada ruta: ``nombre -> (método, datos,
+preparar)``. ``datos(i, context)`` arma el cuerpo de la petición ``i`` (``i``
+no se repite en todo el ``context`` y los nombres llevan ``context['run']``,
+así que lo que se crea no choca con lo ya creado) y
+``preparar(client, i, context)``, fuera de la medición, deja el cliente listo
+(p. ej. tokens nuevos antes de cada logout).
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from .benchmarking import summarize
+from .models import Permission
+from .seeding import Distribution, SeedGenerator
+from .serializers import CustomTokenObtainPairSerializer
+
+
+User = get_user_model()
+
+LOAD_PASSWORD = 'Carga-Segura-2024!'
+
+
+def seed(users=1000, roles=20, permissions=50, menus=30, seed=0):
+    """
+    Crea los datos de la prueba con ``SeedGenerator`` (todos los usuarios
+    comparten un hash calculado una sola vez) y retorna el ``context`` de las
+    peticiones. Los menús son árboles de una raíz con cuatro hijos.
+    """
+    run = uuid.uuid4().hex[:8]
+    generator = SeedGenerator(seed=seed, prefix='carga-%s' % run, password=LOAD_PASSWORD)
+    user_ids = generator.users(users)
+    role_ids = generator.roles(roles)
+    # Roles que nadie tiene: las asignaciones de la prueba no chocan con las sembradas
+    assignable = generator.roles(5, label='asignable')
+    permission_ids = generator.permissions(permissions)
+    generator.role_permissions(role_ids, permission_ids, Distribution([5]))
+    # view_metrics (migración 0004) para todos los roles: lo exige /auth/metrics/
+    metrics_permission = Permission.objects.get(codename='view_metrics').pk
+    generator.role_permissions(role_ids, [metrics_permission], Distribution([1]))
+    generator.user_roles(user_ids, role_ids, Distribution.parse('1-3'))
+    generator.menus(max(1, menus // 5), 2, Distribution([4]), role_ids, Distribution([3]))
+    generator.finish()
+    return {
+        'run': run,
+        'user': User.objects.get(pk=user_ids[0]),
+        'users': user_ids,
+        'usernames': [generator.username(i) for i in range(users)],
+        'roles': role_ids,
+        'assignable_roles': assignable,
+        'sequence': itertools.count(),
+    }
+
+
+def fresh_tokens(client, i, context):
+    token = CustomTokenObtainPairSerializer.get_token(context['user'])
+    client.cookies['access_token'] = str(token.access_token)
+    client.cookies['refresh_token'] = str(token)
+
+
+def new_user(prefix):
+    def data(i, context):
+        username = '%s-%s-%d' % (prefix, context['run'], i)
+        return {'username': username, 'email': '%s@example.com' % username, 'password': LOAD_PASSWORD}
+    return data
+
+
+def assignment(i, context):
+    # Pares (usuario, rol) distintos mientras i < usuarios * roles asignables
+    users, roles = context['users'], context['assignable_roles']
+    return {'user_id': users[i % len(users)], 'role_id': roles[i // len(users) % len(roles)]}
+
+
+def login_data(i, context):
+    return {'username': context['usernames'][i % len(context['usernames'])], 'password': LOAD_PASSWORD}
+
+
+ROUTE_CASES = {
+    'login': ('post', login_data, None),
+    'login-async': ('post', login_data, None),
+    'logout': ('post', None, fresh_tokens),
+    'logout-async': ('post', None, fresh_tokens),
+    'register': ('post', lambda i, context: dict(new_user('registro')(i, context), password2=LOAD_PASSWORD), None),
+    # Con ROTATE_REFRESH_TOKENS cada respuesta deja en el cliente el token siguiente
+    'token-refresh': ('post', None, None),
+    'user-info': ('get', None, None),
+    'user-info-async': ('get', None, None),
+    'user-list': ('get', None, None),
+    'user-create': ('post', new_user('creado'), None),
+    'user-bulk-create': ('post', lambda i, context: [new_user('masivo-%d' % i)(j, context) for j in range(10)], None),
+    'user-import': ('post', lambda i, context: [
+        dict(new_user('importado-%d' % i)(j, context), password2=LOAD_PASSWORD) for j in range(10)
+    ], None),
+    'role-list': ('get', None, None),
+    'role-list-async': ('get', None, None),
+    'role-create': ('post', lambda i, context: {'name': 'Rol %s %d' % (context['run'], i)}, None),
+    'user-roles': ('get', None, None),
+    'user-roles-async': ('get', None, None),
+    'role-assign': ('post', assignment, None),
+    'role-bulk-assign': ('post', lambda i, context: [assignment(i * 5 + j, context) for j in range(5)], None),
+    'user-menu': ('get', None, None),
+    'metrics': ('get', None, None),
+}
+
+
+def make_client(client_class, context):
+    client = client_class()
+    fresh_tokens(client, 0, context)
+    return client
+
+
+def summarize_run(label, outcomes, wall):
+    samples = [sample for worker_samples, _ in outcomes for sample in worker_samples]
+    result = summarize(label, samples)
+    result['ops_per_sec'] = len(samples) / wall if wall else 0.0
+    result['errors'] = sum(errors for _, errors in outcomes)
+    return result
+
+
+def run_wsgi(url_name, context, requests=200, concurrency=1):
+    """
+    ``requests`` peticiones a ``url_name`` desde ``concurrency`` hilos, cada
+    uno con su ``Client`` (el handler WSGI corre en el mismo hilo). Con un
+    solo cliente no se crean hilos: las peticiones ven la transacción en curso
+    (útil en pruebas).
+    """
+    method, data, prepare = ROUTE_CASES[url_name]
+    url = reverse(url_name)
+    kwargs = {} if method == 'get' else {'content_type': 'application/json'}
+    counter = itertools.count()
+    clock = time.perf_counter
+
+    def worker():
+        client = make_client(Client, context)
+        send = getattr(client, method)
+        samples, errors = [], 0
+        while next(counter) < requests:
+            i = next(context['sequence'])
+            if prepare:
+                prepare(client, i, context)
+            payload = data(i, context) if data else None
+            start = clock()
+            response = send(url, payload, **kwargs)
+            samples.append(clock() - start)
+            errors += response.status_code >= 400
+        return samples, errors
+
+    def threaded_worker(_):
+        try:
+            return worker()
+        finally:
+            connections.close_all()
+
+    start = clock()
+    if concurrency == 1:
+        outcomes = [worker()]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(threaded_worker, range(concurrency)))
+    return summarize_run('%s wsgi x%d' % (url_name, concurrency), outcomes, clock() - start)
+
+
+async def run_asgi(url_name, context, requests=200, concurrency=1):
+    """
+    Igual que ``run_wsgi`` pero con ``concurrency`` tareas ``AsyncClient`` en
+    el event loop actual (las vistas síncronas pasan por ``sync_to_async``).
+    """
+    method, data, prepare = ROUTE_CASES[url_name]
+    url = reverse(url_name)
+    kwargs = {} if method == 'get' else {'content_type': 'application/json'}
+    counter = itertools.count()
+    clock = time.perf_counter
+
+    async def worker():
+        client = await sync_to_async(make_client)(AsyncClient, context)
+        send = getattr(client, method)
+        samples, errors = [], 0
+        while next(counter) < requests:
+            i = next(context['sequence'])
+            if prepare:
+                await sync_to_async(prepare)(client, i, context)
+            payload = data(i, context) if data else None
+            start = clock()
+            response = await send(url, payload, **kwargs)
+            samples.append(clock() - start)
+            errors += response.status_code >= 400
+        return samples, errors
+
+    start = clock()
+    outcomes = await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize_run('%s asgi x%d' % (url_name, concurrency), outcomes, clock() - start)
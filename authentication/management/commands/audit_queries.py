@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from authentication import urls as auth_urls
+from authentication.query_audit import DEFAULT_ALLOWED_SCANS, audit, uncovered_url_names
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las vistas de authentication sobre una base de datos de pruebas y revisa el '
+        'EXPLAIN QUERY PLAN de cada consulta: falla si alguna recorre una tabla completa o '
+        'ordena en un B-tree temporal.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--allow', action='append', default=[], metavar='TABLA',
+            help='Tabla que se permite recorrer completa (se puede repetir)',
+        )
+        parser.add_argument('--plans', action='store_true', help='Muestra el plan de todas las consultas')
+
+    def handle(self, *args, **options):
+        allowed = set(DEFAULT_ALLOWED_SCANS) | set(options['allow'])
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = audit(allowed=allowed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        flagged = 0
+        for result in results:
+            if not result['issues'] and not options['plans']:
+                continue
+            flagged += bool(result['issues'])
+            style = self.style.ERROR if result['issues'] else self.style.MIGRATE_HEADING
+            self.stdout.write(style('%s [%d]' % (result['request'], result['status'])))
+            self.stdout.write('  %s' % result['sql'])
+            for detail in result['plan']:
+                marker = '!' if detail in result['issues'] else ' '
+                self.stdout.write('  %s %s' % (marker, detail))
+
+        for name in uncovered_url_names(auth_urls.urlpatterns):
+            self.stdout.write(self.style.WARNING('Ruta sin auditar: %s' % name))
+
+        if flagged:
+            raise CommandError('%d de %d consultas sin índice adecuado' % (flagged, len(results)))
+        self.stdout.write(self.style.SUCCESS('%d consultas auditadas sin problemas' % len(results)))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.module_loading import autodiscover_modules
+
+from authentication.benchmarking import compare, load_baseline, registry, save_baseline
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los benchmarks registrados (módulos benchmarks.py) sobre una base de datos de pruebas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks a ejecutar (por defecto, todos)')
+        parser.add_argument('--iterations', type=int, default=1000)
+        parser.add_argument('--list', action='store_true', help='Sólo lista los benchmarks disponibles')
+        parser.add_argument('--save-baseline', metavar='ARCHIVO', help='Guarda los resultados como línea base JSON')
+        parser.add_argument('--baseline', metavar='ARCHIVO', help='Falla si algún caso empeora respecto a esta línea base')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Regresión tolerada (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('benchmarks')
+
+        if options['list']:
+            for name in sorted(registry):
+                self.stdout.write(name)
+            return
+
+        names = options['names'] or sorted(registry)
+        unknown = set(names) - set(registry)
+        if unknown:
+            raise CommandError('Benchmarks desconocidos: %s' % ', '.join(sorted(unknown)))
+
+        baseline = load_baseline(options['baseline']) if options['baseline'] else None
+        results = {}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                results[name] = registry[name](options['iterations'])
+                for result in results[name]:
+                    self.stdout.write(self.format_result(result))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+            self.stdout.write('Línea base guardada en %s' % options['save_baseline'])
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            for name, label, before, after in regressions:
+                self.stdout.write(self.style.ERROR('  %s / %s: %.1fus -> %.1fus' % (name, label, before, after)))
+            if regressions:
+                raise CommandError('%d casos empeoraron más de %d%%' % (len(regressions), options['threshold'] * 100))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a %s' % options['baseline']))
+
+    @staticmethod
+    def format_result(result):
+        return (
+            '  {label:<40} mean={mean_us:9.1f}us p50={p50_us:9.1f}us '
+            'p95={p95_us:9.1f}us p99={p99_us:9.1f}us {ops_per_sec:12.1f} ops/s'
+        ).format(**result)
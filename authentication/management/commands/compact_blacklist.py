@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from authentication.blacklist import revoked_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina los tokens vencidos de la lista negra y reconstruye el filtro de Bloom. '
+        'Pensado para ejecutarse periódicamente (cron).'
+    )
+
+    def handle(self, *args, **options):
+        deleted = revoked_tokens.compact()
+        stats = revoked_tokens.stats()
+        self.stdout.write(self.style.SUCCESS(
+            'Tokens vencidos eliminados: %d. Filtro: %d entradas, %d bytes, %d hashes.'
+            % (deleted, stats['entries'], stats['bytes'], stats['hashes'])
+        ))
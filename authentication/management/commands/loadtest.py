@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from authentication import urls as auth_urls
+from authentication.benchmarking import compare, load_baseline, save_baseline
+from authentication.loadtest import ROUTE_CASES, run_asgi, run_wsgi, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las rutas de authentication sobre una base de datos de pruebas en archivo: '
+        'siembra datos, envía peticiones con clientes WSGI y ASGI concurrentes y compara con una línea base.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='Nombres de URL a probar (por defecto, todas)')
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por ruta y nivel de concurrencia')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+        parser.add_argument('--mode', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--roles', type=int, default=20)
+        parser.add_argument('--permissions', type=int, default=50)
+        parser.add_argument('--menus', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos generados')
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help='Usa MD5 para las contraseñas (login y registro dejan de medir sobre todo el hash)',
+        )
+        parser.add_argument(
+            '--throttle', action='store_true',
+            help='Mantiene el límite de intentos de login y registro (por defecto se desactiva: todo sale de una IP)',
+        )
+        parser.add_argument('--save-baseline', metavar='ARCHIVO', help='Guarda los resultados como línea base JSON')
+        parser.add_argument('--baseline', metavar='ARCHIVO', help='Falla si algún caso empeora respecto a esta línea base')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Regresión tolerada (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        names = options['routes'] or [pattern.name for pattern in auth_urls.urlpatterns if pattern.name]
+        unknown = set(names) - set(ROUTE_CASES)
+        if unknown:
+            raise CommandError('Rutas sin caso de carga: %s' % ', '.join(sorted(unknown)))
+        baseline = load_baseline(options['baseline']) if options['baseline'] else None
+        overrides = {} if options['throttle'] else {'LOGIN_THROTTLE_ENABLED': False}
+        if options['fast_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        # En archivo (con WAL) y no en memoria: los hilos usan conexiones propias
+        directory = tempfile.mkdtemp(prefix='loadtest-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(**overrides):
+                context = seed(
+                    users=options['users'], roles=options['roles'], permissions=options['permissions'],
+                    menus=options['menus'], seed=options['seed'],
+                )
+                results = self.run_routes(names, context, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], {'loadtest': results})
+            self.stdout.write('Línea base guardada en %s' % options['save_baseline'])
+        if baseline is not None:
+            regressions = compare({'loadtest': results}, baseline, options['threshold'])
+            for _, label, before, after in regressions:
+                self.stdout.write(self.style.ERROR('  %s: %.1fus -> %.1fus' % (label, before, after)))
+            if regressions:
+                raise CommandError('%d casos empeoraron más de %d%%' % (len(regressions), options['threshold'] * 100))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a %s' % options['baseline']))
+
+    def run_routes(self, names, context, options):
+        # Las respuestas con error se cuentan; no se registra cada una
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        results = []
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for mode in options['mode']:
+                for level in options['concurrency']:
+                    if mode == 'wsgi':
+                        result = run_wsgi(name, context, options['requests'], level)
+                    else:
+                        result = asyncio.run(run_asgi(name, context, options['requests'], level))
+                    results.append(result)
+                    self.stdout.write(self.format_result(result))
+        return results
+
+    def format_result(self, result):
+        line = (
+            '  {label:<32} p50={p50_us:9.1f}us p95={p95_us:9.1f}us p99={p99_us:9.1f}us '
+            '{ops_per_sec:9.1f} req/s'
+        ).format(**result)
+        if result['errors']:
+            line += self.style.WARNING(' %d errores' % result['errors'])
+        return line
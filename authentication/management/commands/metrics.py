@@ -0,0 +1,61 @@
+import json
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_URL = 'http://localhost:8000/auth/metrics/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra p50/p95/p99 por endpoint leídos de un servidor en ejecución '
+        '(/auth/metrics/?format=json). Las métricas son por proceso: el comando '
+        'no puede leerlas de sí mismo.'
+    )
+
+    # (campo, encabezado, escala, unidad)
+    columns = (
+        ('duration_us', 'tiempo', 1e-3, 'ms'),
+        ('db_queries', 'consultas', 1, ''),
+        ('db_us', 'tiempo BD', 1e-3, 'ms'),
+        ('serializer_us', 'serialización', 1e-3, 'ms'),
+        ('response_bytes', 'tamaño', 1, 'B'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=DEFAULT_URL, help='URL del endpoint de métricas (por defecto %s)' % DEFAULT_URL)
+        parser.add_argument('--token', help='Token de acceso, si la ruta no es pública (ROUTE_POLICIES)')
+        parser.add_argument('--endpoint', action='append', default=[], help='Filtra por nombre de URL (repetible)')
+        parser.add_argument('--json', action='store_true', help='Imprime el resumen como JSON')
+
+    def handle(self, *args, **options):
+        request = Request('%s?format=json' % options['url'].rstrip('?'))
+        if options['token']:
+            request.add_header('Authorization', 'Bearer %s' % options['token'])
+        try:
+            with urlopen(request, timeout=10) as response:
+                data = json.load(response)
+        except (OSError, ValueError) as error:
+            raise CommandError('No se pudieron leer las métricas de %s: %s' % (options['url'], error))
+
+        endpoints = data['endpoints']
+        if options['endpoint']:
+            endpoints = {name: value for name, value in endpoints.items() if name in options['endpoint']}
+
+        if options['json']:
+            self.stdout.write(json.dumps(endpoints, indent=2, sort_keys=True))
+            return
+        if not endpoints:
+            self.stdout.write('Sin muestras registradas.')
+            return
+
+        self.stdout.write('Fracción muestreada: %g' % data['sample_rate'])
+        for name in sorted(endpoints):
+            fields = endpoints[name]
+            self.stdout.write(self.style.MIGRATE_HEADING('%s (%d muestras)' % (name, fields['duration_us']['count'])))
+            for field, header, scale, unit in self.columns:
+                stats = fields[field]
+                self.stdout.write('  {:<14} p50={:>10.1f}{unit:<2} p95={:>10.1f}{unit:<2} p99={:>10.1f}{unit:<2} max={:>10.1f}{unit}'.format(
+                    header, stats['p50'] * scale, stats['p95'] * scale, stats['p99'] * scale, stats['max'] * scale, unit=unit
+                ))
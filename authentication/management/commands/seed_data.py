@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from authentication.seeding import SEED_PASSWORD, Distribution, SeedGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos deterministas para pruebas de escala: usuarios, roles, permisos, '
+        'asignaciones y árboles de menús. Las cantidades variables aceptan "3", "1-3" o "1:60,2:30,3:10".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--roles', type=int, default=20)
+        parser.add_argument('--permissions', type=int, default=50)
+        parser.add_argument('--roles-per-user', type=Distribution.parse, default=Distribution.parse('1-3'))
+        parser.add_argument('--permissions-per-role', type=Distribution.parse, default=Distribution.parse('5'))
+        parser.add_argument('--menu-trees', type=int, default=5, help='Menús raíz')
+        parser.add_argument('--menu-depth', type=int, default=3, help='Niveles de cada árbol')
+        parser.add_argument('--menu-fanout', type=Distribution.parse, default=Distribution.parse('2-4'), help='Hijos por menú')
+        parser.add_argument('--roles-per-menu', type=Distribution.parse, default=Distribution.parse('1-3'))
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Filas por transacción')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla del generador')
+        parser.add_argument('--prefix', default='seed', help='Prefijo de usernames y nombres (debe ser nuevo)')
+        parser.add_argument('--password', default=SEED_PASSWORD, help='Contraseña de todos los usuarios')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser positivo')
+        prefix = options['prefix']
+        if get_user_model()._default_manager.db_manager(options['database']).filter(username__startswith=prefix + '-').exists():
+            raise CommandError('Ya hay usuarios con el prefijo "%s"; usa otro --prefix' % prefix)
+
+        self.verbosity = options['verbosity']
+        generator = SeedGenerator(
+            seed=options['seed'], prefix=prefix, password=options['password'],
+            chunk_size=options['chunk_size'], using=options['database'], progress=self.report,
+        )
+        self.started = time.perf_counter()
+        user_ids = self.step('usuarios', generator.users, options['users'])
+        role_ids = self.step('roles', generator.roles, options['roles'])
+        permission_ids = self.step('permisos', generator.permissions, options['permissions'])
+        self.step('permisos por rol', generator.role_permissions, role_ids, permission_ids, options['permissions_per_role'])
+        self.step('roles por usuario', generator.user_roles, user_ids, role_ids, options['roles_per_user'])
+        self.step(
+            'menús', generator.menus, options['menu_trees'], options['menu_depth'],
+            options['menu_fanout'], role_ids, options['roles_per_menu'],
+        )
+        generator.finish()
+
+        for table, count in generator.counts.items():
+            self.stdout.write('  %-32s %10d filas' % (table, count))
+        self.stdout.write(self.style.SUCCESS(
+            'Datos generados en %.1fs (semilla %d, prefijo "%s")' % (time.perf_counter() - self.started, options['seed'], prefix)
+        ))
+
+    def step(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        if self.verbosity:
+            self.stdout.write('%s: %.2fs' % (label, time.perf_counter() - start))
+        return result
+
+    def report(self, table, done, total):
+        if self.verbosity > 1:
+            self.stdout.write('  %s: %d%s filas' % (table, done, '/%d' % total if total else ''))
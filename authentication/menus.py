@@ -0,0 +1,154 @@
+# authentication/menus.py
+"""
+Árbol de navegación materializado en memoria.
+
+Todos los menús activos y su relación con roles se cargan con dos consultas,
+el árbol se arma en memoria y el JSON ya renderizado se guarda por conjunto de
+roles. Cualquier cambio en ``Menu`` (o en sus roles) incrementa la versión y
+descarta lo calculado. Como las señales sólo llegan al proceso que hizo el
+cambio, ``ttl`` (``MENU_CACHE_TTL``) acota cuánto tarda otro worker en verlo.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Menu
+
+
+# Campos de cada nodo en la respuesta de navegación
+MENU_FIELDS = ('id', 'name', 'path', 'component', 'icon', 'sort_order')
+
+
+class MenuTree:
+    """
+    Árbol de menús activos. ``roots`` y ``children`` ya vienen ordenados por
+    ``sort_order`` y ``name`` (el ``ordering`` del modelo).
+    """
+
+    def __init__(self, rows, links):
+        self.nodes = {row['id']: row for row in rows}
+        self.roles = {menu_id: set() for menu_id in self.nodes}
+        self.children = {menu_id: [] for menu_id in self.nodes}
+        self.roots = []
+
+        for menu_id, role_id in links:
+            if menu_id in self.roles:
+                self.roles[menu_id].add(role_id)
+
+        for row in rows:
+            parent_id = row['parent_id']
+            if parent_id is None:
+                self.roots.append(row['id'])
+            elif parent_id in self.children:
+                self.children[parent_id].append(row['id'])
+            # Si el padre está inactivo, la rama completa queda fuera
+
+    @classmethod
+    def load(cls):
+        # El árbol vive MENU_CACHE_TTL segundos: no se carga de una réplica atrasada
+        rows = list(Menu.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).values('parent_id', *MENU_FIELDS))
+        links = Menu.roles.through.objects.using(DEFAULT_DB_ALIAS).values_list('menu_id', 'role_id')
+        return cls(rows, links)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def build(self, role_ids):
+        """
+        Retorna la lista de nodos raíz visibles para ``role_ids``. Un nodo es
+        visible si comparte al menos un rol con el usuario y su padre es visible.
+        """
+        return self._build(self.roots, role_ids)
+
+    def _build(self, menu_ids, role_ids):
+        result = []
+        for menu_id in menu_ids:
+            if self.roles[menu_id].isdisjoint(role_ids):
+                continue
+            node = {field: self.nodes[menu_id][field] for field in MENU_FIELDS}
+            node['children'] = self._build(self.children[menu_id], role_ids)
+            result.append(node)
+        return result
+
+
+class MenuTreeCache:
+    """
+    Caché por proceso del árbol cargado y del JSON renderizado por conjunto de
+    roles (LRU acotado a ``max_size`` conjuntos distintos).
+    """
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = 0
+        self._tree = None
+        self._expires_at = None
+        self._rendered = OrderedDict()
+
+    @property
+    def version(self):
+        return self._version
+
+    def _expire(self):
+        # Con _lock tomado: el árbol vencido arrastra el JSON renderizado con él
+        if self._expires_at is not None and self._expires_at <= time.monotonic():
+            self._clear()
+
+    def _clear(self):
+        self._version += 1
+        self._tree = None
+        self._expires_at = None
+        self._rendered.clear()
+
+    def get_tree(self):
+        with self._lock:
+            self._expire()
+            tree, version = self._tree, self._version
+        if tree is None:
+            tree = MenuTree.load()
+            with self._lock:
+                if version == self._version:
+                    self._tree = tree
+                    self._expires_at = time.monotonic() + self.ttl if self.ttl else None
+        return tree
+
+    def render(self, role_ids):
+        """
+        JSON (bytes) con el árbol de navegación visible para ``role_ids``.
+        """
+        key = frozenset(role_ids)
+        with self._lock:
+            self._expire()
+            version = self._version
+            payload = self._rendered.get(key)
+            if payload is not None:
+                self._rendered.move_to_end(key)
+                return payload
+
+        tree = self.get_tree()
+        payload = json.dumps(
+            {'status': 'success', 'menu': tree.build(key)},
+            separators=(',', ':'),
+        ).encode()
+
+        with self._lock:
+            if version == self._version:
+                self._rendered[key] = payload
+                while len(self._rendered) > self.max_size:
+                    self._rendered.popitem(last=False)
+        return payload
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+
+menu_cache = MenuTreeCache(
+    max_size=getattr(settings, 'MENU_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'MENU_CACHE_TTL', 300),
+)
@@ -0,0 +1,307 @@
+# authentication/metrics.py
+"""
+Métricas de rendimiento por endpoint.
+
+``RequestMetricsMiddleware`` mide, para una fracción ``METRICS_SAMPLE_RATE``
+de las peticiones, el tiempo total, el número y el tiempo de las consultas
+SQL, el tiempo de serialización (``BaseSerializer.data`` o una proyección) y
+el tamaño de la respuesta, y los agrega por nombre de URL en histogramas
+logarítmicos al estilo HDR (error relativo acotado, memoria proporcional al
+rango usado).
+
+Cada hilo escribe en su propia copia de los histogramas, así que registrar
+una muestra no toma ningún lock; las copias se combinan sólo al exportar
+(``registry.snapshot()``). Cuando un hilo termina, su copia se suma a un
+agregado común y sale de la lista: los servidores que crean un hilo por
+conexión no la hacen crecer sin límite. Las métricas son por proceso.
+"""
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+
+# Muestra de la petición en curso; se propaga a sync_to_async
+current_sample = ContextVar('current_sample', default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Histograma log-lineal de enteros no negativos: ``2 ** sub_bits`` valores
+    exactos y luego ``2 ** (sub_bits - 1)`` cubetas por potencia de dos
+    (error relativo menor a ``2 ** (1 - sub_bits)``).
+    """
+
+    def __init__(self, sub_bits=5):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def bucket(self, value):
+        shift = value.bit_length() - self.sub_bits
+        if shift <= 0:
+            return value
+        return shift * self.half + (value >> shift)
+
+    def bucket_value(self, index):
+        """
+        Valor representativo (punto medio) de la cubeta ``index``.
+        """
+        if index < 2 * self.half:
+            return index
+        shift = index // self.half - 1
+        top = index - shift * self.half
+        return (top << shift) + (1 << (shift - 1))
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+
+class EndpointMetrics:
+    """
+    Histogramas de un endpoint. Los tiempos se guardan en microsegundos.
+    """
+
+    fields = ('duration_us', 'db_queries', 'db_us', 'serializer_us', 'response_bytes')
+
+    def __init__(self):
+        for field in self.fields:
+            setattr(self, field, Histogram())
+
+    def merge(self, other):
+        for field in self.fields:
+            getattr(self, field).merge(getattr(other, field))
+
+
+class RequestSample:
+    """
+    Acumuladores de una petición en curso.
+    """
+
+    __slots__ = ('db_queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+class ShardOwner:
+    """
+    Copia de un hilo; vive en su ``threading.local`` y se libera al terminar
+    el hilo.
+    """
+
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}  # id -> copia de un hilo vivo
+        self._retired = {}  # Agregado de las copias de hilos terminados
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        owner = getattr(self._local, 'owner', None)
+        if owner is None:
+            owner = self._local.owner = ShardOwner()
+            # Sólo se toma el lock al crear la copia de un hilo nuevo
+            with self._lock:
+                self._shards[id(owner.shard)] = owner.shard
+            weakref.finalize(owner, self._retire, owner.shard)
+        return owner.shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            for endpoint, metrics in shard.items():
+                self._retired.setdefault(endpoint, EndpointMetrics()).merge(metrics)
+
+    def record(self, endpoint, duration, sample, response_bytes):
+        shard = self._shard()
+        metrics = shard.get(endpoint)
+        if metrics is None:
+            metrics = shard[endpoint] = EndpointMetrics()
+        metrics.duration_us.record(duration * 1e6)
+        metrics.db_queries.record(sample.db_queries)
+        metrics.db_us.record(sample.db_time * 1e6)
+        metrics.serializer_us.record(sample.serializer_time * 1e6)
+        if response_bytes is not None:
+            metrics.response_bytes.record(response_bytes)
+
+    def snapshot(self):
+        """
+        Combina las copias de todos los hilos: ``{endpoint: EndpointMetrics}``.
+        """
+        merged = {}
+        with self._lock:
+            shards = list(self._shards.values())
+            for endpoint, metrics in self._retired.items():
+                merged.setdefault(endpoint, EndpointMetrics()).merge(metrics)
+        for shard in shards:
+            for endpoint, metrics in list(shard.items()):
+                merged.setdefault(endpoint, EndpointMetrics()).merge(metrics)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.clear()
+            self._retired.clear()
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    ``execute_wrapper`` instalado de forma permanente en cada conexión; sólo
+    mide cuando la petición en curso fue muestreada.
+    """
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.db_time += time.perf_counter() - start
+        sample.db_queries += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(func):
+    """
+    Cuenta el tiempo de ``func`` como serialización de la petición en curso;
+    también lo usan las lecturas que no pasan por serializadores
+    (projections.py).
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        sample = current_sample.get()
+        if sample is None:
+            return func(*args, **kwargs)
+        # Los serializadores anidados no se cuentan dos veces
+        sample.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sample.serializer_depth -= 1
+            if not sample.serializer_depth:
+                sample.serializer_time += time.perf_counter() - start
+    return wrapper
+
+
+_original_serializer_data = BaseSerializer.data
+_timed_serializer_data = timed_serialization(_original_serializer_data.fget)
+
+
+def install():
+    """
+    Instala el medidor de consultas en las conexiones (actuales y futuras) y
+    el de serialización en ``BaseSerializer.data``. Es idempotente.
+    """
+    connection_created.connect(install_query_recorder, dispatch_uid='metrics_query_recorder')
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+    if BaseSerializer.data is _original_serializer_data:
+        BaseSerializer.data = property(_timed_serializer_data)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# (familia Prometheus, campo de EndpointMetrics, escala, ayuda)
+PROMETHEUS_FAMILIES = (
+    ('http_request_duration_seconds', 'duration_us', 1e-6, 'Tiempo total de la petición'),
+    ('http_request_db_queries', 'db_queries', 1, 'Consultas SQL por petición'),
+    ('http_request_db_duration_seconds', 'db_us', 1e-6, 'Tiempo en consultas SQL por petición'),
+    ('http_request_serializer_duration_seconds', 'serializer_us', 1e-6, 'Tiempo de serialización por petición'),
+    ('http_response_size_bytes', 'response_bytes', 1, 'Tamaño de la respuesta'),
+)
+
+
+def render_prometheus(snapshot, sample_rate):
+    """
+    Formato de texto de Prometheus (0.0.4): un ``summary`` por métrica con
+    los cuantiles 0.5/0.95/0.99 de cada endpoint.
+    """
+    lines = [
+        '# HELP http_metrics_sample_rate Fracción de peticiones medidas',
+        '# TYPE http_metrics_sample_rate gauge',
+        'http_metrics_sample_rate %g' % sample_rate,
+    ]
+    for family, field, scale, help_text in PROMETHEUS_FAMILIES:
+        lines.append('# HELP %s %s' % (family, help_text))
+        lines.append('# TYPE %s summary' % family)
+        for endpoint in sorted(snapshot):
+            histogram = getattr(snapshot[endpoint], field)
+            label = 'endpoint="%s"' % _escape(endpoint)
+            for q in QUANTILES:
+                lines.append('%s{%s,quantile="%g"} %g' % (family, label, q, histogram.quantile(q) * scale))
+            lines.append('%s_sum{%s} %g' % (family, label, histogram.total * scale))
+            lines.append('%s_count{%s} %d' % (family, label, histogram.count))
+    return '\n'.join(lines) + '\n'
+
+
+def summarize_snapshot(snapshot):
+    """
+    ``{endpoint: {campo: {'count', 'p50', 'p95', 'p99', 'max'}}}`` para
+    reportes (comando ``metrics``).
+    """
+    return {
+        endpoint: {
+            field: dict(
+                {'count': histogram.count, 'max': histogram.max},
+                **{'p%d' % round(q * 100): histogram.quantile(q) for q in QUANTILES}
+            )
+            for field in EndpointMetrics.fields
+            for histogram in [getattr(metrics, field)]
+        }
+        for endpoint, metrics in snapshot.items()
+    }
@@ -1,29 +1,84 @@
 # authentication/middleware.py
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
 from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 from django.urls import resolve
 from django.conf import settings
 
+from . import metrics
+from .authentication import get_raw_token
+from .blacklist import revoke_access_tokens_enabled, revoked_tokens
+from .replicas import RequestPin, current_pin, replica_set
+from .routes import PUBLIC, get_route_table
+
+
 class JWTAuthenticationMiddleware:
+    # Funciona igual bajo WSGI y ASGI: validar el token no toca la base de
+    # datos, así que en modo async no se necesita sync_to_async
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # URLs que no requieren autenticación
-        self.public_urls = [
-            '/api/auth/login/',
-            '/api/auth/register/',
-            '/api/auth/token/refresh/',
-            '/admin/',
-            '/static/',
-        ]
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.authenticate(request)
+        if response is None and self.check_revocation(request):
+            response = self.reject_revoked(request)
+        return response or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.authenticate(request)
+        if response is None and self.check_revocation(request):
+            # Sólo un acierto del filtro de Bloom consulta la base de datos
+            if await revoked_tokens.ais_revoked(request.jwt_token[api_settings.JTI_CLAIM]):
+                response = self.revoked_response()
+        return response or await self.get_response(request)
+
+    @staticmethod
+    def check_revocation(request):
+        return revoke_access_tokens_enabled() and getattr(request, 'jwt_token', None) is not None
+
+    def reject_revoked(self, request):
+        if revoked_tokens.is_revoked(request.jwt_token[api_settings.JTI_CLAIM]):
+            return self.revoked_response()
+        return None
+
+    @staticmethod
+    def revoked_response():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'No autorizado - Token revocado'
+        }, status=401)
+
+    def authenticate(self, request):
+        """
+        Valida el token de la petición. Retorna una respuesta 401 si falta o
+        es inválido, o ``None`` para continuar con la petición.
+        """
+        # Política de la ruta (ROUTE_POLICIES / @route_policy); ver routes.py
+        request.route_policy = get_route_table().match(request.path)
+
         # No verificar autenticación para URLs públicas
-        if any(request.path.startswith(url) for url in self.public_urls):
-            return self.get_response(request)
+        if request.route_policy.kind == PUBLIC:
+            return None
+
+        # Verificar token de acceso en cookie (o encabezado Authorization)
+        access_token = get_raw_token(request)
 
-        # Verificar token de acceso en cookie
-        access_token = request.COOKIES.get('access_token')
-        
         if not access_token:
             return JsonResponse({
                 'status': 'error',
@@ -31,20 +86,152 @@ class JWTAuthenticationMiddleware:
             }, status=401)
 
         try:
-            # Validar token
-            AccessToken(access_token)
-            return self.get_response(request)
-        except Exception:
+            # Validar token una sola vez; ClaimsJWTAuthentication lo reutiliza
+            token = AccessToken(access_token)
+        except TokenError:
             return JsonResponse({
                 'status': 'error',
                 'message': 'No autorizado - Token inválido'
             }, status=401)
 
+        request.jwt_token = token
+        request.jwt_claims = token.payload
+        return None
+
+
 class DisableCSRFForAPI:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         if request.path.startswith('/auth/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+    Mide una fracción ``METRICS_SAMPLE_RATE`` de las peticiones y las agrega
+    por nombre de URL (ver metrics.py). Debe ir al principio de MIDDLEWARE
+    para incluir el tiempo del resto de la cadena.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        metrics.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        sample = metrics.RequestSample()
+        token = metrics.current_sample.set(sample)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_sample.reset(token)
+        self.record(request, response, time.perf_counter() - start, sample)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        sample = metrics.RequestSample()
+        token = metrics.current_sample.set(sample)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_sample.reset(token)
+        self.record(request, response, time.perf_counter() - start, sample)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, sample):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match is not None else '<sin ruta>'
+        # Las respuestas streaming no tienen tamaño conocido de antemano
+        size = None if response.streaming else len(response.content)
+        metrics.registry.record(endpoint, duration, sample, size)
+
+
+class ReplicaPinningMiddleware:
+    """
+    Fija al primario las lecturas de una petición tras escribir en un modelo
+    replicado y, con una cookie, las de las peticiones siguientes del mismo
+    cliente durante ``REPLICA_PIN_SECONDS`` (ver replicas.py). Sin
+    ``DATABASE_REPLICAS`` no se instala.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'replica_pin')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        pin = RequestPin(pinned=self.cookie_name in request.COOKIES)
+        token = current_pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_pin.reset(token)
+        return self.set_cookie(pin, response)
+
+    async def __acall__(self, request):
+        pin = RequestPin(pinned=self.cookie_name in request.COOKIES)
+        token = current_pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_pin.reset(token)
+        return self.set_cookie(pin, response)
+
+    def process_exception(self, request, exception):
+        """
+        Una réplica que cae entre dos verificaciones hace fallar la consulta:
+        se sacan de la rotación las réplicas que leyó la petición y la vista
+        se repite una vez con las lecturas en el primario. Sólo en métodos
+        seguros (no escriben, repetirlas no duplica nada) y vistas síncronas.
+        """
+        pin = current_pin.get()
+        if (
+            not isinstance(exception, DatabaseError) or pin is None or pin.pinned or not pin.replicas
+            or request.method not in SAFE_METHODS or request.resolver_match is None
+        ):
+            return None
+        callback, args, kwargs = request.resolver_match
+        if iscoroutinefunction(callback):
+            return None
+        for alias in pin.replicas:
+            replica_set.mark_down(alias)
+        pin.pinned = True
+        return callback(request, *args, **kwargs)
+
+    def set_cookie(self, pin, response):
+        if pin.wrote:
+            response.set_cookie(self.cookie_name, '1', max_age=replica_set.pin_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # auth_user es de django.contrib.auth: el índice por email (registro y
+        # creación de usuarios verifican que no esté repetido) va como SQL
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            'DROP INDEX IF EXISTS auth_user_email_idx',
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['sort_order', 'name'], name='auth_menu_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['parent', 'sort_order', 'name'], name='auth_menu_parent_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name'], name='auth_role_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userrole',
+            index=models.Index(fields=['role', 'user'], name='auth_userrole_role_user_idx'),
+        ),
+    ]
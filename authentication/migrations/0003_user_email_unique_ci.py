@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_access_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Email único sin distinguir mayúsculas (ver registration.py). NULLIF
+        # deja fuera los emails vacíos: los usuarios sin email no chocan. Falla
+        # si ya hay emails repetidos; se deben depurar antes de migrar.
+        migrations.RunSQL(
+            [
+                'DROP INDEX IF EXISTS auth_user_email_idx',
+                "CREATE UNIQUE INDEX auth_user_email_ci_uniq ON auth_user (LOWER(NULLIF(email, '')))",
+            ],
+            [
+                'DROP INDEX IF EXISTS auth_user_email_ci_uniq',
+                'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+# Permiso que exige /auth/metrics/ (ver metrics_view en views.py)
+METRICS_PERMISSION = {'codename': 'view_metrics', 'name': 'Ver métricas'}
+
+
+def create_permission(apps, schema_editor):
+    Permission = apps.get_model('authentication', 'Permission')
+    Permission.objects.get_or_create(codename=METRICS_PERMISSION['codename'], defaults={
+        'name': METRICS_PERMISSION['name'],
+        'description': 'Consultar las métricas por endpoint (Prometheus y comando metrics)',
+    })
+
+
+def delete_permission(apps, schema_editor):
+    Permission = apps.get_model('authentication', 'Permission')
+    Permission.objects.filter(codename=METRICS_PERMISSION['codename']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_user_email_unique_ci'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_permission, delete_permission),
+    ]
@@ -25,6 +25,10 @@ class Role(models.Model):
     class Meta:
         verbose_name = 'Rol'
         verbose_name_plural = 'Roles'
+        indexes = [
+            # role_list y los selectores de roles sólo leen roles activos
+            models.Index(fields=['name'], condition=models.Q(is_active=True), name='auth_role_active_idx'),
+        ]
 
 
 class Permission(models.Model):
@@ -68,6 +72,10 @@ class UserRole(models.Model):
         unique_together = ('user', 'role')
         verbose_name = 'Rol de Usuario'
         verbose_name_plural = 'Roles de Usuario'
+        indexes = [
+            # Usuarios de un rol (listado de usuarios ?role=) en orden de id
+            models.Index(fields=['role', 'user'], name='auth_userrole_role_user_idx'),
+        ]
 
 
 class RolePermission(models.Model):
@@ -116,4 +124,10 @@ class Menu(models.Model):
     class Meta:
         verbose_name = 'Menú'
         verbose_name_plural = 'Menús'
-        ordering = ['sort_order', 'name']
\ No newline at end of file
+        ordering = ['sort_order', 'name']
+        indexes = [
+            # Árbol de menús activos (menus.py) e hijos de un menú, ya ordenados
+            models.Index(fields=['sort_order', 'name'], condition=models.Q(is_active=True),
+                         name='auth_menu_active_order_idx'),
+            models.Index(fields=['parent', 'sort_order', 'name'], name='auth_menu_parent_order_idx'),
+        ]
\ No newline at end of file
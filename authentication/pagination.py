@@ -0,0 +1,14 @@
+# authentication/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre ``id``: cada página es un
+    ``WHERE id > cursor ORDER BY id LIMIT n``, así que su costo no crece con el
+    número de páginas ya recorridas ni con el total de usuarios.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,38 @@
+# authentication/permissions.py
+from rest_framework.permissions import BasePermission
+
+from .claims import has_permissions
+
+
+class HasPermissions(BasePermission):
+    """
+    Permite el acceso sólo si el usuario tiene todos los permisos requeridos.
+
+    Los codenames se toman del atributo ``codenames`` de la clase (ver
+    ``permission_required``) o del atributo ``required_permissions`` de la
+    vista. La verificación usa los bits de permisos del token (ver claims.py)
+    y, si el token no los trae vigentes, la caché de permisos efectivos; en
+    ningún caso consulta la base de datos en cada petición.
+    """
+    codenames = frozenset()
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+
+        required = self.codenames or frozenset(getattr(view, 'required_permissions', ()))
+        if not required:
+            return True
+        return has_permissions(request, required)
+
+
+def permission_required(*codenames):
+    """
+    Crea una clase de permiso DRF que exige los codenames indicados.
+
+    Uso::
+
+        @permission_classes([permission_required('crear_usuario')])
+    """
+    return type('HasPermissions', (HasPermissions,), {'codenames': frozenset(codenames)})
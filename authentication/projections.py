@@ -0,0 +1,139 @@
+# authentication/projections.py
+"""
+Lecturas sin serializador para los listados más consultados.
+
+``get_projection(SerializerClass)`` compila una vez, a partir de los campos
+declarados en el serializador, las columnas para ``.values()`` y la
+conversión de cada valor. ``rows(queryset)`` produce los mismos diccionarios
+que ``SerializerClass(queryset, many=True).data`` (mismas claves, orden y
+representación), pero sin instanciar modelos ni recorrer la maquinaria de
+campos de DRF por cada fila.
+
+Sólo se proyectan campos que leen directamente una columna del modelo;
+``SerializerMethodField``, serializadores anidados o ``source`` con puntos
+lanzan ``ImproperlyConfigured`` (se excluyen y la vista los arma aparte).
+Las vistas usan las proyecciones si ``FAST_READ_PATHS`` está activo.
+"""
+from datetime import datetime
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .metrics import timed_serialization
+
+
+# Campos cuya representación de un valor ya leído de la base de datos es el
+# mismo valor (str, int o bool); el resto usa su ``to_representation``
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def converter_for(field, current_timezone):
+    """
+    Función que representa un valor no nulo de ``field`` (``None`` si es el
+    mismo valor).
+    """
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (
+        isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+        and current_timezone is not None and isinstance(output_format, str) and output_format.lower() == ISO_8601
+    ):
+        return partial(iso_datetime, current_timezone, field.to_representation)
+    return field.to_representation
+
+
+def iso_datetime(current_timezone, fallback, value):
+    # DateTimeField.to_representation con ISO_8601 y la zona ya resuelta
+    if not isinstance(value, datetime) or value.tzinfo is None:
+        return fallback(value)
+    value = value.astimezone(current_timezone).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def fast_reads_enabled():
+    return getattr(settings, 'FAST_READ_PATHS', True)
+
+
+class Projection:
+    def __init__(self, serializer_class, fields=None, exclude=()):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.serializer_class = serializer_class
+        self.names = []
+        self.columns = []
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only or name in exclude or (fields is not None and name not in fields):
+                continue
+            self.names.append(name)
+            self.columns.append(self.column_for(model, name, field))
+            self.fields.append(field)
+
+    def column_for(self, model, name, field):
+        if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) or len(field.source_attrs) != 1:
+            raise ImproperlyConfigured(
+                '%s.%s no se puede proyectar con .values()' % (self.serializer_class.__name__, name)
+            )
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                '%s.%s no es un campo de %s' % (self.serializer_class.__name__, name, model.__name__)
+            )
+        if model_field.many_to_many or model_field.one_to_many:
+            raise ImproperlyConfigured(
+                '%s.%s es una relación múltiple' % (self.serializer_class.__name__, name)
+            )
+        # Para una FK, .values('role') retorna el id, igual que PrimaryKeyRelatedField
+        return model_field.name
+
+    def bind(self):
+        """
+        Conversores de cada campo para la petición en curso. La zona horaria
+        activa se resuelve aquí una vez, no en cada fecha como
+        ``DateTimeField.to_representation``.
+        """
+        current = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [converter_for(field, current) for field in self.fields]
+
+    def row(self, values, converters=None):
+        """
+        Convierte una fila de ``.values(*self.columns)`` en la representación
+        del serializador. ``None`` no se convierte, como en DRF.
+        """
+        result = {}
+        for name, column, convert in zip(self.names, self.columns, converters or self.bind()):
+            value = values[column]
+            result[name] = value if convert is None or value is None else convert(value)
+        return result
+
+    @timed_serialization
+    def convert(self, rows):
+        row, converters = self.row, self.bind()
+        return [row(values, converters) for values in rows]
+
+    def rows(self, queryset):
+        return self.convert(queryset.values(*self.columns))
+
+    async def arows(self, queryset):
+        return self.convert([values async for values in queryset.values(*self.columns)])
+
+
+@lru_cache(maxsize=None)
+def get_projection(serializer_class, fields=None, exclude=()):
+    """
+    Proyección compilada (una vez por proceso) de ``serializer_class``;
+    ``fields`` y ``exclude`` son tuplas de nombres de campo.
+    """
+    return Projection(serializer_class, fields, exclude)
@@ -0,0 +1,61 @@
+# authentication/queries.py
+"""
+Planeación de consultas a partir de los serializadores.
+
+Cada serializador puede declarar en su ``Meta`` las relaciones que necesita
+(``select_related`` / ``prefetch_related``); además, los serializadores
+anidados (``role = RoleSerializer(read_only=True)``) se detectan solos y sus
+propias declaraciones se agregan con el prefijo correspondiente. Las vistas
+sólo llaman ``plan_queryset(queryset, SerializerClass)``.
+"""
+import copy
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _prefixed(prefix, lookup):
+    if isinstance(lookup, Prefetch):
+        lookup = copy.copy(lookup)
+        lookup.add_prefix(prefix)
+        return lookup
+    return '%s__%s' % (prefix, lookup)
+
+
+@lru_cache(maxsize=None)
+def get_query_plan(serializer_class):
+    """
+    Retorna ``(select_related, prefetch_related)`` para ``serializer_class``.
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    select = list(getattr(meta, 'select_related', ()))
+    prefetch = list(getattr(meta, 'prefetch_related', ()))
+
+    for field in serializer_class().fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        source = field.source.replace('.', '__')
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+            child_select, child_prefetch = get_query_plan(type(field.child))
+            prefetch.append(source)
+            prefetch.extend(_prefixed(source, lookup) for lookup in child_select + child_prefetch)
+        elif isinstance(field, serializers.ModelSerializer):
+            child_select, child_prefetch = get_query_plan(type(field))
+            select.append(source)
+            select.extend(_prefixed(source, lookup) for lookup in child_select)
+            prefetch.extend(_prefixed(source, lookup) for lookup in child_prefetch)
+
+    return tuple(select), tuple(prefetch)
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Aplica al queryset las relaciones que necesita ``serializer_class``.
+    """
+    select, prefetch = get_query_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,168 @@
+# authentication/query_audit.py
+"""
+Auditoría de planes de consulta de las vistas de authentication.
+
+``audit`` ejecuta las peticiones de ``AUDIT_REQUESTS`` con el cliente de
+pruebas, captura el SQL que emite cada una y obtiene su ``EXPLAIN QUERY
+PLAN`` (SQLite). Se marcan los recorridos completos de tabla (``SCAN tabla``
+sin índice) y los ordenamientos con un B-tree temporal, salvo en las tablas
+de ``allowed``: con pocas filas no se notan, pero crecen con la tabla. Lo
+usa el comando ``audit_queries``.
+"""
+import re
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Menu, Permission, Role, RolePermission, UserRole
+
+
+# Tablas que se leen completas a propósito en cualquier petición: las
+# asignaciones de menús a roles se cargan enteras en caché (menus.py)
+DEFAULT_ALLOWED_SCANS = ('authentication_menu_roles',)
+
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# SQLite < 3.36 escribe "SCAN TABLE tabla"; las versiones nuevas, "SCAN tabla"
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_BTREE = re.compile(r'^USE TEMP B-TREE FOR (.+)$')
+
+AUDIT_PASSWORD = 'Auditoria-2024!'
+
+# (etiqueta, método, nombre de URL, datos[, tablas que puede recorrer]). Los
+# datos pueden ser una función de ``context`` (objetos creados al sembrar).
+# El login va primero: deja las cookies con las que se hacen las demás
+# peticiones.
+USER_LIST_SCAN = {'auth_user'}  # El listado pagina recorriendo la tabla por id
+# Las rutas que emiten tokens cargan el registro completo de permisos (claims.py)
+REGISTRY_SCAN = {'authentication_permission'}
+
+AUDIT_REQUESTS = [
+    ('login', 'post', 'login', {'username': 'auditor', 'password': AUDIT_PASSWORD}, REGISTRY_SCAN),
+    # Antes del registro, que deja las cookies del usuario nuevo (sin view_metrics)
+    ('métricas', 'get', 'metrics', None),
+    ('registro', 'post', 'register', {
+        'username': 'nuevo', 'email': 'nuevo@example.com', 'password': AUDIT_PASSWORD, 'password2': AUDIT_PASSWORD,
+    }),
+    ('refresh', 'post', 'token-refresh', None, REGISTRY_SCAN),
+    ('usuario actual', 'get', 'user-info', None),
+    ('usuario actual async', 'get', 'user-info-async', None),
+    ('usuarios', 'get', 'user-list', None, USER_LIST_SCAN),
+    ('usuarios por rol', 'get', 'user-list', lambda context: {'is_active': 'true', 'role': context['role'].id}),
+    ('usuarios (stream)', 'get', 'user-list', {'stream': '1'}, USER_LIST_SCAN),
+    ('crear usuario', 'post', 'user-create', {'username': 'creado', 'email': 'creado@example.com', 'password': AUDIT_PASSWORD}),
+    ('crear usuarios', 'post', 'user-bulk-create', [
+        {'username': 'masivo%d' % i, 'email': 'masivo%d@example.com' % i, 'password': AUDIT_PASSWORD} for i in range(3)
+    ]),
+    ('importar registros', 'post', 'user-import', [
+        {'username': 'importado%d' % i, 'email': 'importado%d@example.com' % i,
+         'password': AUDIT_PASSWORD, 'password2': AUDIT_PASSWORD} for i in range(3)
+    ]),
+    ('roles', 'get', 'role-list', None),
+    ('roles async', 'get', 'role-list-async', None),
+    ('crear rol', 'post', 'role-create', {'name': 'Auditor externo'}),
+    ('roles del usuario', 'get', 'user-roles', None),
+    ('roles del usuario async', 'get', 'user-roles-async', None),
+    ('asignar rol', 'post', 'role-assign', lambda context: {'user_id': context['other'].id, 'role_id': context['role'].id}),
+    ('asignar roles', 'post', 'role-bulk-assign', lambda context: [
+        {'user_id': context['other'].id, 'role_id': role.id} for role in context['roles'][1:]
+    ]),
+    ('menú', 'get', 'user-menu', None),
+    ('logout', 'post', 'logout', None),
+    ('login async', 'post', 'login-async', {'username': 'auditor', 'password': AUDIT_PASSWORD}, REGISTRY_SCAN),
+    ('logout async', 'post', 'logout-async', None),
+]
+
+
+def seed_audit_data():
+    """
+    Datos mínimos para que cada vista recorra sus consultas: un usuario con
+    roles, permisos y menús, y otro usuario al que asignarle roles.
+    """
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    user = User.objects.create_user('auditor', 'auditor@example.com', AUDIT_PASSWORD)
+    other = User.objects.create_user('asignado', 'asignado@example.com', AUDIT_PASSWORD)
+    roles = [Role.objects.create(name=name) for name in ('Administrador', 'Despachador', 'Supervisor')]
+    permission = Permission.objects.create(name='Ver reportes', codename='view_reports')
+    # Lo crea la migración 0004; /auth/metrics/ lo exige
+    view_metrics = Permission.objects.get(codename='view_metrics')
+    for role in roles:
+        UserRole.objects.create(user=user, role=role, assigned_by=user)
+        RolePermission.objects.create(role=role, permission=permission)
+    RolePermission.objects.create(role=roles[0], permission=view_metrics)
+    root = Menu.objects.create(name='Inicio', path='/', component='Home')
+    child = Menu.objects.create(name='Reportes', path='/reportes', component='Reports', parent=root)
+    for menu in (root, child):
+        menu.roles.set(roles)
+    return {'user': user, 'other': other, 'role': roles[0], 'roles': roles}
+
+
+def explain(connection, sql):
+    """
+    Líneas de ``EXPLAIN QUERY PLAN`` de una consulta ya interpolada.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_issues(plan, allowed=DEFAULT_ALLOWED_SCANS):
+    """
+    Líneas del plan que recorren una tabla completa o usan un B-tree
+    temporal, excepto en las tablas de ``allowed``.
+    """
+    issues = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) not in allowed:
+            issues.append(detail)
+        elif TEMP_BTREE.match(detail):
+            issues.append(detail)
+    return issues
+
+
+def audit(requests=None, allowed=DEFAULT_ALLOWED_SCANS, using='default', context=None):
+    """
+    Ejecuta ``requests`` y retorna una lista de consultas auditadas:
+    ``{'request', 'status', 'sql', 'plan', 'issues'}``. Requiere una base de
+    datos de pruebas con ``seed_audit_data`` (o un ``context`` equivalente).
+    """
+    requests = AUDIT_REQUESTS if requests is None else requests
+    context = context if context is not None else seed_audit_data()
+    connection = connections[using]
+    client = Client()
+    results = []
+    for label, method, url_name, data, *request_allowed in requests:
+        request_allowed = set(allowed).union(*request_allowed)
+        if callable(data):
+            data = data(context)
+        kwargs = {} if method == 'get' else {'content_type': 'application/json'}
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(client, method)(reverse(url_name), data, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+            plan = explain(connection, sql)
+            results.append({
+                'request': label,
+                'status': response.status_code,
+                'sql': sql,
+                'plan': plan,
+                'issues': plan_issues(plan, request_allowed),
+            })
+    return results
+
+
+def uncovered_url_names(urlpatterns, requests=None):
+    """
+    Nombres de URL de ``urlpatterns`` que ninguna petición auditada visita.
+    """
+    requests = AUDIT_REQUESTS if requests is None else requests
+    visited = {request[2] for request in requests}
+    return sorted(pattern.name for pattern in urlpatterns if pattern.name and pattern.name not in visited)
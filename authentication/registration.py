@@ -0,0 +1,125 @@
+# authentication/registration.py
+"""
+Unicidad de username y email en las altas de usuarios.
+
+``find_taken`` verifica username y email de uno o muchos usuarios en una sola
+consulta, ``username IN (...) OR LOWER(NULLIF(email, '')) IN (...)``. SQLite
+la resuelve con dos búsquedas por índice: el índice único de username y el
+índice único funcional sobre el email de la migración 0003. Antes se hacía
+un ``exists()`` por campo, y el de email recorría ``auth_user``. El SQL se
+arma una vez por cantidad de valores: compilar la consulta con el ORM
+costaba diez veces más que ejecutarla.
+
+La verificación previa sólo da mensajes claros: dos registros simultáneos la
+pueden pasar a la vez. La garantía la dan las restricciones únicas de la base
+de datos. ``save_new_user`` inserta dentro de un savepoint y, si el INSERT
+choca, vuelve a consultar qué campo está tomado y lanza el mismo
+``ValidationError`` que la verificación previa.
+
+El email se compara sin distinguir mayúsculas. ``normalize_email`` sólo pasa
+el dominio a minúsculas, así que ``Ana@x.com`` y ``ana@x.com`` se guardan
+distintos pero son el mismo correo para el índice. Los emails vacíos no
+cuentan: varios usuarios pueden no tener email.
+"""
+import string
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, router, transaction
+from rest_framework import serializers
+
+
+User = get_user_model()
+
+USERNAME_TAKEN = 'Este nombre de usuario ya está en uso.'
+EMAIL_TAKEN = 'Este correo electrónico ya está registrado.'
+
+# LOWER de SQLite sólo cambia letras ASCII; la clave en Python hace lo mismo
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def email_key(email):
+    """
+    Valor de ``email`` en el índice único; ``None`` si está vacío.
+    """
+    return email.translate(ASCII_LOWER) if email else None
+
+
+@lru_cache(maxsize=256)
+def lookup_sql(alias, usernames, keys):
+    """
+    SELECT de ``find_taken`` para ``usernames`` y ``keys`` valores. La
+    expresión del email es la del índice, con el ``''`` literal: con un
+    parámetro, SQLite no la reconoce como la expresión del índice.
+    """
+    quote = connections[alias].ops.quote_name
+    username = quote(User._meta.get_field('username').column)
+    key = "LOWER(NULLIF(%s, ''))" % quote(User._meta.get_field('email').column)
+    conditions = []
+    if usernames:
+        conditions.append('%s IN (%s)' % (username, ', '.join(['%s'] * usernames)))
+    if keys:
+        conditions.append('%s IN (%s)' % (key, ', '.join(['%s'] * keys)))
+    return 'SELECT %s, %s FROM %s WHERE %s' % (username, key, quote(User._meta.db_table), ' OR '.join(conditions))
+
+
+def find_taken(usernames, emails):
+    """
+    Retorna ``(usernames, claves de email)`` de ``usernames`` y ``emails`` que
+    ya están registrados, con una sola consulta.
+    """
+    usernames = list(set(usernames))
+    keys = list({key for key in map(email_key, emails) if key})
+    if not usernames and not keys:
+        return set(), set()
+    alias = router.db_for_write(User)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(lookup_sql(alias, len(usernames), len(keys)), usernames + keys)
+        rows = cursor.fetchall()
+    usernames, keys = set(usernames), set(keys)
+    taken_usernames, taken_keys = set(), set()
+    for username, key in rows:
+        if username in usernames:
+            taken_usernames.add(username)
+        if key in keys:
+            taken_keys.add(key)
+    return taken_usernames, taken_keys
+
+
+def conflict_errors(username, email, taken):
+    """
+    Errores por campo de ``username`` y ``email`` según ``taken`` (el
+    resultado de ``find_taken``).
+    """
+    taken_usernames, taken_keys = taken
+    errors = {}
+    if username in taken_usernames:
+        errors['username'] = [USERNAME_TAKEN]
+    key = email_key(email)
+    if key is not None and key in taken_keys:
+        errors['email'] = [EMAIL_TAKEN]
+    return errors
+
+
+def check_available(username, email):
+    """
+    Lanza ``ValidationError`` con los campos ya registrados.
+    """
+    errors = conflict_errors(username, email, find_taken([username], [email]))
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+def save_new_user(user):
+    """
+    Inserta ``user``. Si otra petición registró el mismo username o email
+    después de la verificación, lanza ``ValidationError`` en lugar de
+    ``IntegrityError``.
+    """
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        check_available(user.username, user.email)
+        raise
+    return user
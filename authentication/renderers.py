@@ -0,0 +1,41 @@
+# authentication/renderers.py
+"""
+Renderer JSON de DRF que usa ``orjson`` si está instalado (opcional: no está
+en requirements.txt) y, si no, el ``json`` estándar de ``JSONRenderer``.
+
+El resultado decodifica a los mismos valores que el de ``JSONRenderer`` con
+la configuración por defecto de DRF (``COMPACT_JSON`` y ``UNICODE_JSON``):
+fechas con ``Z`` para UTC, U+2028/U+2029 escapados y los tipos que orjson no
+conoce (Decimal, timedelta, textos traducibles...) pasan por el mismo
+``encoder_class``. Con indentación (API navegable) o si orjson no puede
+serializar un valor (enteros de más de 64 bits) se usa ``JSONRenderer``.
+
+Los bytes coinciden salvo en los floats que ``repr`` escribe con exponente:
+orjson escribe ``1e-05`` como ``0.00001`` y ``1e+16`` como ``1e16`` (el
+mismo número). Con ``STRICT_JSON`` un NaN lanza ``ValueError`` en
+``JSONRenderer`` y aquí se escribe ``null``.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que JSONRenderer: U+2028 y U+2029 no son válidos en JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,183 @@
+# authentication/replicas.py
+"""
+Lecturas de roles, permisos y menús desde réplicas de la base de datos.
+
+``AuthReplicaRouter`` envía las lecturas de los modelos de ``REPLICA_MODELS``
+a los alias de ``DATABASE_REPLICAS`` (en turno rotativo) y todas las
+escrituras al primario. Como las réplicas van con retraso:
+
+- Una petición que escribe en uno de esos modelos queda *fijada* al primario
+  para el resto de sus lecturas, y ``ReplicaPinningMiddleware`` deja una
+  cookie que mantiene fijadas las peticiones de ese cliente durante
+  ``REPLICA_PIN_SECONDS`` (debe superar el retraso de replicación).
+- Dentro de una transacción del primario las lecturas se quedan en él.
+- Fuera de una petición (comandos, hilos de fondo) todo va al primario.
+- Las cachés de proceso (permisos efectivos, registro de permisos, árbol de
+  menús) se cargan siempre del primario: una réplica atrasada las llenaría
+  con datos viejos por todo su TTL, no sólo por el retraso de replicación.
+
+Cada réplica se verifica con ``SELECT 1`` como mucho cada
+``REPLICA_HEALTH_INTERVAL`` segundos; si ninguna responde, las lecturas
+vuelven al primario hasta la siguiente verificación. Si una réplica falla
+entre dos verificaciones, ``ReplicaPinningMiddleware`` la saca de la rotación
+(``mark_down``) y repite la vista con las lecturas en el primario.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICA_MODELS = (
+    'authentication.role',
+    'authentication.permission',
+    'authentication.rolepermission',
+    'authentication.menu',
+    'authentication.userrole',
+)
+
+
+class RequestPin:
+    """
+    Estado de la petición en curso: ``pinned`` fuerza las lecturas al
+    primario; ``wrote`` indica que la petición escribió (y debe dejar la
+    cookie); ``replicas`` son los alias de los que leyó.
+    """
+
+    __slots__ = ('pinned', 'wrote', 'replicas')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.replicas = set()
+
+
+# Se propaga a sync_to_async: las vistas sync de una petición ASGI comparten
+# el mismo RequestPin
+current_pin = ContextVar('replica_pin', default=None)
+
+
+class ReplicaSet:
+    def __init__(self, aliases=(), models=DEFAULT_REPLICA_MODELS, check_interval=5, pin_seconds=5):
+        self.aliases = list(aliases)
+        self.models = frozenset(models)
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self._status = {}  # alias -> (disponible, verificado_en)
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            aliases=getattr(settings, 'DATABASE_REPLICAS', ()),
+            models=getattr(settings, 'REPLICA_MODELS', DEFAULT_REPLICA_MODELS),
+            check_interval=getattr(settings, 'REPLICA_HEALTH_INTERVAL', 5),
+            pin_seconds=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+        )
+
+    def routes(self, model):
+        return bool(self.aliases) and model._meta.label_lower in self.models
+
+    def check(self, alias):
+        """
+        Verifica la réplica con una consulta mínima.
+        """
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except DatabaseError:
+            logger.warning('Réplica %s no disponible; se lee del primario', alias, exc_info=True)
+            try:
+                connection.close()
+            except DatabaseError:
+                pass
+            return False
+
+    def is_healthy(self, alias):
+        status = self._status.get(alias)
+        now = time.monotonic()
+        if status is None or now - status[1] >= self.check_interval:
+            with self._lock:
+                status = self._status.get(alias)
+                if status is None or now - status[1] >= self.check_interval:
+                    status = self._status[alias] = (self.check(alias), now)
+        return status[0]
+
+    def mark_down(self, alias):
+        """
+        Saca la réplica de la rotación hasta la próxima verificación (tras un
+        error en una consulta; ver ``ReplicaPinningMiddleware``).
+        """
+        logger.warning('Réplica %s falló en una consulta; se lee del primario', alias)
+        self._status[alias] = (False, time.monotonic())
+
+    def reset(self):
+        self._status.clear()
+
+    def choose(self):
+        """
+        Una réplica disponible (en turno rotativo) o ``None``.
+        """
+        healthy = [alias for alias in self.aliases if self.is_healthy(alias)]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+
+replica_set = ReplicaSet.from_settings()
+
+
+class AuthReplicaRouter:
+    """
+    Router de los modelos de ``REPLICA_MODELS``; para el resto no decide y
+    deja pasar al siguiente router.
+    """
+
+    @staticmethod
+    def from_replica(hints):
+        instance = hints.get('instance')
+        return instance is not None and instance._state.db in replica_set.aliases
+
+    def db_for_read(self, model, **hints):
+        if not replica_set.routes(model):
+            # Las relaciones de un objeto leído de una réplica heredarían su
+            # alias; los demás modelos se leen del primario
+            return DEFAULT_DB_ALIAS if self.from_replica(hints) else None
+        pin = current_pin.get()
+        if pin is None or pin.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = replica_set.choose()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        pin.replicas.add(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        if not replica_set.routes(model):
+            return DEFAULT_DB_ALIAS if self.from_replica(hints) else None
+        pin = current_pin.get()
+        if pin is not None:
+            pin.pinned = pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que el primario
+        aliases = {DEFAULT_DB_ALIAS, *replica_set.aliases}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # El esquema llega a las réplicas por replicación
+        if db in replica_set.aliases:
+            return False
+        return None
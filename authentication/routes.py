@@ -0,0 +1,184 @@
+# authentication/routes.py
+"""
+Tabla de políticas de acceso por ruta.
+
+Las políticas se declaran en el setting ``ROUTE_POLICIES`` (prefijo -> política)
+o directamente en las vistas con el decorador ``route_policy``. Al primer uso se
+compilan en un trie por segmentos de ruta, de modo que resolver la política de
+una petición cuesta lo mismo con 5 que con 500 prefijos registrados. El
+middleware JWT y ``RoutePolicyPermission`` consultan la misma tabla.
+
+Políticas disponibles:
+- ``'public'``: no requiere token.
+- ``'authenticated'``: requiere un token válido.
+- ``'permission:<codename>[,<codename>...]'``: requiere token y los permisos.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.urls.resolvers import RoutePattern
+from rest_framework.permissions import BasePermission
+
+from .claims import has_permissions
+
+
+PUBLIC = 'public'
+AUTHENTICATED = 'authenticated'
+PERMISSION = 'permission'
+
+RoutePolicy = namedtuple('RoutePolicy', ['kind', 'codenames'])
+
+
+def parse_policy(value):
+    """
+    Convierte la representación textual de una política en ``RoutePolicy``.
+    """
+    if isinstance(value, RoutePolicy):
+        return value
+    kind, _, codenames = value.partition(':')
+    if kind not in (PUBLIC, AUTHENTICATED, PERMISSION):
+        raise ValueError('Política de ruta desconocida: %r' % value)
+    if kind == PERMISSION and not codenames:
+        raise ValueError('La política %r no declara permisos' % value)
+    return RoutePolicy(kind, frozenset(c.strip() for c in codenames.split(',') if c.strip()))
+
+
+def split_path(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+class RouteTable:
+    """
+    Trie de prefijos de ruta. Cada nodo es un dict ``segmento -> nodo`` y la
+    política (si la hay) se guarda bajo la clave ``None``; gana el prefijo más
+    largo registrado.
+    """
+
+    def __init__(self, default=AUTHENTICATED):
+        self.default = parse_policy(default)
+        self.root = {}
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def __len__(self):
+        return self._count(self.root)
+
+    def _count(self, node):
+        return sum(self._count(child) if key is not None else 1 for key, child in node.items())
+
+    def add(self, prefix, policy):
+        node = self.root
+        for segment in split_path(prefix):
+            node = node.setdefault(segment, {})
+        node[None] = parse_policy(policy)
+        self.match.cache_clear()
+
+    def _match(self, path):
+        node = self.root
+        policy = node.get(None, self.default)
+        for segment in split_path(path):
+            node = node.get(segment)
+            if node is None:
+                break
+            policy = node.get(None, policy)
+        return policy
+
+    def is_public(self, path):
+        return self.match(path).kind == PUBLIC
+
+
+def route_policy(policy):
+    """
+    Decorador para declarar la política de una vista (función o clase)::
+
+        @route_policy(PUBLIC)
+        @api_view(['POST'])
+        def register(request): ...
+
+    La ruta se toma del URLconf al compilar la tabla.
+    """
+    parsed = parse_policy(policy)
+
+    def decorator(view):
+        view.route_policy = parsed
+        return view
+    return decorator
+
+
+def get_view_policy(callback):
+    for target in (callback, getattr(callback, 'cls', None), getattr(callback, 'view_class', None)):
+        policy = getattr(target, 'route_policy', None)
+        if policy is not None:
+            return policy
+    return None
+
+
+def iter_view_policies(patterns, prefix=''):
+    """
+    Recorre el URLconf y produce ``(prefijo, política)`` para las vistas
+    decoradas con ``route_policy``. En rutas con convertidores (``<int:pk>``)
+    se usa la parte fija anterior al primer convertidor.
+    """
+    for entry in patterns:
+        if not isinstance(entry.pattern, RoutePattern):
+            continue
+        route = prefix + str(entry.pattern).split('<', 1)[0]
+        if isinstance(entry, URLResolver):
+            yield from iter_view_policies(entry.url_patterns, route)
+        elif isinstance(entry, URLPattern):
+            policy = get_view_policy(entry.callback)
+            if policy is not None:
+                yield '/' + route, policy
+
+
+@lru_cache(maxsize=None)
+def get_route_table():
+    """
+    Compila (una vez por proceso) la tabla a partir del URLconf y del setting.
+    Las entradas del setting tienen prioridad sobre los decoradores.
+    """
+    table = RouteTable(default=getattr(settings, 'ROUTE_POLICY_DEFAULT', AUTHENTICATED))
+    for prefix, policy in iter_view_policies(get_resolver().url_patterns):
+        table.add(prefix, policy)
+    for prefix, policy in getattr(settings, 'ROUTE_POLICIES', {}).items():
+        table.add(prefix, policy)
+    return table
+
+
+@receiver(setting_changed)
+def reset_route_table(setting, **kwargs):
+    if setting in ('ROUTE_POLICIES', 'ROUTE_POLICY_DEFAULT', 'ROOT_URLCONF'):
+        get_route_table.cache_clear()
+
+
+def get_request_policy(request):
+    """
+    Política de la petición; reutiliza la resuelta por el middleware si existe.
+    """
+    request = getattr(request, '_request', request)
+    policy = getattr(request, 'route_policy', None)
+    if policy is None:
+        policy = get_route_table().match(request.path)
+    return policy
+
+
+class RoutePolicyPermission(BasePermission):
+    """
+    Permiso DRF que aplica la política de la tabla de rutas: las rutas públicas
+    pasan, las autenticadas exigen usuario y las de permiso verifican los
+    codenames con los claims del token o la caché de permisos efectivos.
+    """
+
+    def has_permission(self, request, view):
+        policy = get_request_policy(request)
+        if policy.kind == PUBLIC:
+            return True
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if policy.kind == PERMISSION:
+            return has_permissions(request, policy.codenames)
+        return True
@@ -0,0 +1,229 @@
+# authentication/seeding.py
+"""
+Generador de datos sintéticos para pruebas de escala: usuarios, roles,
+permisos, asignaciones y árboles de menús.
+
+``SeedGenerator`` es determinista: con la misma semilla, el mismo prefijo y
+los mismos parámetros genera las mismas filas. Todos los usuarios comparten
+un hash de contraseña calculado una sola vez, y cada tabla se inserta por
+bloques de ``chunk_size`` filas con un ``executemany`` por bloque, cada uno en
+su propia transacción. Con cientos de miles de filas, compilar el INSERT de
+``bulk_create`` cuesta más que ejecutarlo (igual que en
+``dashboard.ingestion``).
+
+Los ids se asignan explícitamente a partir del máximo de la tabla dentro de
+la transacción de cada bloque. Después se reajustan las secuencias del
+motor (no aplica en SQLite). Como no se pasa por ``save()``, al terminar se
+invalidan la caché y el registro de permisos y los contadores de las ETags,
+igual que en las altas masivas.
+
+Las cantidades variables (roles por usuario, hijos por menú...) son
+``Distribution``: ``'3'`` (siempre 3), ``'1-3'`` (uniforme entre 1 y 3) o
+``'1:60,2:30,3:10'`` (valor:peso).
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import permissions_cache
+from .claims import permission_registry
+from .etags import change_counters
+from .models import Menu, Permission, Role, RolePermission, UserRole
+
+
+User = get_user_model()
+
+SEED_PASSWORD = 'Semilla-Segura-2024!'
+
+
+class Distribution:
+    def __init__(self, values, weights=None):
+        if not values or any(value < 0 for value in values):
+            raise ValueError('La distribución necesita valores no negativos')
+        self.values = list(values)
+        self.weights = list(weights) if weights is not None else None
+
+    @classmethod
+    def parse(cls, text):
+        text = str(text).strip()
+        if ':' in text:
+            pairs = [part.split(':') for part in text.split(',')]
+            return cls([int(value) for value, _ in pairs], [float(weight) for _, weight in pairs])
+        if '-' in text:
+            low, high = (int(part) for part in text.split('-', 1))
+            if low > high:
+                raise ValueError('Rango vacío: %s' % text)
+            return cls(range(low, high + 1))
+        return cls([int(text)])
+
+    def sample(self, rng):
+        if len(self.values) == 1:
+            return self.values[0]
+        if self.weights is None:
+            return rng.choice(self.values)
+        return rng.choices(self.values, self.weights)[0]
+
+    def __str__(self):
+        if self.weights is not None:
+            return ','.join('%d:%g' % pair for pair in zip(self.values, self.weights))
+        if len(self.values) == 1:
+            return str(self.values[0])
+        return '%d-%d' % (self.values[0], self.values[-1])
+
+
+class SeedGenerator:
+    def __init__(self, seed=0, prefix='seed', password=SEED_PASSWORD, chunk_size=10000, using=None, progress=None):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.password = make_password(password)
+        self.chunk_size = chunk_size
+        self.using = using or router.db_for_write(User)
+        self.connection = connections[self.using]
+        # progress(tabla, filas insertadas, total) después de cada bloque
+        self.progress = progress
+        self.counts = {}
+        self.now = timezone.now()
+
+    def stamp(self, model, name='created_at'):
+        # Todas las filas comparten la fecha: se adapta una vez por tabla
+        return model._meta.get_field(name).get_db_prep_value(self.now, self.connection)
+
+    def insert(self, model, names, rows, total, with_ids=False):
+        """
+        Inserta ``rows`` (tuplas con los valores de ``names``) por bloques. Con
+        ``with_ids`` cada bloque toma ids consecutivos desde el máximo de la
+        tabla y se retorna la lista de ids, en el orden de ``rows``.
+        """
+        meta = model._meta
+        quote = self.connection.ops.quote_name
+        columns = [meta.get_field(name).column for name in names]
+        if with_ids:
+            columns.insert(0, meta.pk.column)
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            quote(meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        ids, done, rows = [], 0, iter(rows)
+        while True:
+            chunk = [row for _, row in zip(range(self.chunk_size), rows)]
+            if not chunk:
+                break
+            with transaction.atomic(using=self.using):
+                if with_ids:
+                    start = (model._default_manager.db_manager(self.using).aggregate(top=Max('pk'))['top'] or 0) + 1
+                    chunk = [(start + offset,) + row for offset, row in enumerate(chunk)]
+                    ids.extend(range(start, start + len(chunk)))
+                with self.connection.cursor() as cursor:
+                    cursor.executemany(sql, chunk)
+            done += len(chunk)
+            if self.progress:
+                self.progress(meta.db_table, done, total)
+        if with_ids:
+            self.reset_sequences(model)
+        self.counts[meta.db_table] = self.counts.get(meta.db_table, 0) + done
+        return ids
+
+    def reset_sequences(self, model):
+        statements = self.connection.ops.sequence_reset_sql(no_style(), [model])
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def username(self, index):
+        return '%s-%d' % (self.prefix, index)
+
+    def users(self, count):
+        created = self.stamp(User, 'date_joined')
+        names = (
+            'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'date_joined',
+        )
+        rows = (
+            (self.password, None, False, username, '', '', '%s@example.com' % username, False, True, created)
+            for username in map(self.username, range(count))
+        )
+        return self.insert(User, names, rows, count, with_ids=True)
+
+    def roles(self, count, label='rol'):
+        created = self.stamp(Role)
+        rows = (('%s %s %d' % (self.prefix, label, i), None, True, created, created) for i in range(count))
+        return self.insert(Role, ('name', 'description', 'is_active', 'created_at', 'updated_at'), rows, count, with_ids=True)
+
+    def permissions(self, count):
+        created = self.stamp(Permission)
+        codename = self.prefix.replace('-', '_')
+        rows = (('%s permiso %d' % (self.prefix, i), '%s_%d' % (codename, i), None, created) for i in range(count))
+        return self.insert(Permission, ('name', 'codename', 'description', 'created_at'), rows, count, with_ids=True)
+
+    def pick(self, population, distribution):
+        return self.rng.sample(population, min(len(population), distribution.sample(self.rng)))
+
+    def role_permissions(self, role_ids, permission_ids, per_role):
+        assigned = self.stamp(RolePermission, 'assigned_at')
+        rows = (
+            (role_id, permission_id, assigned)
+            for role_id in role_ids
+            for permission_id in self.pick(permission_ids, per_role)
+        )
+        self.insert(RolePermission, ('role', 'permission', 'assigned_at'), rows, None)
+
+    def user_roles(self, user_ids, role_ids, per_user):
+        assigned = self.stamp(UserRole, 'assigned_at')
+        rows = (
+            (user_id, role_id, assigned, None)
+            for user_id in user_ids
+            for role_id in self.pick(role_ids, per_user)
+        )
+        self.insert(UserRole, ('user', 'role', 'assigned_at', 'assigned_by'), rows, None)
+
+    def menus(self, trees, depth, fanout, role_ids, per_menu):
+        """
+        ``trees`` árboles de ``depth`` niveles; cada menú que no es hoja tiene
+        ``fanout`` hijos. Se inserta nivel por nivel (los hijos necesitan el id
+        del padre) y retorna los ids de todos los menús.
+        """
+        created = self.stamp(Menu)
+        names = ('name', 'path', 'component', 'parent', 'icon', 'sort_order', 'is_active', 'created_at', 'updated_at')
+        # (id del padre, ruta del padre, posición entre hermanos)
+        level = [(None, '/%s' % self.prefix, i) for i in range(trees)]
+        menu_ids = []
+        for _ in range(depth):
+            if not level:
+                break
+            paths = ['%s/%d' % (parent_path, position) for _, parent_path, position in level]
+            rows = [
+                ('%s menú %s' % (self.prefix, path), path, 'Seed', parent_id, None, position, True, created, created)
+                for (parent_id, _, position), path in zip(level, paths)
+            ]
+            ids = self.insert(Menu, names, rows, len(rows), with_ids=True)
+            menu_ids.extend(ids)
+            level = [
+                (menu_id, path, position)
+                for menu_id, path in zip(ids, paths)
+                for position in range(fanout.sample(self.rng))
+            ]
+        through = Menu.roles.through
+        rows = (
+            (menu_id, role_id)
+            for menu_id in menu_ids
+            for role_id in self.pick(role_ids, per_menu)
+        )
+        self.insert(through, ('menu', 'role'), rows, None)
+        return menu_ids
+
+    def finish(self):
+        """
+        Lo que harían las señales de ``save()``: invalida la caché y el
+        registro de permisos y las ETags de los modelos tocados.
+        """
+        permissions_cache.invalidate_all()
+        permission_registry.invalidate()
+        for model in (User, Role, UserRole, Menu):
+            change_counters.bump(model)
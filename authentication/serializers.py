@@ -1,14 +1,31 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .claims import embed_permissions, embed_roles, permission_claims_enabled
+from .hashing import hash_password
 from .models import Role, UserRole, Permission, RolePermission, Menu
+from .registration import check_available, save_new_user
 from rest_framework import exceptions  # Importación faltante
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 
 User = get_user_model()
 
+def create_user_offloaded(username, email, password):
+    """
+    Equivalente a ``User.objects.create_user`` pero calculando el hash de la
+    contraseña en el pool de hashing (ver hashing.py).
+    """
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+    )
+    user.password = hash_password(password)
+    return save_new_user(user)
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
     Serializador personalizado para la obtención de tokens JWT.
@@ -27,10 +44,13 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['email'] = user.email
         token['is_staff'] = user.is_staff
         
-        # Agrega los roles del usuario al token
-        roles = user.user_roles.all().values_list('role__name', flat=True)
-        token['roles'] = list(roles)
-        
+        # Agrega los roles activos del usuario al token
+        embed_roles(token, user)
+
+        # Permisos efectivos como máscara de bits (ver claims.py)
+        if permission_claims_enabled():
+            embed_permissions(token, user)
+
         return token
 
     def validate(self, attrs):
@@ -53,7 +73,35 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         #return data
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Permite limitar los campos serializados pasando ``fields=[...]`` al
+    construir el serializador (p. ej. desde ``?fields=id,username``).
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UniqueUserMixin:
+    """
+    Verifica que username y email estén libres con una sola consulta
+    (``check_available``) en lugar de un ``UniqueValidator`` por campo. Se
+    ejecuta en ``validate()``, después de los validadores de cada campo.
+    """
+    check_uniqueness = True
+
+    def validate_unique_user(self, attrs):
+        if self.check_uniqueness:
+            check_available(
+                User.normalize_username(attrs['username']),
+                User.objects.normalize_email(attrs.get('email', '')),
+            )
+
+
+class UserSerializer(UniqueUserMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo User de Django.
     Maneja la serialización/deserialización de usuarios.
@@ -70,19 +118,40 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'password', 'is_active']
         extra_kwargs = {
             'password': {'write_only': True},
-            'is_active': {'read_only': True}
+            'is_active': {'read_only': True},
+            # La unicidad se verifica en validate() (UniqueUserMixin)
+            'username': {'validators': [UnicodeUsernameValidator()]},
         }
 
+    def validate(self, attrs):
+        self.validate_unique_user(attrs)
+        return attrs
+
     def create(self, validated_data):
         """
         Crea y retorna un nuevo usuario con contraseña encriptada.
         """
-        user = User.objects.create_user(
+        return create_user_offloaded(
             username=validated_data['username'],
-            email=validated_data['email'],
+            email=validated_data.get('email', ''),
             password=validated_data['password']
         )
-        return user
+
+
+class BulkUserSerializer(UserSerializer):
+    """
+    Validación de un usuario dentro de una carga masiva. No consulta la base de
+    datos: la unicidad se verifica en bloque (ver bulk.py).
+    """
+    check_uniqueness = False
+
+
+class BulkUserRoleSerializer(serializers.Serializer):
+    """
+    Elemento de una asignación masiva de roles.
+    """
+    user_id = serializers.IntegerField()
+    role_id = serializers.IntegerField()
 
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -200,10 +269,13 @@ class UserInfoSerializer(serializers.ModelSerializer):
 
     def get_roles(self, obj):
         """
-        Obtiene los roles del usuario serializados.
+        Obtiene los roles del usuario serializados. Las vistas async pasan los
+        roles ya cargados en ``context['roles']``.
         """
-        user_roles = obj.user_roles.filter(role__is_active=True)
-        return RoleSerializer([ur.role for ur in user_roles], many=True).data
+        roles = self.context.get('roles')
+        if roles is None:
+            roles = Role.objects.filter(user_roles__user_id=obj.id, is_active=True)
+        return RoleSerializer(roles, many=True).data
 
 
 class ChangePasswordSerializer(serializers.Serializer):
@@ -226,7 +298,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         return value
 
 #implementado por sayuri
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(UniqueUserMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True)
     password2 = serializers.CharField(write_only=True, required=True)
@@ -234,18 +306,11 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'password2')
-
-    def validate_username(self, value):
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Este nombre de usuario ya está en uso.")
-        return value
-
-    def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Este correo electrónico ya está registrado.")
-        return value
+        # La unicidad se verifica en validate() (UniqueUserMixin)
+        extra_kwargs = {'username': {'validators': [UnicodeUsernameValidator()]}}
 
     def validate(self, attrs):
+        self.validate_unique_user(attrs)
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError("Las contraseñas no coinciden.")
         try:
@@ -258,10 +323,18 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Eliminar password2 del diccionario
         validated_data.pop('password2', None)
         
-        user = User.objects.create_user(
+        user = create_user_offloaded(
             username=validated_data['username'],
             email=validated_data['email'],
             password=validated_data['password']
         )
         
-        return user
\ No newline at end of file
+        return user
+
+
+class BulkRegisterSerializer(RegisterSerializer):
+    """
+    Validación de un registro dentro de una importación: mismas reglas que
+    ``RegisterSerializer``, con la unicidad verificada en bloque (ver bulk.py).
+    """
+    check_uniqueness = False
@@ -0,0 +1,57 @@
+# authentication/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import permissions_cache
+from .claims import permission_registry
+from .etags import change_counters
+from .menus import menu_cache
+from .models import Role, Permission, UserRole, RolePermission, Menu
+
+
+@receiver([post_save, post_delete], sender=UserRole)
+def invalidate_user_permissions(sender, instance, **kwargs):
+    """
+    Asignar o quitar un rol sólo afecta los permisos de ese usuario.
+    """
+    permissions_cache.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Role)
+@receiver([post_save, post_delete], sender=Permission)
+@receiver([post_save, post_delete], sender=RolePermission)
+def invalidate_all_permissions(sender, **kwargs):
+    """
+    Cambios en roles (nombre, is_active), permisos (codename) o en la relación
+    rol-permiso pueden afectar a cualquier usuario y cambian la versión del
+    registro de permisos de los tokens.
+    """
+    permissions_cache.invalidate_all()
+    permission_registry.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Menu)
+@receiver(m2m_changed, sender=Menu.roles.through)
+def invalidate_menus(sender, **kwargs):
+    """
+    Cualquier cambio en menús o en sus roles descarta el árbol en caché.
+    """
+    menu_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+@receiver([post_save, post_delete], sender=Role)
+@receiver([post_save, post_delete], sender=UserRole)
+@receiver([post_save, post_delete], sender=Menu)
+def bump_change_counter(sender, **kwargs):
+    """
+    Cambia las ETags de las respuestas que dependen del modelo.
+    """
+    change_counters.bump(sender)
+
+
+@receiver(m2m_changed, sender=Menu.roles.through)
+def bump_menu_counter(sender, action, **kwargs):
+    if action.startswith('post_'):
+        change_counters.bump(Menu)
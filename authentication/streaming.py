@@ -0,0 +1,22 @@
+# authentication/streaming.py
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def stream_json_array(rows, chunk_size=2000):
+    """
+    Genera un arreglo JSON por partes a partir de un queryset ``.values()``.
+    Las filas se leen con ``iterator()`` y se emiten en bloques de
+    ``chunk_size``, así que la memoria no depende del total de filas.
+    """
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    yield '['
+    buffer = []
+    first = True
+    for row in rows.iterator(chunk_size=chunk_size):
+        buffer.append(encode(row))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            buffer, first = [], False
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']'
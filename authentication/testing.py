@@ -0,0 +1,118 @@
+# authentication/testing.py
+"""
+Utilidades para pruebas.
+"""
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from backend.sqlite import sqlite_options
+from .replicas import replica_set
+
+
+class QueryBudgetMixin:
+    """
+    Mixin para ``TestCase`` que agrega ``assertMaxQueries``: a diferencia de
+    ``assertNumQueries`` sólo falla si se supera el presupuesto, y el mensaje
+    incluye el SQL ejecutado para localizar el N+1.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default', label=None):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                '%d. %s' % (i, query['sql']) for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail('%s: %d consultas ejecutadas, presupuesto %d\n%s' % (
+                label or 'Bloque', executed, budget, queries
+            ))
+
+
+def register_sqlite_alias(alias, name, options, **extra):
+    """
+    Agrega ``alias`` a ``connections`` apuntando a la base SQLite ``name``;
+    ``ConnectionHandler`` completa los valores por defecto.
+    """
+    raw = dict(extra, ENGINE='django.db.backends.sqlite3', NAME=name, OPTIONS=options)
+    connections.settings[alias] = ConnectionHandler({DEFAULT_DB_ALIAS: raw}).settings[DEFAULT_DB_ALIAS]
+
+
+def unregister_alias(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+class SQLiteReplica:
+    """
+    Réplica local para probar ``AuthReplicaRouter``: un archivo SQLite de sólo
+    lectura registrado como ``alias`` y en ``DATABASE_REPLICAS``. La
+    replicación se simula: ``replicate()`` copia la base ``default`` con la
+    API de backup de SQLite y, entre llamadas, la réplica va atrasada.
+    ``fail()`` borra el archivo para simular una caída.
+
+    Como el router no usa réplicas dentro de una transacción, las pruebas
+    deben ser ``TransactionTestCase``. El alias no existe cuando el runner
+    prepara las bases, así que se agrega a ``databases`` después de
+    ``setUpClass``; se declara espejo de ``default`` para que Django no
+    intente vaciarlo entre pruebas::
+
+        class Tests(TransactionTestCase):
+            @classmethod
+            def setUpClass(cls):
+                super().setUpClass()
+                cls.replica = SQLiteReplica().__enter__()
+                cls.addClassCleanup(cls.replica.__exit__, None, None, None)
+                cls.databases = cls.databases | {'replica'}
+    """
+
+    def __init__(self, alias='replica'):
+        self.alias = alias
+
+    def __enter__(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, '%s.sqlite3' % self.alias)
+        self.replicate()
+        register_sqlite_alias(self.alias, 'file:%s?mode=ro' % self.path,
+                              dict(sqlite_options({}, 5, read_only=True), uri=True),
+                              TEST={'MIRROR': DEFAULT_DB_ALIAS})
+        self._aliases, replica_set.aliases = replica_set.aliases, [self.alias]
+        replica_set.reset()
+        self._settings = override_settings(DATABASE_REPLICAS=[self.alias])
+        self._settings.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._settings.disable()
+        replica_set.aliases = self._aliases
+        replica_set.reset()
+        unregister_alias(self.alias)
+        self._directory.cleanup()
+
+    def replicate(self):
+        """
+        Copia el estado actual del primario a la réplica.
+        """
+        if self.alias in connections.settings:
+            connections[self.alias].close()
+        replica_set.reset()
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(self.path)
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+
+    def fail(self):
+        connections[self.alias].close()
+        os.remove(self.path)
+        replica_set.reset()
@@ -1,3 +1,1378 @@
-from django.test import TestCase
+import gc
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsUser
+from .benchmarking import compare, load_baseline, save_baseline
+from .blacklist import BloomFilter, BloomRefreshToken, RevokedTokens, revoke_token, revoked_tokens
+from .cache import EffectivePermissionsCache, get_effective_permissions, permissions_cache
+from .claims import PERMISSIONS_CLAIM, PERMISSIONS_VERSION_CLAIM, PermissionRegistry, permission_registry
+from .etags import ChangeCounters
+from .hashing import HashingBusy, HashingExecutor, bulk_hashing_executor, hashing_executor
+from .loadtest import ROUTE_CASES, run_asgi, run_wsgi, seed
+from .menus import MenuTree, MenuTreeCache, menu_cache
+from .metrics import Histogram, MetricsRegistry, RequestSample, registry as metrics_registry
+from .middleware import JWTAuthenticationMiddleware
+from .models import Role, Permission, UserRole, RolePermission, Menu
+from .permissions import permission_required
+from .projections import get_projection
+from .replicas import AuthReplicaRouter, RequestPin, current_pin, replica_set
+from .routes import PUBLIC, AUTHENTICATED, PERMISSION, RouteTable, RoutePolicyPermission, get_route_table, parse_policy
+from .queries import get_query_plan
+from . import renderers
+from .query_audit import AUDIT_REQUESTS, audit, explain, plan_issues, uncovered_url_names
+from . import bulk, registration
+from .seeding import Distribution, SeedGenerator
+from .serializers import (
+    CustomTokenObtainPairSerializer, RegisterSerializer, RoleSerializer, RolePermissionSerializer, UserInfoSerializer,
+    UserRoleSerializer, UserSerializer,
+)
+from .streaming import stream_json_array
+from .throttling import CacheSlidingWindow, SlidingWindow, get_window, reset_throttles
+from .testing import QueryBudgetMixin, SQLiteReplica
+from . import urls as auth_urls
+
+
+class EffectivePermissionsCacheTests(TestCase):
+    def setUp(self):
+        permissions_cache.invalidate_all()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.role = Role.objects.create(name='Despachador')
+        self.perm = Permission.objects.create(name='Ver incidentes', codename='ver_incidentes')
+        RolePermission.objects.create(role=self.role, permission=self.perm)
+        UserRole.objects.create(user=self.user, role=self.role)
+
+    def test_compiles_roles_and_permissions(self):
+        perms = permissions_cache.get(self.user.id)
+        self.assertEqual(perms.role_ids, frozenset({self.role.id}))
+        self.assertEqual(perms.roles, frozenset({'Despachador'}))
+        self.assertEqual(perms.permissions, frozenset({'ver_incidentes'}))
+
+    def test_cache_hit_does_not_query(self):
+        permissions_cache.get(self.user.id)
+        with self.assertNumQueries(0):
+            permissions_cache.get(self.user.id)
+
+    def test_user_role_change_invalidates_user(self):
+        permissions_cache.get(self.user.id)
+        other = Role.objects.create(name='Supervisor')
+        UserRole.objects.create(user=self.user, role=other)
+        self.assertIn('Supervisor', permissions_cache.get(self.user.id).roles)
+
+    def test_role_deactivation_invalidates_all(self):
+        permissions_cache.get(self.user.id)
+        self.role.is_active = False
+        self.role.save()
+        self.assertEqual(permissions_cache.get(self.user.id).permissions, frozenset())
+
+    def test_role_permission_delete_invalidates_all(self):
+        permissions_cache.get(self.user.id)
+        RolePermission.objects.filter(role=self.role).delete()
+        self.assertEqual(permissions_cache.get(self.user.id).permissions, frozenset())
+
+    def test_lru_eviction(self):
+        cache = EffectivePermissionsCache(max_size=2)
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+        self.assertEqual(list(cache._entries), [1, 3])
+
+    def test_permission_class(self):
+        request = SimpleNamespace(user=self.user)
+        self.assertTrue(permission_required('ver_incidentes')().has_permission(request, None))
+        self.assertFalse(permission_required('crear_usuario')().has_permission(request, None))
+
+
+class TokenPermissionClaimsTests(TestCase):
+    def setUp(self):
+        permissions_cache.invalidate_all()
+        permission_registry.invalidate()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.role = Role.objects.create(name='Despachador')
+        self.perms = [
+            Permission.objects.create(name='Permiso %d' % i, codename='permiso_%d' % i) for i in range(3)
+        ]
+        RolePermission.objects.create(role=self.role, permission=self.perms[1])
+        UserRole.objects.create(user=self.user, role=self.role)
+
+    def access_token(self):
+        return CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def check(self, token, *codenames):
+        request = SimpleNamespace(user=self.user, auth=token)
+        return permission_required(*codenames)().has_permission(request, None)
+
+    def test_token_carries_effective_permissions(self):
+        token = self.access_token()
+        registry = permission_registry.get()
+        self.assertEqual(token[PERMISSIONS_VERSION_CLAIM], registry.version)
+        self.assertEqual(registry.decode(token[PERMISSIONS_CLAIM]), {'permiso_1'})
+
+    def test_check_uses_bits_without_queries(self):
+        token = self.access_token()
+        permissions_cache.invalidate_all()  # Los bits no necesitan la caché de permisos
+        with self.assertNumQueries(0):
+            self.assertTrue(self.check(token, 'permiso_1'))
+            self.assertFalse(self.check(token, 'permiso_1', 'permiso_2'))
+            self.assertFalse(self.check(token, 'no_existe'))
+
+    def test_revoked_role_stops_using_bits(self):
+        token = self.access_token()
+        self.assertTrue(self.check(token, 'permiso_1'))
+        UserRole.objects.filter(user=self.user).delete()
+        self.assertFalse(self.check(token, 'permiso_1'))
+        # Otro worker sin la señal: deja de confiar en los bits cuando el token
+        # es más viejo que PERMISSIONS_CACHE_TTL, como vencería su caché
+        UserRole.objects.create(user=self.user, role=self.role)
+        token = self.access_token()
+        UserRole.objects.filter(user=self.user).update(role=Role.objects.create(name='Sin permisos'))
+        permissions_cache.invalidate_all()
+        self.assertTrue(self.check(token, 'permiso_1'))
+        with mock.patch('authentication.claims.time.time', return_value=token['iat'] + permissions_cache.ttl):
+            self.assertFalse(self.check(token, 'permiso_1'))
+
+    def test_stale_version_falls_back_to_cache(self):
+        token = self.access_token()
+        RolePermission.objects.filter(role=self.role).delete()
+        self.assertNotEqual(permission_registry.get().version, token[PERMISSIONS_VERSION_CLAIM])
+        self.assertFalse(self.check(token, 'permiso_1'))
+        RolePermission.objects.create(role=self.role, permission=self.perms[2])
+        self.assertTrue(self.check(token, 'permiso_2'))
+
+    def test_refresh_reembeds_permissions(self):
+        refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        RolePermission.objects.create(role=self.role, permission=self.perms[0])
+        access = BloomRefreshToken(refresh).access_token
+        registry = permission_registry.get()
+        self.assertEqual(access[PERMISSIONS_VERSION_CLAIM], registry.version)
+        self.assertEqual(registry.decode(access[PERMISSIONS_CLAIM]), {'permiso_0', 'permiso_1'})
+
+    def test_refresh_reembeds_roles(self):
+        refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        self.assertEqual(BloomRefreshToken(refresh).access_token['roles'], ['Despachador'])
+        UserRole.objects.create(user=self.user, role=Role.objects.create(name='Supervisor'))
+        self.assertEqual(BloomRefreshToken(refresh).access_token['roles'], ['Despachador', 'Supervisor'])
+        self.role.is_active = False
+        self.role.save()
+        self.assertEqual(BloomRefreshToken(refresh).access_token['roles'], ['Supervisor'])
+
+    def test_compact_encoding(self):
+        registry = PermissionRegistry('permiso_%d' % i for i in range(250))
+        value = registry.encode(registry.codenames)
+        self.assertEqual(len(value), 43)
+        self.assertEqual(registry.decode(value), set(registry.codenames))
+        self.assertEqual(registry.encode([]), '')
+        self.assertNotEqual(registry.version, PermissionRegistry(registry.codenames, [(1, 1)]).version)
+
+
+class JWTFastPathTests(TestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.role = Role.objects.create(name='Despachador')
+        UserRole.objects.create(user=self.user, role=self.role)
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.cookies['access_token'] = str(token)
+
+    def test_missing_token_is_rejected(self):
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get('/auth/roles/').status_code, 401)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.cookies['access_token'] = 'no-es-un-jwt'
+        self.assertEqual(self.client.get('/auth/roles/').status_code, 401)
+
+    def test_public_route_skips_token(self):
+        self.client.cookies.clear()
+        response = self.client.post('/auth/login/', {'username': 'operador', 'password': 'mala'})
+        self.assertEqual(response.json()['message'], 'Credenciales inválidas')
+
+    def test_read_endpoint_does_not_load_user(self):
+        # Sólo la consulta de roles; ninguna a auth_user
+        with self.assertNumQueries(1):
+            response = self.client.get('/auth/roles/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_claims_user_loads_model_lazily(self):
+        response = self.client.get('/auth/info/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'operador@example.com')
+        self.assertEqual(response.json()['user']['roles'][0]['name'], 'Despachador')
+
+    def test_claims_user_exposes_token_claims(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        user = ClaimsUser(token)
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.roles, ['Despachador'])
+        self.assertFalse(user.is_staff)
+
+
+class RouteTableTests(TestCase):
+    def test_longest_prefix_wins(self):
+        table = RouteTable()
+        table.add('/auth/', 'authenticated')
+        table.add('/auth/login/', 'public')
+        table.add('/auth/roles/create/', 'permission:crear_rol')
+        self.assertEqual(table.match('/auth/login/').kind, PUBLIC)
+        self.assertEqual(table.match('/auth/login').kind, PUBLIC)
+        self.assertEqual(table.match('/auth/roles/').kind, AUTHENTICATED)
+        self.assertEqual(table.match('/auth/roles/create/'), (PERMISSION, frozenset({'crear_rol'})))
+
+    def test_matches_whole_segments_only(self):
+        table = RouteTable()
+        table.add('/static/', 'public')
+        self.assertTrue(table.is_public('/static/css/app.css'))
+        self.assertFalse(table.is_public('/staticfiles/'))
+
+    def test_default_policy(self):
+        self.assertEqual(RouteTable().match('/cualquier/ruta/').kind, AUTHENTICATED)
+        self.assertEqual(RouteTable(default='public').match('/').kind, PUBLIC)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            parse_policy('admin')
+        with self.assertRaises(ValueError):
+            parse_policy('permission:')
+
+    def test_many_prefixes(self):
+        table = RouteTable()
+        for i in range(500):
+            table.add('/api/m%d/r%d/' % (i % 7, i), 'public')
+        self.assertEqual(len(table), 500)
+        self.assertTrue(table.is_public('/api/m3/r3/detalle/'))
+        self.assertFalse(table.is_public('/api/m3/r4/'))
+
+    def test_compiled_from_urlconf_and_settings(self):
+        table = get_route_table()
+        self.assertTrue(table.is_public('/auth/login/'))
+        self.assertTrue(table.is_public('/auth/register/'))
+        self.assertTrue(table.is_public('/admin/login/'))
+        self.assertFalse(table.is_public('/auth/roles/'))
+
+    @override_settings(ROUTE_POLICIES={'/auth/roles/': 'permission:ver_roles'})
+    def test_permission_policy_is_enforced(self):
+        user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.client.cookies['access_token'] = str(token)
+        self.assertEqual(self.client.get('/auth/roles/').status_code, 403)
+
+        role = Role.objects.create(name='Supervisor')
+        perm = Permission.objects.create(name='Ver roles', codename='ver_roles')
+        RolePermission.objects.create(role=role, permission=perm)
+        UserRole.objects.create(user=user, role=role)
+        request = SimpleNamespace(path='/auth/roles/', user=user)
+        self.assertTrue(RoutePolicyPermission().has_permission(request, None))
+
+
+class MenuTreeTests(TestCase):
+    def setUp(self):
+        menu_cache.invalidate()
+        self.operador = Role.objects.create(name='Despachador')
+        self.admin = Role.objects.create(name='Administrador')
+        self.root = Menu.objects.create(name='Inicio', path='/', component='Home')
+        self.root.roles.set([self.operador, self.admin])
+        self.child = Menu.objects.create(name='Incidentes', path='/incidentes', component='Incidents',
+                                         parent=self.root, sort_order=2)
+        self.child.roles.set([self.operador])
+        self.admin_only = Menu.objects.create(name='Usuarios', path='/usuarios', component='Users',
+                                              parent=self.root, sort_order=1)
+        self.admin_only.roles.set([self.admin])
+
+    def test_loads_with_two_queries(self):
+        with self.assertNumQueries(2):
+            tree = MenuTree.load()
+        self.assertEqual(len(tree), 3)
+
+    def test_filters_by_roles(self):
+        tree = MenuTree.load()
+        menu = tree.build({self.operador.id})
+        self.assertEqual([node['name'] for node in menu[0]['children']], ['Incidentes'])
+        menu = tree.build({self.operador.id, self.admin.id})
+        self.assertEqual([node['name'] for node in menu[0]['children']], ['Usuarios', 'Incidentes'])
+        self.assertEqual(tree.build(set()), [])
+
+    def test_inactive_parent_hides_branch(self):
+        self.root.is_active = False
+        self.root.save()
+        self.assertEqual(MenuTree.load().build({self.operador.id}), [])
+
+    def test_rendered_tree_is_cached_and_invalidated(self):
+        menu_cache.render({self.operador.id})
+        with self.assertNumQueries(0):
+            menu_cache.render({self.operador.id})
+        self.child.roles.remove(self.operador)
+        self.assertNotIn(b'Incidentes', menu_cache.render({self.operador.id}))
+
+    def test_rendered_tree_expires_after_ttl(self):
+        cache = MenuTreeCache(ttl=60)
+        with mock.patch('authentication.menus.time.monotonic', return_value=1000.0):
+            cache.render({self.operador.id})
+        # Otro worker cambió los menús: este proceso no recibe la señal
+        Menu.roles.through.objects.filter(menu=self.child, role=self.operador).delete()
+        with mock.patch('authentication.menus.time.monotonic', return_value=1059.0):
+            self.assertIn(b'Incidentes', cache.render({self.operador.id}))
+        with mock.patch('authentication.menus.time.monotonic', return_value=1060.0):
+            self.assertNotIn(b'Incidentes', cache.render({self.operador.id}))
+
+    def test_user_menu_endpoint(self):
+        user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        UserRole.objects.create(user=user, role=self.operador)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+        response = self.client.get('/auth/menus/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['menu'][0]['children'][0]['path'], '/incidentes')
+
+
+class UserListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        User.objects.bulk_create(
+            User(username='u%03d' % i, email='u%03d@example.com' % i, is_active=i % 2 == 0)
+            for i in range(30)
+        )
+        self.role = Role.objects.create(name='Despachador')
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def test_keyset_pages_cover_all_users(self):
+        seen = []
+        url = '/auth/list/?page_size=7'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            seen.extend(user['id'] for user in data['results'])
+            url = data['next']
+        self.assertEqual(seen, sorted(User.objects.values_list('id', flat=True)))
+
+    def test_sparse_fields(self):
+        data = self.client.get('/auth/list/?fields=id,username').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'username'})
+        self.assertEqual(self.client.get('/auth/list/?fields=password').status_code, 400)
+
+    def test_filters(self):
+        data = self.client.get('/auth/list/?is_active=false&page_size=100').json()
+        self.assertEqual(len(data['results']), 15)
+        data = self.client.get('/auth/list/?role=%d' % self.role.id).json()
+        self.assertEqual([user['username'] for user in data['results']], ['operador'])
+
+    def test_stream_export(self):
+        response = self.client.get('/auth/list/?stream=1&fields=id,email')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(set(rows[0]), {'id', 'email'})
+
+        chunked = ''.join(stream_json_array(User.objects.order_by('id').values('id'), chunk_size=7))
+        self.assertEqual(len(json.loads(chunked)), 31)
+
+
+# Presupuesto de consultas por endpoint de authentication/urls.py:
+# nombre -> (método, datos, máximo de consultas). Cada ruta nueva debe
+# declarar aquí su presupuesto.
+ENDPOINT_QUERY_BUDGETS = {
+    # login y token-refresh incluyen los permisos efectivos del claim perms (2)
+    'login': ('post', {'username': 'operador', 'password': 'x'}, 6),
+    'login-async': ('post', {'username': 'operador', 'password': 'x'}, 6),
+    # logout y token-refresh incluyen la carga inicial del filtro de Bloom (2)
+    'logout': ('post', {}, 4),
+    'register': ('post', {'username': 'nuevo', 'email': 'nuevo@example.com',
+                          'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!'}, 5),
+    'token-refresh': ('post', {}, 11),
+    'user-info': ('get', {}, 2),
+    'user-list': ('get', {}, 1),
+    # register y user-create: una consulta de unicidad y el INSERT en un savepoint (3)
+    'user-create': ('post', {'username': 'otro', 'email': 'otro@example.com', 'password': 'Cl4ve-Segura!'}, 4),
+    'role-list': ('get', {}, 1),
+    'role-create': ('post', {'name': 'Nuevo rol'}, 2),
+    'user-roles': ('get', {}, 1),
+    'role-assign': ('post', {'user_id': None, 'role_id': None}, 4),
+    'user-menu': ('get', {}, 4),
+    # metrics: permisos efectivos en frío para verificar view_metrics (2)
+    'metrics': ('get', {}, 2),
+    'logout-async': ('post', {}, 4),
+    'user-info-async': ('get', {}, 2),
+    'role-list-async': ('get', {}, 1),
+    'user-roles-async': ('get', {}, 1),
+    'user-bulk-create': ('post', [{'username': 'b%d' % i, 'email': 'b%d@example.com' % i,
+                                   'password': 'Cl4ve-Segura!'} for i in range(20)], 5),
+    'user-import': ('post', [{'username': 'r%d' % i, 'email': 'r%d@example.com' % i, 'password': 'Cl4ve-Segura!',
+                              'password2': 'Cl4ve-Segura!'} for i in range(20)], 5),
+    # role-bulk-assign relee las asignaciones para distinguir las insertadas en paralelo (7)
+    'role-bulk-assign': ('post', None, 7),
+}
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        reset_throttles()
+        permissions_cache.invalidate_all()
+        menu_cache.invalidate()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.roles = [Role.objects.create(name='Rol %d' % i) for i in range(5)]
+        for role in self.roles:
+            UserRole.objects.create(user=self.user, role=role, assigned_by=self.user)
+        self.extra_role = Role.objects.create(name='Rol extra')
+        # metrics exige view_metrics; sin él respondería 403 sin ejecutar la vista
+        RolePermission.objects.create(role=self.roles[0], permission=Permission.objects.get(codename='view_metrics'))
+        User.objects.bulk_create(User(username='u%d' % i) for i in range(20))
+        root = Menu.objects.create(name='Inicio', path='/', component='Home')
+        root.roles.set(self.roles)
+        for i in range(5):
+            Menu.objects.create(name='Sub %d' % i, path='/s%d' % i, component='S', parent=root).roles.set(self.roles)
+
+    def authenticate(self):
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def test_query_plan_from_nested_serializers(self):
+        select, prefetch = get_query_plan(UserRoleSerializer)
+        self.assertEqual(set(select), {'role', 'user', 'assigned_by'})
+        self.assertEqual(prefetch, ())
+        self.assertEqual(set(get_query_plan(RolePermissionSerializer)[0]), {'permission', 'role'})
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {pattern.name for pattern in auth_urls.urlpatterns}
+        self.assertEqual(names - set(ENDPOINT_QUERY_BUDGETS), set())
+
+    def test_endpoints_stay_within_budget(self):
+        for name, (method, data, budget) in ENDPOINT_QUERY_BUDGETS.items():
+            if name == 'role-assign':
+                data = {'user_id': self.user.id, 'role_id': self.extra_role.id}
+            elif name == 'role-bulk-assign':
+                user_ids = User.objects.filter(username__startswith='u').values_list('id', flat=True)
+                data = [{'user_id': user_id, 'role_id': self.extra_role.id} for user_id in user_ids]
+            with self.subTest(endpoint=name):
+                self.authenticate()
+                self.client.cookies['refresh_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user))
+                permissions_cache.invalidate_all()
+                revoked_tokens.reset()
+                with self.assertMaxQueries(budget, label=name):
+                    response = getattr(self.client, method)(reverse(name), data, content_type='application/json')
+                # Un 4xx cumpliría el presupuesto sin ejecutar las consultas de la vista
+                self.assertIn(response.status_code, range(200, 300), response.content)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkEndpointTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'x')
+        self.role = Role.objects.create(name='Despachador')
+        self.inactive = Role.objects.create(name='Viejo', is_active=False)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.admin).access_token)
+
+    def test_bulk_create_users_reports_per_item(self):
+        payload = [
+            {'username': 'd1', 'email': 'd1@example.com', 'password': 'Cl4ve-Segura!'},
+            {'username': 'd1', 'email': 'otro@example.com', 'password': 'Cl4ve-Segura!'},
+            {'username': 'admin', 'email': 'a@example.com', 'password': 'Cl4ve-Segura!'},
+            {'username': 'd2', 'email': 'no-es-correo', 'password': 'Cl4ve-Segura!'},
+        ]
+        data = self.client.post('/auth/create/bulk/', payload, content_type='application/json').json()
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'error', 'error', 'error'])
+        user = User.objects.get(username='d1')
+        self.assertEqual(data['results'][0]['id'], user.id)
+        self.assertTrue(user.check_password('Cl4ve-Segura!'))
+
+    def test_bulk_assign_accepts_ndjson(self):
+        users = User.objects.bulk_create(User(username='d%d' % i) for i in range(3))
+        UserRole.objects.create(user=users[0], role=self.role)
+        lines = [
+            {'user_id': users[0].id, 'role_id': self.role.id},
+            {'user_id': users[1].id, 'role_id': self.role.id},
+            {'user_id': users[2].id, 'role_id': self.inactive.id},
+            {'user_id': 999999, 'role_id': self.role.id},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines)
+        data = self.client.post('/auth/roles/assign/bulk/', body, content_type='application/x-ndjson').json()
+        self.assertEqual([r['status'] for r in data['results']], ['exists', 'created', 'error', 'error'])
+        assignment = UserRole.objects.get(user=users[1], role=self.role)
+        self.assertEqual(assignment.assigned_by_id, self.admin.id)
+
+    def test_bulk_assign_reports_concurrent_inserts_as_existing(self):
+        users = User.objects.bulk_create(User(username='d%d' % i) for i in range(2))
+        bulk_create = UserRole.objects.bulk_create
+
+        def racing(objs, **kwargs):
+            # Otra petición asigna el mismo rol entre la verificación y el INSERT
+            UserRole.objects.create(user=users[0], role=self.role)
+            return bulk_create(objs, **kwargs)
+
+        body = [{'user_id': user.id, 'role_id': self.role.id} for user in users]
+        with mock.patch.object(UserRole.objects, 'bulk_create', side_effect=racing):
+            data = self.client.post('/auth/roles/assign/bulk/', body, content_type='application/json').json()
+        self.assertEqual([r['status'] for r in data['results']], ['exists', 'created'])
+        self.assertIsNone(UserRole.objects.get(user=users[0]).assigned_by_id)
+
+    def test_bulk_assign_invalidates_permission_cache(self):
+        user = User.objects.create(username='d1')
+        self.assertEqual(permissions_cache.get(user.id).roles, frozenset())
+        self.client.post('/auth/roles/assign/bulk/', [{'user_id': user.id, 'role_id': self.role.id}],
+                         content_type='application/json')
+        self.assertEqual(permissions_cache.get(user.id).roles, frozenset({'Despachador'}))
+
+    @override_settings(BULK_MAX_ITEMS=2)
+    def test_rejects_invalid_payloads(self):
+        post = lambda body: self.client.post('/auth/roles/assign/bulk/', body, content_type='application/json')
+        self.assertEqual(post({'user_id': 1}).status_code, 400)
+        self.assertEqual(post([]).status_code, 400)
+        self.assertEqual(post([{}, {}, {}]).status_code, 400)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        reset_throttles()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'Cl4ve-Segura!')
+
+    def login(self, url='/auth/login/', password='Cl4ve-Segura!'):
+        return self.client.post(url, {'username': 'operador', 'password': password},
+                                content_type='application/json')
+
+    def test_login_rehashes_to_current_profile(self):
+        self.assertIn('$1000$', self.user.password)
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIn('$2000$', self.user.password)
+
+    def test_login_does_not_downgrade_stronger_hashes(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.user.set_password('Cl4ve-Segura!')
+            self.user.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIn('$2000$', self.user.password)
+
+    def test_wrong_password(self):
+        self.assertEqual(self.login(password='mala').status_code, 401)
+        self.assertEqual(self.login('/auth/login/async/', password='mala').status_code, 401)
+
+    def test_async_login_sets_cookies(self):
+        response = self.login('/auth/login/async/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'operador')
+        self.assertIn('access_token', response.cookies)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_busy_executor_returns_503(self):
+        with mock.patch('authentication.hashing.hashing_executor.run', side_effect=HashingBusy):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_busy_executor_returns_503_on_user_creation(self):
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        item = {'username': 'nuevo', 'email': 'nuevo@example.com', 'password': 'Cl4ve-Segura!'}
+        requests = [
+            ('/auth/create/', item),
+            ('/auth/create/bulk/', [item]),
+            ('/auth/create/import/', [dict(item, password2='Cl4ve-Segura!')]),
+        ]
+        with mock.patch.object(HashingExecutor, 'submit', side_effect=HashingBusy), \
+                mock.patch.object(hashing_executor, 'mode', 'thread'), \
+                mock.patch.object(bulk_hashing_executor, 'mode', 'thread'):
+            for url, data in requests:
+                with self.subTest(url=url):
+                    response = self.client.post(url, data, content_type='application/json')
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='nuevo').exists())
+
+    def test_executor_applies_backpressure(self):
+        executor = HashingExecutor(workers=1, queue_size=0, timeout=0.01)
+        release = threading.Event()
+        executor.submit(release.wait)
+        with self.assertRaises(HashingBusy):
+            executor.submit(len, 'x')
+        release.set()
+        executor.timeout = 5
+        self.assertEqual(executor.run(len, 'abc'), 3)
+        executor.shutdown()
+
+    def test_bulk_creation_does_not_take_login_slots(self):
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        items = [{'username': 'b%d' % i, 'email': 'b%d@example.com' % i, 'password': 'Cl4ve-Segura!'} for i in range(5)]
+        with mock.patch.object(hashing_executor, 'submit', side_effect=HashingBusy), \
+                mock.patch.object(bulk_hashing_executor, 'mode', 'thread'):
+            response = self.client.post('/auth/create/bulk/', items, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.filter(username__startswith='b').count(), 5)
+
+    def test_registration_hashes_in_executor(self):
+        response = self.client.post('/auth/register/', {
+            'username': 'nuevo', 'email': 'nuevo@example.com',
+            'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(username='nuevo').check_password('Cl4ve-Segura!'))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        for name in ('Despachador', 'Supervisor'):
+            UserRole.objects.create(user=self.user, role=Role.objects.create(name=name), assigned_by=self.user)
+        token = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.async_client = AsyncClient()
+        self.async_client.cookies['access_token'] = token
+
+    def test_middleware_supports_both_modes(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(JWTAuthenticationMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(JWTAuthenticationMiddleware(lambda request: None)))
+
+    async def test_async_views_match_sync_views(self):
+        for url in ('/auth/info/', '/auth/roles/', '/auth/roles/user/'):
+            with self.subTest(url=url):
+                expected = await self.async_client.get(url)
+                response = await self.async_client.get(url + 'async/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+
+    async def test_async_views_require_token(self):
+        response = await AsyncClient().get('/auth/info/async/')
+        self.assertEqual(response.status_code, 401)
+
+        client = AsyncClient()
+        client.cookies['access_token'] = 'no-es-un-jwt'
+        response = await client.get('/auth/roles/async/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], 'No autorizado - Token inválido')
+
+    async def test_async_logout_clears_cookies(self):
+        response = await self.async_client.post('/auth/logout/async/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['access_token'].value, '')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.role = Role.objects.create(name='Despachador')
+        UserRole.objects.create(user=self.user, role=self.role, assigned_by=self.user)
+        Menu.objects.create(name='Inicio', path='/', component='Home').roles.add(self.role)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def assertNotModified(self, url, etag):
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_unchanged_resources_return_304(self):
+        for url in ('/auth/roles/', '/auth/info/', '/auth/menus/', '/auth/roles/async/', '/auth/info/async/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotModified(url, response['ETag'])
+
+    def test_cache_control_per_endpoint(self):
+        self.assertIn('max-age=30', self.client.get('/auth/roles/')['Cache-Control'])
+        self.assertIn('no-cache', self.client.get('/auth/info/')['Cache-Control'])
+
+    def test_changes_invalidate_etags(self):
+        etags = {url: self.client.get(url)['ETag'] for url in ('/auth/roles/', '/auth/info/', '/auth/menus/')}
+        Role.objects.create(name='Supervisor')
+        self.assertEqual(self.client.get('/auth/roles/', HTTP_IF_NONE_MATCH=etags['/auth/roles/']).status_code, 200)
+        # Un rol nuevo recompila los permisos, pero el menú no cambia
+        self.assertEqual(self.client.get('/auth/menus/', HTTP_IF_NONE_MATCH=etags['/auth/menus/']).status_code, 304)
+
+        other = Role.objects.create(name='Bombero')
+        Menu.objects.get().roles.add(other)
+        self.assertEqual(self.client.get('/auth/menus/', HTTP_IF_NONE_MATCH=etags['/auth/menus/']).status_code, 200)
+
+        self.client.post('/auth/roles/assign/bulk/', [{'user_id': self.user.id, 'role_id': other.id}],
+                         content_type='application/json')
+        response = self.client.get('/auth/info/', HTTP_IF_NONE_MATCH=etags['/auth/info/'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({role['name'] for role in response.json()['user']['roles']}, {'Despachador', 'Bombero'})
+
+    def test_etags_are_per_user_and_per_model(self):
+        other = User.objects.create_user('otro', 'otro@example.com', 'x')
+        etag = self.client.get('/auth/info/')['ETag']
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(other).access_token)
+        self.assertEqual(self.client.get('/auth/info/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        counters = ChangeCounters(ttl=0)
+        before = counters.token(Role, Menu)
+        counters.bump(Menu)
+        self.assertNotEqual(counters.token(Role, Menu), before)
+        self.assertEqual(counters.token(Role), before.rsplit('.', 1)[0])
+
+
+class FastReadPathTests(TestCase):
+    """
+    Salidas de referencia: las proyecciones y el renderer orjson deben dar
+    exactamente lo mismo que los serializadores y ``JSONRenderer``.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now().replace(microsecond=123456))
+        User.objects.create_user('José Ñúñez', '', 'x', is_active=False)
+        descriptions = [None, '', 'Línea\u2028separada', 'Emoji 🚑 y "comillas"', 'x' * 500]
+        for i, description in enumerate(descriptions):
+            role = Role.objects.create(name='Rol %d' % i, description=description, is_active=i != 3)
+            UserRole.objects.create(user=self.user, role=role)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def test_projections_match_serializers(self):
+        roles = Role.objects.all()
+        self.assertEqual(get_projection(RoleSerializer).rows(roles), RoleSerializer(roles, many=True).data)
+        with timezone.override('America/Bogota'):
+            self.assertEqual(get_projection(RoleSerializer).rows(roles), RoleSerializer(roles, many=True).data)
+        users = User.objects.order_by('id')
+        for fields in (('id', 'username', 'email', 'is_active'), ('email',), ('is_active', 'id')):
+            with self.subTest(fields=fields):
+                self.assertEqual(
+                    get_projection(UserSerializer, fields=fields).rows(users),
+                    UserSerializer(users, many=True, fields=fields).data,
+                )
+
+    def test_unsupported_fields_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_projection(UserInfoSerializer)
+
+    def test_endpoints_match_serializer_path(self):
+        urls = ['/auth/roles/', '/auth/info/', '/auth/list/', '/auth/list/?fields=email,id&page_size=1']
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(FAST_READ_PATHS=False):
+                    expected = self.client.get(url)
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+        for url in ('/auth/roles/async/', '/auth/info/async/'):
+            with self.subTest(url=url):
+                with override_settings(FAST_READ_PATHS=False):
+                    expected = self.client.get(url)
+                self.assertEqual(self.client.get(url).content, expected.content)
+
+    def test_renderer_matches_json_renderer(self):
+        from decimal import Decimal
+        from uuid import UUID
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        now = timezone.now().replace(microsecond=5)
+        payloads = [
+            RoleSerializer(Role.objects.all(), many=True).data,
+            {'status': 'success', 'user': UserInfoSerializer(self.user).data},
+            {'fechas': [now, now.astimezone(timezone.get_fixed_timezone(-300)), now.date(), now.time(), timedelta(1.5)]},
+            {'tipos': [Decimal('1.10'), UUID(int=7), gettext_lazy('Inicio'), (1, 2), {3: 'clave int'}, 1.5, None]},
+            {'texto': 'ñ \u2028 \u2029 \x00 </script>'},
+            {'grande': 2 ** 70},
+        ]
+        fast, stdlib = renderers.FastJSONRenderer(), JSONRenderer()
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(fast.render(payload), stdlib.render(payload))
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(fast.render(payloads[0]), stdlib.render(payloads[0]))
+
+        # Sin exponente los floats coinciden byte a byte; con exponente sólo el valor
+        self.assertEqual(fast.render([0.1, -0.0, 2.5, 123456789.125]), stdlib.render([0.1, -0.0, 2.5, 123456789.125]))
+        floats = [1e-05, 1e-7, 1e16, 1e22, 1.5e300, -2.5e-300]
+        self.assertEqual(json.loads(fast.render(floats)), json.loads(stdlib.render(floats)))
+        if renderers.orjson is not None:
+            self.assertEqual(fast.render(floats), b'[0.00001,1e-7,1e16,1e22,1.5e300,-2.5e-300]')
+
+
+class TokenBlacklistTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        revoked_tokens.reset()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        self.client.cookies['access_token'] = str(self.refresh.access_token)
+        self.client.cookies['refresh_token'] = str(self.refresh)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(10000, 0.01)
+        keys = ['jti-%d' % i for i in range(10000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum('otro-%d' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+
+    def test_logout_blacklists_refresh_token(self):
+        self.assertEqual(self.client.post('/auth/logout/').status_code, 200)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=self.refresh['jti']).exists())
+
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        response = self.client.post('/auth/refresh/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_rotates_and_blacklists_old_token(self):
+        response = self.client.post('/auth/refresh/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.cookies['refresh_token'].value, str(self.refresh))
+        self.assertTrue(revoked_tokens.is_revoked(self.refresh['jti']))
+
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        self.assertEqual(self.client.post('/auth/refresh/').status_code, 401)
+
+    def test_exact_check_only_on_bloom_hit(self):
+        revoke_token(self.refresh)
+        revoked_tokens.rebuild()
+        with self.assertNumQueries(0):
+            self.assertFalse(revoked_tokens.is_revoked('no-revocado'))
+        with self.assertNumQueries(1):
+            self.assertTrue(revoked_tokens.is_revoked(self.refresh['jti']))
+
+    def test_incremental_refresh_sees_other_workers(self):
+        tokens = RevokedTokens(refresh_interval=0)
+        self.assertFalse(tokens.is_revoked(self.refresh['jti']))
+        # Revocado por otro proceso: sólo llega a la base de datos
+        outstanding = OutstandingToken.objects.get(jti=self.refresh['jti'])
+        BlacklistedToken.objects.create(token=outstanding)
+        self.assertTrue(tokens.is_revoked(self.refresh['jti']))
+        self.assertEqual(tokens.stats()['entries'], 1)
+
+    def test_compaction_removes_expired_tokens(self):
+        expired = CustomTokenObtainPairSerializer.get_token(self.user)
+        revoke_token(expired)
+        revoke_token(self.refresh)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(revoked_tokens.compact(), 1)
+        self.assertFalse(OutstandingToken.objects.filter(jti=expired['jti']).exists())
+        self.assertEqual(revoked_tokens.stats()['entries'], 1)
+        self.assertTrue(revoked_tokens.is_revoked(self.refresh['jti']))
+
+    @override_settings(TOKEN_BLACKLIST_REVOKE_ACCESS=True)
+    def test_revoked_access_token_is_rejected(self):
+        access = self.client.cookies['access_token'].value
+        self.assertEqual(self.client.get('/auth/roles/').status_code, 200)
+        self.assertEqual(self.client.post('/auth/logout/').status_code, 200)
+
+        self.client.cookies['access_token'] = access
+        response = self.client.get('/auth/roles/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], 'No autorizado - Token revocado')
+
+    @override_settings(TOKEN_BLACKLIST_REVOKE_ACCESS=True)
+    async def test_revoked_access_token_is_rejected_async(self):
+        client = AsyncClient()
+        client.cookies['access_token'] = str(self.refresh.access_token)
+        self.assertEqual((await client.get('/auth/roles/async/')).status_code, 200)
+        await sync_to_async(revoke_token)(AccessToken(client.cookies['access_token'].value))
+        self.assertEqual((await client.get('/auth/roles/async/')).status_code, 401)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        role = Role.objects.create(name='Despachador')
+        RolePermission.objects.create(role=role, permission=Permission.objects.get(codename='view_metrics'))
+        UserRole.objects.create(user=self.user, role=role, assigned_by=self.user)
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def test_histogram_quantiles_have_bounded_error(self):
+        histogram = Histogram()
+        values = [random.randint(1, 10 ** 7) for _ in range(5000)]
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * len(values)) - 1]
+            self.assertAlmostEqual(histogram.quantile(q) / exact, 1, delta=0.07)
+        self.assertEqual(histogram.max, values[-1])
+
+    def test_records_per_endpoint(self):
+        response = self.client.get('/auth/roles/')
+        metrics = metrics_registry.snapshot()['role-list']
+        self.assertEqual(metrics.duration_us.count, 1)
+        self.assertEqual(metrics.db_queries.max, 1)
+        self.assertGreater(metrics.serializer_us.max, 0)
+        self.assertEqual(metrics.response_bytes.max, len(response.content))
+
+    async def test_records_queries_of_async_views(self):
+        client = AsyncClient()
+        client.cookies['access_token'] = self.client.cookies['access_token'].value
+        await client.get('/auth/roles/async/')
+        metrics = metrics_registry.snapshot()['role-list-async']
+        self.assertEqual(metrics.db_queries.max, 1)
+
+    def test_finished_threads_fold_into_aggregate(self):
+        registry = MetricsRegistry()
+        for _ in range(20):
+            thread = threading.Thread(target=registry.record, args=('role-list', 0.01, RequestSample(), 10))
+            thread.start()
+            thread.join()
+        gc.collect()
+        self.assertEqual(len(registry._shards), 0)
+        registry.record('role-list', 0.01, RequestSample(), 10)
+        self.assertEqual(registry.snapshot()['role-list'].duration_us.count, 21)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_sampling(self):
+        self.client.get('/auth/roles/')
+        self.assertNotIn('role-list', metrics_registry.snapshot())
+
+    def test_prometheus_endpoint_and_command(self):
+        self.client.get('/auth/roles/')
+        text = self.client.get('/auth/metrics/').content.decode()
+        self.assertIn('http_request_duration_seconds_count{endpoint="role-list"} 1', text)
+        self.assertIn('http_request_db_queries{endpoint="role-list",quantile="0.99"} 1', text)
+
+        # El comando lee las métricas del servidor, no de su propio proceso
+        body = self.client.get('/auth/metrics/', {'format': 'json'}).content
+        out = io.StringIO()
+        with mock.patch('authentication.management.commands.metrics.urlopen',
+                        return_value=io.BytesIO(body)) as urlopen:
+            call_command('metrics', token='abc', stdout=out)
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.full_url, 'http://localhost:8000/auth/metrics/?format=json')
+        self.assertEqual(request.get_header('Authorization'), 'Bearer abc')
+        self.assertIn('role-list (1 muestras)', out.getvalue())
+
+    def test_metrics_require_permission_unless_opened(self):
+        other = User.objects.create_user('sin-permiso', 'sin-permiso@example.com', 'x')
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(other).access_token)
+        self.assertEqual(self.client.get('/auth/metrics/').status_code, 403)
+        del self.client.cookies['access_token']
+        self.assertEqual(self.client.get('/auth/metrics/').status_code, 401)
+        with override_settings(ROUTE_POLICIES={'/auth/metrics/': 'public'}):
+            self.assertEqual(self.client.get('/auth/metrics/').status_code, 200)
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica = SQLiteReplica().__enter__()
+        cls.addClassCleanup(cls.replica.__exit__, None, None, None)
+        cls.databases = cls.databases | {'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.replica.replicate()
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def role_names(self, client=None):
+        response = (client or self.client).get('/auth/roles/')
+        self.assertEqual(response.status_code, 200)
+        return {role['name'] for role in response.json()}
+
+    def test_reads_lag_until_replicated(self):
+        Role.objects.create(name='Despachador')
+        self.assertEqual(self.role_names(), set())
+        self.replica.replicate()
+        self.assertEqual(self.role_names(), {'Despachador'})
+
+    def test_write_pins_reads_to_primary(self):
+        response = self.client.post('/auth/roles/create/', {'name': 'Supervisor'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('replica_pin', response.cookies)
+        # El mismo cliente ve su escritura; otro lee de la réplica atrasada
+        self.assertEqual(self.role_names(), {'Supervisor'})
+        other = self.client_class()
+        other.cookies['access_token'] = self.client.cookies['access_token'].value
+        self.assertEqual(self.role_names(other), set())
+
+    def test_revoked_role_is_not_recached_from_stale_replica(self):
+        role = Role.objects.create(name='Despachador')
+        assignment = UserRole.objects.create(user=self.user, role=role, assigned_by=self.user)
+        Menu.objects.create(name='Despacho', path='/despacho', component='Dispatch').roles.set([role])
+        self.replica.replicate()
+        permissions_cache.invalidate_all()
+        menu_cache.invalidate()
+        self.assertEqual(len(self.client.get('/auth/menus/').json()['menu']), 1)
+
+        assignment.delete()  # La réplica sigue con la asignación
+        other = self.client_class()
+        other.cookies['access_token'] = self.client.cookies['access_token'].value
+        self.assertEqual(other.get('/auth/menus/').json()['menu'], [])
+        self.assertEqual(get_effective_permissions(self.user).role_ids, frozenset())
+
+    def test_fails_over_to_primary(self):
+        Role.objects.create(name='Despachador')
+        self.replica.fail()
+        with self.assertLogs('authentication.replicas', 'WARNING'):
+            self.assertEqual(self.role_names(), {'Despachador'})
+        self.assertFalse(replica_set.is_healthy('replica'))
+
+    def test_query_error_marks_replica_down_and_retries(self):
+        Role.objects.create(name='Despachador')
+        self.replica.replicate()
+        self.assertTrue(replica_set.is_healthy('replica'))
+        # Cae entre dos verificaciones: la consulta de la vista falla
+        connections['replica'].close()
+        os.remove(self.replica.path)
+        with self.assertLogs('authentication.replicas', 'WARNING'):
+            self.assertEqual(self.role_names(), {'Despachador'})
+        self.assertFalse(replica_set.is_healthy('replica'))
+
+    def test_routing_outside_requests_and_transactions(self):
+        router = AuthReplicaRouter()
+        self.assertEqual(router.db_for_read(Role), 'default')
+        self.assertIsNone(router.db_for_read(User))
+        token = current_pin.set(RequestPin())
+        try:
+            self.assertEqual(router.db_for_read(Role), 'replica')
+            self.assertEqual(router.db_for_write(UserRole), 'default')
+            self.assertEqual(router.db_for_read(Role), 'default')  # Fijada tras escribir
+        finally:
+            current_pin.reset(token)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryAuditTests(TestCase):
+    def setUp(self):
+        reset_throttles()
+
+    def test_plan_issues(self):
+        plan = [
+            'SCAN auth_user',
+            'SCAN TABLE authentication_role',
+            'SEARCH authentication_userrole USING COVERING INDEX auth_userrole_role_user_idx (role_id=?)',
+            'SCAN authentication_menu_roles',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]
+        self.assertEqual(plan_issues(plan), ['SCAN auth_user', 'SCAN TABLE authentication_role', 'USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(plan_issues(plan[:3], allowed={'auth_user', 'authentication_role'}), [])
+
+    def test_every_route_uses_an_index(self):
+        results = audit()
+        self.assertFalse([result['request'] for result in results if result['status'] >= 400])
+        self.assertEqual([(result['request'], result['issues']) for result in results if result['issues']], [])
+
+    def test_audit_covers_every_route(self):
+        self.assertEqual(uncovered_url_names(auth_urls.urlpatterns), [])
+        self.assertIn('login-async', uncovered_url_names(auth_urls.urlpatterns, AUDIT_REQUESTS[:1]))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    LOGIN_THROTTLE_RATES={'login-ip': (10, 60), 'login-username': (2, 60), 'register-ip': (1, 60)},
+    LOGIN_THROTTLE_LOCKOUT=(30, 120),
+)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        reset_throttles()
+        User.objects.create_user('operador', 'operador@example.com', 'x')
+
+    def login(self, password='mala', url='/auth/login/'):
+        return self.client.post(url, {'username': 'operador', 'password': password}, content_type='application/json')
+
+    def assert_window(self, window, clock):
+        self.assertEqual([window.hit('k') for _ in range(3)], [0, 0, 0])
+        clock.now += 1
+        # Cuarto intento en la ventana: bloqueo de 30 s (más que lo que falta de la ventana)
+        self.assertEqual(window.hit('k'), 30)
+        clock.now += 10
+        self.assertEqual(window.hit('k'), 20)
+        clock.now += 20
+        self.assertEqual(window.hit('k'), 0)
+        self.assertEqual([window.hit('k') for _ in range(2)], [0, 0])
+        # Reincidencia: el bloqueo se duplica
+        self.assertEqual(window.hit('k'), 60)
+        self.assertEqual(window.hit('otra'), 0)
+        window.reset('k')
+        self.assertEqual(window.hit('k'), 0)
+
+    def test_sliding_window_and_progressive_lockout(self):
+        clock = FakeClock()
+        self.assert_window(SlidingWindow(3, 20, lockout=30, max_lockout=60, clock=clock), clock)
+
+    def test_cache_backend_matches_memory(self):
+        clock = FakeClock()
+        self.assert_window(CacheSlidingWindow(3, 20, lockout=30, max_lockout=60, prefix='prueba', clock=clock), clock)
+
+    def test_eviction_reuses_slots(self):
+        clock = FakeClock()
+        window = SlidingWindow(2, 10, max_keys=2, clock=clock)
+        for key in ('a', 'b', 'a', 'c'):
+            clock.now += 1
+            window.hit(key)
+        # Tabla llena y nada vencido: se descarta la menos reciente
+        self.assertEqual(sorted(window._slots), ['a', 'c'])
+        clock.now += 10
+        window.hit('d')
+        self.assertEqual(list(window._slots), ['d'])
+        self.assertEqual(len(window._data), 2 * window.stride)
+
+    def test_login_rejected_before_database(self):
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 401)
+        with self.assertNumQueries(0):
+            response = self.login(password='x')
+        self.assertEqual(response.status_code, 429)
+        # Lo que falta de la ventana de 60 s (más que el primer bloqueo de 30 s)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_success_resets_username(self):
+        self.login()
+        self.assertEqual(self.login(password='x').status_code, 200)
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_username_is_case_insensitive(self):
+        for username in ('operador', 'OPERADOR', 'Operador'):
+            response = self.client.post('/auth/login/', {'username': username, 'password': 'mala'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    async def test_async_login_shares_limits(self):
+        self.assertEqual((await sync_to_async(self.login)()).status_code, 401)
+        self.assertEqual((await sync_to_async(self.login)()).status_code, 401)
+        expected = await sync_to_async(self.login)()
+        response = await AsyncClient().post('/auth/login/async/', {'username': 'operador', 'password': 'x'},
+                                            content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['Retry-After'], expected['Retry-After'])
+
+    def test_ip_limit_does_not_escalate(self):
+        self.assertEqual((get_window('login-ip').lockout, get_window('login-ip').max_lockout), (0, 0))
+        self.assertEqual(get_window('login-username').lockout, 30)
+        for i in range(10):
+            self.client.post('/auth/login/', {'username': 'op%d' % i, 'password': 'mala'}, content_type='application/json')
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response['Retry-After']), 60)
+
+    @override_settings(LOGIN_THROTTLE_TRUSTED_IPS=['127.0.0.0/8'])
+    def test_trusted_ips_skip_ip_limit(self):
+        for i in range(15):
+            response = self.client.post('/auth/login/', {'username': 'op%d' % i, 'password': 'mala'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 401)
+        self.login()
+        self.login()
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_register_limited_per_ip(self):
+        data = {'username': 'nuevo', 'email': 'nuevo@example.com', 'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!'}
+        self.assertEqual(self.client.post('/auth/register/', data, content_type='application/json').status_code, 201)
+        data.update(username='otro', email='otro@example.com')
+        response = self.client.post('/auth/register/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(User.objects.filter(username='otro').exists())
+        self.assertEqual(self.client.post('/auth/register/', data, content_type='application/json',
+                                          REMOTE_ADDR='10.0.0.2').status_code, 201)
+
+
+# Todas las peticiones salen de la misma IP, como en el comando loadtest
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], LOGIN_THROTTLE_ENABLED=False)
+class LoadTestTests(TestCase):
+    def setUp(self):
+        self.context = seed(users=10, roles=3, permissions=4, menus=6)
+
+    def test_every_route_has_a_load_case(self):
+        self.assertEqual(set(ROUTE_CASES), {pattern.name for pattern in auth_urls.urlpatterns if pattern.name})
+
+    def test_drives_every_route_without_errors(self):
+        for name in ROUTE_CASES:
+            with self.subTest(route=name):
+                result = run_wsgi(name, self.context, requests=3)
+                self.assertEqual((result['iterations'], result['errors']), (3, 0))
+                self.assertGreater(result['ops_per_sec'], 0)
+
+    async def test_asgi_driver(self):
+        for name in ('role-list-async', 'role-create'):
+            with self.subTest(route=name):
+                result = await run_asgi(name, self.context, requests=4, concurrency=2)
+                self.assertEqual((result['iterations'], result['errors']), (4, 0))
+
+    def test_baseline_regressions(self):
+        def result(label, p50):
+            return {'label': label, 'p50_us': p50, 'p95_us': p50 * 2}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            save_baseline(path, {'load': [result('roles', 100.0), result('info', 200.0)]})
+            baseline = load_baseline(path)
+        current = {'load': [result('roles', 119.0), result('info', 260.0), result('nuevo', 1e6)]}
+        self.assertEqual(compare(current, baseline), [('load', 'info', 200.0, 260.0)])
+        self.assertEqual(compare(current, baseline, threshold=0.5), [])
+        self.assertEqual(len(compare(current, baseline, metric='p95_us')), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedDataTests(TestCase):
+    def generate(self, prefix, seed=0):
+        generator = SeedGenerator(seed=seed, prefix=prefix, chunk_size=7)
+        users = generator.users(20)
+        roles = generator.roles(4)
+        generator.user_roles(users, roles, Distribution.parse('1:1,3:1'))
+        menus = generator.menus(2, 3, Distribution.parse('1-2'), roles, Distribution([1]))
+        generator.finish()
+        return users, roles, menus
+
+    def snapshot(self, users, roles):
+        # Asignaciones por posición, independiente de los ids asignados
+        user_index = {user_id: i for i, user_id in enumerate(users)}
+        role_index = {role_id: i for i, role_id in enumerate(roles)}
+        return sorted(
+            (user_index[user_id], role_index[role_id])
+            for user_id, role_id in UserRole.objects.filter(user_id__in=users).values_list('user_id', 'role_id')
+        )
+
+    def test_same_seed_same_data(self):
+        first = self.generate('a')
+        second = self.generate('b')
+        third = self.generate('c', seed=1)
+        self.assertEqual(self.snapshot(*first[:2]), self.snapshot(*second[:2]))
+        self.assertNotEqual(self.snapshot(*first[:2]), self.snapshot(*third[:2]))
+        self.assertEqual(len(first[2]), len(second[2]))
+
+    def test_rows_and_menu_trees(self):
+        users, roles, menus = self.generate('seed')
+        self.assertEqual(User.objects.filter(username__startswith='seed-').count(), 20)
+        user = User.objects.get(username='seed-3')
+        self.assertTrue(user.check_password('Semilla-Segura-2024!'))
+        self.assertEqual(user.email, 'seed-3@example.com')
+        self.assertTrue(set(UserRole.objects.filter(user_id__in=users).values_list('role_id', flat=True)) <= set(roles))
+        # Tres niveles: hojas con abuelo, y ningún menú más profundo
+        leaves = Menu.objects.filter(id__in=menus, parent__parent__isnull=False)
+        self.assertTrue(leaves.exists())
+        self.assertFalse(Menu.objects.filter(parent__in=leaves).exists())
+        self.assertEqual(Menu.objects.filter(id__in=menus, parent__isnull=True).count(), 2)
+        self.assertEqual(Menu.roles.through.objects.filter(menu_id__in=menus).count(), len(menus))
+        # Las secuencias siguen bien: un alta normal no choca con los ids generados
+        self.assertGreater(User.objects.create(username='normal').id, max(users))
+
+    def test_distribution_parsing(self):
+        self.assertEqual(Distribution.parse('3').values, [3])
+        self.assertEqual(Distribution.parse('1-3').values, [1, 2, 3])
+        weighted = Distribution.parse('1:60,2:40')
+        self.assertEqual((weighted.values, weighted.weights), ([1, 2], [60.0, 40.0]))
+        self.assertEqual(str(weighted), '1:60,2:40')
+        for text in ('3-1', 'x', '-1'):
+            with self.assertRaises(ValueError):
+                Distribution.parse(text)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            'seed_data', users=30, roles=3, permissions=5, menu_trees=1, menu_depth=2,
+            menu_fanout=Distribution([2]), prefix='cmd', chunk_size=8, stdout=out,
+        )
+        self.assertEqual(User.objects.filter(username__startswith='cmd-').count(), 30)
+        self.assertEqual(Menu.objects.filter(path__startswith='/cmd').count(), 3)
+        self.assertIn('auth_user', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed_data', users=1, prefix='cmd', stdout=io.StringIO())
+
+
+def rival_registers(module, username, email):
+    """
+    Simula otra petición que registra ``username`` / ``email`` justo después
+    de la verificación de unicidad de ``module``.
+    """
+    original = module.find_taken
+    calls = []
+
+    def find_taken(usernames, emails):
+        taken = original(usernames, emails)
+        if not calls:
+            User.objects.create_user(username, email, 'x')
+        calls.append((usernames, emails))
+        return taken
+    return mock.patch.object(module, 'find_taken', find_taken)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], LOGIN_THROTTLE_ENABLED=False)
+class RegistrationUniquenessTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'Admin@Example.com', 'x')
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.admin).access_token)
+
+    def register_data(self, username='nuevo', email='nuevo@example.com'):
+        return {'username': username, 'email': email, 'password': 'Cl4ve-Segura!', 'password2': 'Cl4ve-Segura!'}
+
+    def test_checks_username_and_email_in_one_query(self):
+        serializer = RegisterSerializer(data=self.register_data('admin', 'ADMIN@example.com'))
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors, {
+            'username': [registration.USERNAME_TAKEN], 'email': [registration.EMAIL_TAKEN],
+        })
+
+    def test_unique_index_ignores_case_and_blank_emails(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create(username='otro', email='admin@EXAMPLE.COM')
+        User.objects.bulk_create([User(username='sin1'), User(username='sin2')])
+        self.assertEqual(User.objects.filter(email='').count(), 2)
+
+    def test_lookup_uses_both_indexes(self):
+        with CaptureQueriesContext(connection) as captured:
+            registration.find_taken(['nuevo'], ['Nuevo@example.com'])
+        plan = explain(connection, captured[0]['sql'])
+        self.assertEqual(plan_issues(plan), [])
+        self.assertTrue(any('auth_user_email_ci_uniq' in line for line in plan), plan)
+
+    def test_concurrent_registration_returns_field_errors(self):
+        with rival_registers(registration, 'nuevo', 'otro@example.com'):
+            response = self.client.post('/auth/register/', self.register_data(), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'username': [registration.USERNAME_TAKEN]})
+        self.assertEqual(User.objects.filter(username='nuevo').count(), 1)
+
+    def test_concurrent_admin_create_returns_field_errors(self):
+        data = {'username': 'nuevo', 'email': 'nuevo@example.com', 'password': 'Cl4ve-Segura!'}
+        with rival_registers(registration, 'rival', 'Nuevo@example.com'):
+            response = self.client.post('/auth/create/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': [registration.EMAIL_TAKEN]})
+
+    def test_import_applies_register_rules(self):
+        payload = [
+            self.register_data('i1', 'i1@example.com'),
+            dict(self.register_data('i2', 'i2@example.com'), password2='otra'),
+            self.register_data('i3', 'I1@example.com'),
+            self.register_data('i4', 'admin@example.com'),
+            self.register_data('i5', 'i5@example.com'),
+        ]
+        with self.assertNumQueries(5):
+            data = self.client.post('/auth/create/import/', payload, content_type='application/json').json()
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'error', 'error', 'error', 'created'])
+        self.assertEqual(data['results'][2]['errors'], {'email': ['Email repetido en la carga.']})
+        self.assertEqual(data['results'][3]['errors'], {'email': [registration.EMAIL_TAKEN]})
+        self.assertTrue(User.objects.get(username='i5').check_password('Cl4ve-Segura!'))
+
+    def test_bulk_reports_rows_lost_to_a_race(self):
+        payload = [
+            {'username': 'b1', 'email': 'b1@example.com', 'password': 'Cl4ve-Segura!'},
+            {'username': 'b2', 'email': 'b2@example.com', 'password': 'Cl4ve-Segura!'},
+        ]
+        with rival_registers(bulk, 'rival', 'B2@example.com'):
+            data = self.client.post('/auth/create/bulk/', payload, content_type='application/json').json()
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'error'])
+        self.assertEqual(data['results'][1]['errors'], {'email': [registration.EMAIL_TAKEN]})
+        self.assertFalse(User.objects.filter(username='b2').exists())
@@ -0,0 +1,317 @@
+# authentication/throttling.py
+"""
+Límite de intentos de login y registro con ventanas deslizantes por IP y
+por usuario. Se verifica antes de consultar la base de datos o calcular el
+hash de la contraseña.
+
+``SlidingWindow`` guarda, por clave, un anillo con las horas de los últimos
+``limit`` intentos. Un intento se permite si el más viejo del anillo salió
+de la ventana de ``window`` segundos. Si no, la clave queda bloqueada: el
+primer bloqueo dura ``lockout`` segundos y cada reincidencia lo duplica,
+hasta ``max_lockout``. Los intentos rechazados no entran al anillo. Todas las
+claves de un ámbito comparten un único ``array('d')``, y cada clave ocupa un
+tramo fijo: cabeza del anillo, reincidencias, fin del bloqueo, último
+intento y los ``limit`` tiempos. Una clave sin intentos durante
+``window + max_lockout`` segundos vence (con ella, sus reincidencias). Al
+llegar a ``max_keys`` claves se descartan las vencidas y, si no alcanza,
+la décima parte menos reciente.
+
+Los contadores en memoria son por proceso: con N workers, cada IP tiene N
+veces el límite. ``LOGIN_THROTTLE_CACHE`` (un alias de ``CACHES``) usa
+``CacheSlidingWindow``, que guarda el mismo estado en la caché de Django y
+lo comparte entre workers. Leer y escribir la caché no es atómico, así que
+intentos simultáneos de la misma clave pueden contarse una sola vez.
+
+El bloqueo por usuario también lo puede provocar un tercero con el nombre
+de la víctima. Por eso dura poco al principio, y un login exitoso limpia
+el contador de ese usuario.
+
+Los bloqueos que se duplican sólo aplican a los ámbitos por usuario. En una
+central de despacho todos los operadores salen por la misma IP (NAT) y
+entran a la vez en el cambio de turno: el límite por IP es holgado y, si se
+alcanza, sólo se espera a que salgan intentos de la ventana. Las IPs o redes
+de ``LOGIN_THROTTLE_TRUSTED_IPS`` no tienen límite por IP (sí por usuario).
+Detrás de un proxy inverso, ``REST_FRAMEWORK['NUM_PROXIES']`` indica cuántos
+proxies agregan ``X-Forwarded-For``; sin eso, todas las peticiones tienen la
+IP del proxy.
+"""
+import ipaddress
+import math
+import threading
+import time
+from array import array
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.throttling import BaseThrottle
+
+
+# Tramo de cada clave: cabeza, reincidencias, fin del bloqueo, último intento, tiempos
+HEAD, STRIKES, LOCKED_UNTIL, LAST_SEEN, TIMES = range(5)
+
+
+def lockout_for(strikes, lockout, max_lockout):
+    """
+    Duración del bloqueo número ``strikes`` (1, 2, ...): se duplica con cada
+    reincidencia hasta ``max_lockout``.
+    """
+    return min(lockout * 2 ** min(strikes - 1, 32), max_lockout)
+
+
+class SlidingWindow:
+    def __init__(self, limit, window, lockout=0, max_lockout=0, max_keys=100000, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.lockout = lockout
+        self.max_lockout = max(max_lockout, lockout)
+        self.ttl = window + self.max_lockout
+        self.max_keys = max_keys
+        self.clock = clock
+        self.stride = TIMES + limit
+        self._slots = {}
+        self._data = array('d')
+        self._free = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def hit(self, key):
+        """
+        Registra un intento de ``key``. Retorna 0 si se permite o los
+        segundos que faltan para el próximo intento permitido.
+        """
+        now = self.clock()
+        with self._lock:
+            base = self._slots.get(key)
+            if base is None:
+                base = self._allocate(key, now)
+            elif self._data[base + LAST_SEEN] + self.ttl <= now:
+                self._data[base:base + self.stride] = self._empty(now)
+            data = self._data
+            data[base + LAST_SEEN] = now
+            locked_until = data[base + LOCKED_UNTIL]
+            if locked_until > now:
+                return locked_until - now
+            head = int(data[base + HEAD])
+            oldest = data[base + TIMES + head]
+            if now - oldest < self.window:
+                strikes = data[base + STRIKES] + 1
+                data[base + STRIKES] = strikes
+                wait = max(oldest + self.window - now, lockout_for(strikes, self.lockout, self.max_lockout))
+                data[base + LOCKED_UNTIL] = now + wait
+                return wait
+            data[base + TIMES + head] = now
+            data[base + HEAD] = (head + 1) % self.limit
+            return 0.0
+
+    def reset(self, key):
+        with self._lock:
+            base = self._slots.pop(key, None)
+            if base is not None:
+                self._free.append(base)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._data = array('d')
+            self._free = []
+
+    def _empty(self, now):
+        return array('d', (0.0, 0.0, 0.0, now) + (-math.inf,) * self.limit)
+
+    def _allocate(self, key, now):
+        if len(self._slots) >= self.max_keys:
+            self._sweep(now)
+        if self._free:
+            base = self._free.pop()
+            self._data[base:base + self.stride] = self._empty(now)
+        else:
+            base = len(self._data)
+            self._data.extend(self._empty(now))
+        self._slots[key] = base
+        return base
+
+    def _sweep(self, now):
+        # Un recorrido cada vez que la tabla se llena: sin lista de orden por clave
+        data, ttl = self._data, self.ttl
+        live = {key: base for key, base in self._slots.items() if data[base + LAST_SEEN] + ttl > now}
+        if len(live) >= self.max_keys:
+            recent = sorted(live.items(), key=lambda item: data[item[1] + LAST_SEEN])
+            live = dict(recent[len(recent) // 10 + 1:])
+        self._free.extend(base for key, base in self._slots.items() if key not in live)
+        self._slots = live
+
+
+class CacheSlidingWindow:
+    """
+    ``SlidingWindow`` sobre la caché de Django, compartida entre workers.
+    Guarda por clave ``[reincidencias, fin del bloqueo, tiempos...]``.
+    """
+
+    def __init__(self, limit, window, lockout=0, max_lockout=0, cache_alias='default', prefix='throttle', clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.lockout = lockout
+        self.max_lockout = max(max_lockout, lockout)
+        self.ttl = window + self.max_lockout
+        self.cache = caches[cache_alias]
+        self.prefix = prefix
+        self.clock = clock
+
+    def cache_key(self, key):
+        return '%s:%s' % (self.prefix, key)
+
+    def hit(self, key):
+        now = self.clock()
+        cache_key = self.cache_key(key)
+        strikes, locked_until, *times = self.cache.get(cache_key) or (0, 0.0)
+        if locked_until > now:
+            return locked_until - now
+        times = [t for t in times if now - t < self.window]
+        if len(times) >= self.limit:
+            strikes += 1
+            wait = max(times[0] + self.window - now, lockout_for(strikes, self.lockout, self.max_lockout))
+            self.cache.set(cache_key, [strikes, now + wait, *times], math.ceil(self.ttl))
+            return wait
+        self.cache.set(cache_key, [strikes, 0.0, *times, now], math.ceil(self.ttl))
+        return 0.0
+
+    def reset(self, key):
+        self.cache.delete(self.cache_key(key))
+
+    def clear(self):
+        # Las entradas vencen solas; no se borra la caché compartida completa
+        pass
+
+
+def throttling_enabled():
+    return getattr(settings, 'LOGIN_THROTTLE_ENABLED', True)
+
+
+@lru_cache(maxsize=None)
+def get_window(scope):
+    """
+    Ventana del ámbito ``scope`` (p. ej. ``'login-ip'``) según
+    ``LOGIN_THROTTLE_RATES``; ``None`` si no tiene límite.
+    """
+    rate = getattr(settings, 'LOGIN_THROTTLE_RATES', {}).get(scope)
+    if rate is None:
+        return None
+    limit, window = rate
+    if scope.endswith('-username'):
+        lockout, max_lockout = getattr(settings, 'LOGIN_THROTTLE_LOCKOUT', (0, 0))
+    else:
+        # Por IP no se escala: detrás de un NAT la comparten todos los operadores
+        lockout, max_lockout = 0, 0
+    cache_alias = getattr(settings, 'LOGIN_THROTTLE_CACHE', None)
+    if cache_alias:
+        return CacheSlidingWindow(limit, window, lockout, max_lockout, cache_alias, prefix='throttle:%s' % scope)
+    return SlidingWindow(limit, window, lockout, max_lockout, getattr(settings, 'LOGIN_THROTTLE_MAX_KEYS', 100000))
+
+
+@lru_cache(maxsize=None)
+def trusted_networks():
+    return tuple(
+        ipaddress.ip_network(value, strict=False) for value in getattr(settings, 'LOGIN_THROTTLE_TRUSTED_IPS', ())
+    )
+
+
+def is_trusted(ident):
+    try:
+        address = ipaddress.ip_address(ident)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_networks())
+
+
+def reset_throttles():
+    """
+    Descarta los contadores en memoria de todos los ámbitos. Son globales al
+    proceso: las pruebas lo llaman en ``setUp`` para no heredar intentos.
+    """
+    get_window.cache_clear()
+    trusted_networks.cache_clear()
+
+
+@receiver(setting_changed)
+def reset_windows(setting, **kwargs):
+    if setting.startswith('LOGIN_THROTTLE_'):
+        reset_throttles()
+
+
+def normalize_username(username):
+    return str(username).strip().casefold()
+
+
+def check_throttles(request, scope, username=None):
+    """
+    Registra un intento de ``scope`` (``'login'``, ``'register'``) para la IP
+    de la petición (salvo IPs de confianza) y, si se indica, para
+    ``username``. Retorna 0 o los segundos de espera; si la IP ya está
+    bloqueada no cuenta el intento del usuario.
+    """
+    if not throttling_enabled():
+        return 0.0
+    window = get_window(scope + '-ip')
+    ident = BaseThrottle().get_ident(request)
+    wait = window.hit(ident) if window is not None and not is_trusted(ident) else 0.0
+    if not wait and username:
+        window = get_window(scope + '-username')
+        if window is not None:
+            wait = window.hit(normalize_username(username))
+    return wait
+
+
+async def acheck_throttles(request, scope, username=None):
+    """
+    ``check_throttles`` para vistas async: con la caché compartida la
+    consulta sale del event loop.
+    """
+    if getattr(settings, 'LOGIN_THROTTLE_CACHE', None):
+        return await sync_to_async(check_throttles)(request, scope, username)
+    return check_throttles(request, scope, username)
+
+
+def reset_username(scope, username):
+    """
+    Limpia el contador de ``username`` (login exitoso).
+    """
+    window = get_window(scope + '-username')
+    if window is not None and username:
+        window.reset(normalize_username(username))
+
+
+async def areset_username(scope, username):
+    if getattr(settings, 'LOGIN_THROTTLE_CACHE', None):
+        return await sync_to_async(reset_username)(scope, username)
+    return reset_username(scope, username)
+
+
+class ScopedLoginThrottle(BaseThrottle):
+    """
+    Throttle DRF que aplica ``check_throttles`` con el ámbito ``scope`` y el
+    ``username`` del cuerpo de la petición.
+    """
+    scope = None
+
+    def allow_request(self, request, view):
+        data = request.data
+        username = data.get('username') if hasattr(data, 'get') else None
+        self.wait_seconds = check_throttles(request, self.scope, username)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(ScopedLoginThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(ScopedLoginThrottle):
+    scope = 'register'
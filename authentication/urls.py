@@ -1,5 +1,5 @@
 from django.urls import path
-from authentication import views
+from authentication import async_views, views
 from .views import LoginView  # Importa directamente la clase
 
 urlpatterns = [
@@ -7,15 +7,32 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', views.logout, name='logout'),
     path('register/', views.register, name='register'),
+    path('refresh/', views.token_refresh, name='token-refresh'),
     
     # Usuarios
     path('info/', views.get_user_info, name='user-info'),
     path('list/', views.get_user_list, name='user-list'),
     path('create/', views.create_user, name='user-create'),
+    path('create/bulk/', views.bulk_create_user, name='user-bulk-create'),
+    path('create/import/', views.import_users, name='user-import'),
     
     # Roles
     path('roles/', views.role_list, name='role-list'),
     path('roles/create/', views.create_role, name='role-create'),
     path('roles/user/', views.get_user_roles, name='user-roles'),
     path('roles/assign/', views.assign_role, name='role-assign'),
+    path('roles/assign/bulk/', views.bulk_assign_role, name='role-bulk-assign'),
+
+    # Menús
+    path('menus/', views.get_user_menu, name='user-menu'),
+
+    # Métricas (Prometheus)
+    path('metrics/', views.metrics_view, name='metrics'),
+
+    # Versiones async (ASGI)
+    path('login/async/', async_views.login_async, name='login-async'),
+    path('logout/async/', async_views.logout_async, name='logout-async'),
+    path('info/async/', async_views.get_user_info_async, name='user-info-async'),
+    path('roles/async/', async_views.role_list_async, name='role-list-async'),
+    path('roles/user/async/', async_views.get_user_roles_async, name='user-roles-async'),
 ]
\ No newline at end of file
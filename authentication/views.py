@@ -1,55 +1,95 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from .authentication import ClaimsUser
+from .blacklist import BloomRefreshToken, BloomTokenRefreshSerializer, revoke_access_tokens_enabled, revoke_token
+from . import metrics
+from .bulk import ERROR, bulk_assign_roles, bulk_create_users
+from .cache import get_effective_permissions
+from .claims import has_permissions
+from .etags import role_list_etag, user_info_etag, user_menu_etag
+from .hashing import HashingBusy
+from .menus import menu_cache
 from .models import Role, UserRole
+from .pagination import UserCursorPagination
+from .projections import fast_reads_enabled, get_projection
+from .parsers import NDJSONParser
+from .queries import plan_queryset
+from .routes import PERMISSION, PUBLIC, RoutePolicyPermission, get_request_policy, route_policy
+from .streaming import stream_json_array
+from .throttling import LoginThrottle, RegisterThrottle, reset_username
 from .serializers import (
     CustomTokenObtainPairSerializer,
     UserSerializer,
     RoleSerializer,
     UserRoleSerializer,
     UserInfoSerializer,
-    RegisterSerializer #sayuri
+    RegisterSerializer, #sayuri
+    BulkRegisterSerializer
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from datetime import datetime, timedelta
+from functools import wraps
 
 
 User = get_user_model()
 
+def set_auth_cookies(response, access_token, refresh_token):
+    """
+    Configura las cookies HttpOnly con los tokens JWT.
+    """
+    response.set_cookie(
+        'access_token',
+        access_token,
+        httponly=True,
+        secure=True,
+        samesite='Strict',
+        max_age=3600  # 1 hora
+    )
+
+    response.set_cookie(
+        'refresh_token',
+        refresh_token,
+        httponly=True,
+        secure=True,
+        samesite='Strict',
+        max_age=24 * 3600  # 24 horas
+    )
+    return response
+
+# Respuesta cuando la cola de hashing de contraseñas está saturada
+HASHING_BUSY_RESPONSE = {
+    'status': 'error',
+    'message': 'Servicio ocupado, intente de nuevo en unos segundos'
+}
+
+@route_policy(PUBLIC)
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    # Rechaza por IP y usuario antes de consultar la base o calcular el hash
+    throttle_classes = [LoginThrottle]
     
     def post(self, request, *args, **kwargs):
         try:
             response = super().post(request, *args, **kwargs)
             if response.status_code == 200:
+                reset_username('login', request.data.get('username'))
+
                 # Configurar cookies HttpOnly
-                access_token = response.data['access']
-                refresh_token = response.data['refresh']
-                
-                response.set_cookie(
-                    'access_token',
-                    access_token,
-                    httponly=True,
-                    secure=True,
-                    samesite='Strict',
-                    max_age=3600  # 1 hora
-                )
-                
-                response.set_cookie(
-                    'refresh_token',
-                    refresh_token,
-                    httponly=True,
-                    secure=True,
-                    samesite='Strict',
-                    max_age=24 * 3600  # 24 horas
-                )
+                set_auth_cookies(response, response.data['access'], response.data['refresh'])
                 
                 # Eliminar tokens de la respuesta JSON para mayor seguridad
                 response.data = {
@@ -58,6 +98,9 @@ class LoginView(TokenObtainPairView):
                     'message': 'Login exitoso'
                 }
             return response
+        except HashingBusy:
+            return Response(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': '1'})
         #login fallido 
         except Exception as e:
             return Response({
@@ -67,8 +110,10 @@ class LoginView(TokenObtainPairView):
             }, status=status.HTTP_401_UNAUTHORIZED)
 
 # Vista de Registro
+@route_policy(PUBLIC)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register(request):
     serializer = RegisterSerializer(data=request.data) #toma los datos del usuario
     
@@ -94,26 +139,20 @@ def register(request):
             }, status=status.HTTP_201_CREATED)
             
             # Configurar cookies HttpOnly
-            response.set_cookie(
-                'access_token',
-                access_token,
-                httponly=True,
-                secure=True,
-                samesite='Strict',
-                max_age=3600  # 1 hora access token
-            )
-            
-            response.set_cookie(
-                'refresh_token',
-                refresh_token,
-                httponly=True,
-                secure=True,
-                samesite='Strict',
-                max_age=24 * 3600  # 24 horas refresh token
-            )
+            set_auth_cookies(response, access_token, refresh_token)
             
             return response
             
+        except HashingBusy:
+            return Response(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': '1'})
+        except ValidationError as e:
+            # Otra petición registró el username o el email al mismo tiempo
+            return Response({
+                'status': 'error',
+                'message': 'Error en el registro',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'status': 'error',
@@ -129,14 +168,18 @@ def register(request):
 
 # Vista de Logout
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def logout(request):
     try:
         # Obtener el token de refresco de la cookie
         refresh_token = request.COOKIES.get('refresh_token')
         if refresh_token:
-            token = RefreshToken(refresh_token)
+            token = BloomRefreshToken(refresh_token)
             token.blacklist()
+
+        # Revocar también el token de acceso (TOKEN_BLACKLIST_REVOKE_ACCESS)
+        if revoke_access_tokens_enabled() and request.auth is not None:
+            revoke_token(request.auth)
             
         response = Response({
             'status': 'success',
@@ -154,17 +197,56 @@ def logout(request):
             'message': 'Error al cerrar sesión'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+# Vista para renovar los tokens a partir de la cookie refresh_token. Con
+# ROTATE_REFRESH_TOKENS y BLACKLIST_AFTER_ROTATION el refresh usado queda en
+# la lista negra; la verificación pasa por el filtro de Bloom (blacklist.py).
+@route_policy(PUBLIC)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    refresh_token = request.COOKIES.get('refresh_token')
+    if not refresh_token:
+        return Response({
+            'status': 'error',
+            'message': 'No autorizado - Token no encontrado'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
+    serializer = BloomTokenRefreshSerializer(data={'refresh': refresh_token})
+    try:
+        serializer.is_valid(raise_exception=True)
+    except (TokenError, AuthenticationFailed, User.DoesNotExist):
+        return Response({
+            'status': 'error',
+            'message': 'No autorizado - Token inválido'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
+    response = Response({
+        'status': 'success',
+        'message': 'Token renovado'
+    })
+    return set_auth_cookies(
+        response,
+        serializer.validated_data['access'],
+        serializer.validated_data.get('refresh', refresh_token)
+    )
+
 # Vista para listar roles en donde hay ACCESO RESTRINGIDO
+# La lista es igual para todos: el navegador la reutiliza ROLE_LIST_MAX_AGE
+# segundos y luego revalida con If-None-Match
+@cache_control(private=True, max_age=getattr(settings, 'ROLE_LIST_MAX_AGE', 30))
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
+@condition(etag_func=role_list_etag)
 def role_list(request):
     roles = Role.objects.filter(is_active=True)
+    if fast_reads_enabled():
+        return Response(get_projection(RoleSerializer).rows(roles))
     serializer = RoleSerializer(roles, many=True)
     return Response(serializer.data)
 
 # Vista para crear roles
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def create_role(request):
     serializer = RoleSerializer(data=request.data)
     if serializer.is_valid():
@@ -174,15 +256,18 @@ def create_role(request):
 
 # Vista para obtener roles del usuario
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def get_user_roles(request):
-    user_roles = UserRole.objects.filter(user=request.user, role__is_active=True)
+    user_roles = plan_queryset(
+        UserRole.objects.filter(user_id=request.user.id, role__is_active=True),
+        UserRoleSerializer
+    )
     serializer = UserRoleSerializer(user_roles, many=True)
     return Response(serializer.data)
 
 # Vista para asignar roles
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def assign_role(request):
     data = {
         'user_id': request.data.get('user_id'),
@@ -195,30 +280,215 @@ def assign_role(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Vista para información del usuario actual
+# Vista para información del usuario actual (revalida siempre; un 304 no
+# consulta la base de datos)
+@cache_control(private=True, no_cache=True)
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
+@condition(etag_func=user_info_etag)
 def get_user_info(request):
+    if fast_reads_enabled():
+        return Response({
+            'status': 'success',
+            'user': get_user_info_data(request.user.id)
+        })
     serializer = UserInfoSerializer(request.user)
     return Response({
         'status': 'success',
         'user': serializer.data
     })
 
+def get_user_info_data(user_id):
+    """
+    Misma salida que ``UserInfoSerializer`` con dos consultas ``.values()``.
+    """
+    projection = get_projection(UserInfoSerializer, exclude=('roles',))
+    data = projection.row(User.objects.values(*projection.columns).get(pk=user_id))
+    data['roles'] = get_projection(RoleSerializer).rows(
+        Role.objects.filter(user_roles__user_id=user_id, is_active=True)
+    )
+    return data
+
+# Vista para el árbol de navegación del usuario actual
+@cache_control(private=True, no_cache=True)
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+@condition(etag_func=user_menu_etag)
+def get_user_menu(request):
+    role_ids = get_effective_permissions(request.user).role_ids
+    return HttpResponse(menu_cache.render(role_ids), content_type='application/json')
+
+# Campos de lectura disponibles en el listado de usuarios (?fields=)
+USER_LIST_FIELDS = ('id', 'username', 'email', 'is_active')
+
 # Vista para listar usuarios
+# Parámetros: ?fields=id,username  ?is_active=true  ?role=<id>  ?page_size=n
+# ?stream=1 devuelve todos los resultados como JSON por partes (exportación)
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def get_user_list(request):
-    users = User.objects.all()
-    serializer = UserSerializer(users, many=True)
-    return Response(serializer.data)
+    params = request.query_params
+    fields = USER_LIST_FIELDS
+    if params.get('fields'):
+        fields = tuple(f for f in params['fields'].split(',') if f)
+        unknown = set(fields) - set(USER_LIST_FIELDS)
+        if unknown:
+            return Response({
+                'status': 'error',
+                'message': 'Campos no válidos: %s' % ', '.join(sorted(unknown))
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    users = User.objects.only(*fields)
+    if 'is_active' in params:
+        users = users.filter(is_active=params['is_active'].lower() in ('1', 'true'))
+    if params.get('role'):
+        if not params['role'].isdigit():
+            return Response({
+                'status': 'error',
+                'message': 'El parámetro role debe ser un id numérico'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # Semi-join en lugar de JOIN: el índice (role, user) entrega los ids
+        # ordenados y SQLite recorre auth_user por id sin ordenar en un B-tree
+        users = users.filter(id__in=UserRole.objects.filter(role_id=params['role']).values('user_id'))
+
+    if params.get('stream'):
+        rows = users.order_by('id').values(*fields)
+        return StreamingHttpResponse(stream_json_array(rows), content_type='application/json')
+
+    paginator = UserCursorPagination()
+    if fast_reads_enabled():
+        # El cursor necesita el id de la última fila aunque no se haya pedido
+        projection = get_projection(UserSerializer, fields=fields)
+        page = paginator.paginate_queryset(users.values('id', *projection.columns), request)
+        return paginator.get_paginated_response(projection.convert(page))
+    page = paginator.paginate_queryset(users, request)
+    serializer = UserSerializer(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
 
 # Vista para crear usuarios (admin)
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([RoutePolicyPermission])
 def create_user(request):
     serializer = UserSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
+        try:
+            serializer.save()
+        except HashingBusy:
+            return Response(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': '1'})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def get_bulk_items(request):
+    """
+    Valida el cuerpo de una petición masiva (arreglo JSON o NDJSON).
+    Retorna ``(items, None)`` o ``(None, respuesta_de_error)``.
+    """
+    items = request.data
+    max_items = getattr(settings, 'BULK_MAX_ITEMS', 1000)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        message = 'Se esperaba un arreglo de objetos'
+    elif not items:
+        message = 'La carga está vacía'
+    elif len(items) > max_items:
+        message = 'La carga excede el máximo de %d elementos' % max_items
+    else:
+        return items, None
+    return None, Response({'status': 'error', 'message': message}, status=status.HTTP_400_BAD_REQUEST)
+
+def bulk_response(results):
+    errors = sum(1 for result in results if result['status'] == ERROR)
+    return Response({
+        'status': 'success' if not errors else 'partial',
+        'total': len(results),
+        'errors': errors,
+        'results': results
+    }, status=status.HTTP_200_OK)
+
+# Vista para crear usuarios en bloque (admin)
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@permission_classes([RoutePolicyPermission])
+def bulk_create_user(request):
+    items, error = get_bulk_items(request)
+    if error:
+        return error
+    try:
+        results = bulk_create_users(items)
+    except HashingBusy:
+        return Response(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={'Retry-After': '1'})
+    return bulk_response(results)
+
+# Vista para importar registros en bloque (admin): mismas reglas que el
+# registro (password2 y validadores de contraseña), sin tokens ni cookies
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@permission_classes([RoutePolicyPermission])
+def import_users(request):
+    items, error = get_bulk_items(request)
+    if error:
+        return error
+    try:
+        results = bulk_create_users(items, serializer_class=BulkRegisterSerializer)
+    except HashingBusy:
+        return Response(HASHING_BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={'Retry-After': '1'})
+    return bulk_response(results)
+
+# Vista para asignar roles en bloque
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@permission_classes([RoutePolicyPermission])
+def bulk_assign_role(request):
+    items, error = get_bulk_items(request)
+    if error:
+        return error
+    return bulk_response(bulk_assign_roles(items, assigned_by_id=request.user.id))
+
+def policy_required(view):
+    """
+    Equivalente de ``ClaimsJWTAuthentication`` + ``RoutePolicyPermission``
+    para vistas Django simples: usa el token ya validado por el middleware y
+    aplica la política de la ruta.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        policy = get_request_policy(request)
+        if policy.kind == PUBLIC:
+            return view(request, *args, **kwargs)
+        token = getattr(request, 'jwt_token', None)
+        if token is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'No autorizado - Token no encontrado'
+            }, status=401)
+        request.user = ClaimsUser(token)
+        request.auth = token
+        if policy.kind == PERMISSION and not has_permissions(request, policy.codenames):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'No tiene permiso para realizar esta acción'
+            }, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+# Métricas por endpoint del proceso (RequestMetricsMiddleware) en formato de
+# texto de Prometheus; ?format=json devuelve los percentiles (comando metrics).
+# Vista Django simple para no medir el propio costo de DRF. Exige el permiso
+# view_metrics (migración 0004); ROUTE_POLICIES puede abrirla a propósito.
+@route_policy('permission:view_metrics')
+@require_GET
+@policy_required
+def metrics_view(request):
+    snapshot = metrics.registry.snapshot()
+    sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'sample_rate': sample_rate,
+            'endpoints': metrics.summarize_snapshot(snapshot)
+        })
+    return HttpResponse(
+        metrics.render_prometheus(snapshot, sample_rate),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,43 @@
+# backend/routers.py
+"""
+Routers de base de datos.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReadConnectionRouter:
+    """
+    Envía las lecturas a una conexión aparte (alias ``read``, la misma base
+    SQLite en modo ``query_only``) si está configurada. Con WAL, las lecturas
+    de esa conexión no esperan a las escrituras en curso.
+
+    Dentro de una transacción de ``default`` las lecturas se quedan en
+    ``default`` para ver lo que la misma transacción escribió; fuera de ella
+    cada consulta ve lo ya confirmado.
+    """
+    read_alias = 'read'
+
+    def db_for_read(self, model, **hints):
+        if self.read_alias not in connections.databases:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.read_alias
+
+    def db_for_write(self, model, **hints):
+        # Sin esto, guardar un objeto leído por ``read`` intentaría escribir ahí
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == self.read_alias:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, self.read_alias}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == self.read_alias:
+            return False
+        return None
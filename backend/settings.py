@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 
+from backend.sqlite import sqlite_options
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,11 +53,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',  # Para manejar CORS
     'rest_framework_simplejwt',  # Para JWT
+    'rest_framework_simplejwt.token_blacklist',  # Lista negra (logout, rotación de refresh)
     'authentication',
     'dashboard',
 ]
 
 MIDDLEWARE = [
+    'authentication.middleware.RequestMetricsMiddleware',  # Primero: mide toda la cadena
+    'authentication.middleware.ReplicaPinningMiddleware',  # Antes de cualquier lectura de roles
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Debe estar antes de CommonMiddleware
@@ -64,6 +69,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'authentication.middleware.JWTAuthenticationMiddleware',  # Valida el JWT una sola vez por petición
     'authentication.middleware.DisableCSRFForAPI',  # Middleware personalizado al final
 ]
 
@@ -90,12 +96,51 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de SQLite (backend/sqlite.py): pragmas al abrir cada conexión,
+# busy timeout y transacciones IMMEDIATE para que las escrituras concurrentes
+# esperen su turno en lugar de fallar con "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # En KiB (negativo): 64 MB por conexión
+    'temp_store': 'MEMORY',
+}
+SQLITE_BUSY_TIMEOUT = 20  # Segundos que una escritura espera el lock
+# Lecturas por una conexión aparte (backend/routers.py). Con WAL no esperan a
+# las escrituras en curso.
+SQLITE_READ_CONNECTION = False
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': sqlite_options(SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT),
+        # Conexiones persistentes por hilo; bajo ASGI usar 0 (cada petición
+        # async puede ejecutarse en otro hilo y las conexiones no se reusan)
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+if SQLITE_READ_CONNECTION:
+    DATABASES['read'] = dict(
+        DATABASES['default'],
+        OPTIONS=sqlite_options(SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT, read_only=True),
+        TEST={'MIRROR': 'default'},
+    )
+# Réplicas de lectura de roles, permisos y menús (authentication/replicas.py).
+# Cada alias debe estar en DATABASES; por ejemplo, para una copia local:
+#   DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+#                           'NAME': 'file:replica.sqlite3?mode=ro',
+#                           'OPTIONS': dict(sqlite_options(SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT,
+#                                                          read_only=True), uri=True)}
+DATABASE_REPLICAS = []  # Vacío: todo se lee del primario
+REPLICA_PIN_SECONDS = 5  # Lecturas al primario tras escribir; debe superar el retraso de replicación
+REPLICA_HEALTH_INTERVAL = 5  # Segundos entre verificaciones de cada réplica
+DATABASE_ROUTERS = [
+    'authentication.replicas.AuthReplicaRouter',  # Modelos replicados; el resto pasa al siguiente
+    'backend.routers.ReadConnectionRouter',
+]
 
 
 # Password validation
@@ -116,6 +161,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashing de contraseñas (authentication/hashing.py). El primer hasher define
+# el perfil vigente; los hashes con otro perfil se actualizan al iniciar sesión.
+PASSWORD_HASHERS = [
+    'authentication.hashing.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = 1000000  # El valor por defecto de Django 5.2; sólo se sube, nunca se baja
+
+AUTHENTICATION_BACKENDS = [
+    'authentication.hashing.OffloadedModelBackend',  # Verifica contraseñas en el pool de hashing
+]
+
+PASSWORD_HASHING_MODE = 'thread'  # 'thread', 'process' o 'inline'
+PASSWORD_HASHING_WORKERS = 4
+PASSWORD_HASHING_QUEUE_SIZE = 64  # Trabajos en espera antes de responder 503
+PASSWORD_HASHING_TIMEOUT = 5  # Segundos esperando lugar en la cola
+# Pool aparte para las altas masivas: no le quita lugares al login
+PASSWORD_BULK_HASHING_WORKERS = 1
+PASSWORD_BULK_HASHING_QUEUE_SIZE = 4
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -159,6 +227,7 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_USER_CLASS': 'authentication.authentication.ClaimsUser',  # Usuario construido desde los claims
     
     # Configuración para usar tu serializador personalizado
     'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.CustomTokenObtainPairSerializer',
@@ -166,10 +235,100 @@ SIMPLE_JWT = {
 
 # Configuración de REST Framework
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'authentication.renderers.FastJSONRenderer',  # orjson si está instalado; misma salida que JSONRenderer
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.ClaimsJWTAuthentication',  # Reutiliza el token validado por el middleware
     ),
     'DEFAULT_PERMISSION_CLASSES': (
-        'rest_framework.permissions.IsAuthenticated',  # Todas las vistas requieren auth por defecto
+        'authentication.routes.RoutePolicyPermission',  # Aplica ROUTE_POLICIES (autenticado por defecto)
     ),
-}
\ No newline at end of file
+}
+
+# Políticas de acceso por prefijo de ruta (authentication/routes.py).
+# Las vistas también pueden declararla con @route_policy; el setting tiene prioridad.
+ROUTE_POLICY_DEFAULT = 'authenticated'
+ROUTE_POLICIES = {
+    '/admin/': 'public',  # El admin usa su propia sesión
+    '/static/': 'public',
+    # /auth/metrics/ exige el permiso view_metrics (token del scraper). Para
+    # que Prometheus la consulte sin token, abrirla a propósito y restringir
+    # la red en el proxy: '/auth/metrics/': 'public'.
+}
+
+# Caché de permisos efectivos por usuario (authentication/cache.py)
+PERMISSIONS_CACHE_SIZE = 1024  # Máximo de usuarios en caché por proceso (LRU)
+PERMISSIONS_CACHE_TTL = 300  # Segundos; acota la desincronización entre workers
+# Permisos como máscara de bits en los tokens (authentication/claims.py)
+TOKEN_PERMISSION_CLAIMS = True
+
+# Límite de intentos de login y registro (authentication/throttling.py); se
+# rechaza con 429 antes de consultar la base o calcular el hash
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_RATES = {  # ámbito -> (intentos, ventana en segundos)
+    # Holgado: en el cambio de turno todos los operadores entran desde la IP del NAT
+    'login-ip': (300, 60),
+    'login-username': (5, 300),
+    'register-ip': (10, 3600),
+}
+# Primer bloqueo y máximo (s) de los ámbitos por usuario; se duplica con cada
+# reincidencia. Los ámbitos por IP no se escalan.
+LOGIN_THROTTLE_LOCKOUT = (60, 3600)
+# IPs o redes (CIDR) sin límite por IP, p. ej. el NAT de la central; el límite
+# por usuario se mantiene. Detrás de un proxy inverso, configurar también
+# REST_FRAMEWORK['NUM_PROXIES'] para tomar la IP real de X-Forwarded-For.
+LOGIN_THROTTLE_TRUSTED_IPS = []
+LOGIN_THROTTLE_MAX_KEYS = 100000  # Claves en memoria por ámbito (LRU)
+LOGIN_THROTTLE_CACHE = None  # Alias de CACHES para compartir los contadores entre workers
+
+# Árbol de navegación en caché (authentication/menus.py)
+MENU_CACHE_SIZE = 256  # Conjuntos de roles distintos con JSON ya renderizado
+MENU_CACHE_TTL = 300  # Segundos; acota la desincronización entre workers
+
+# Listados de roles y usuarios con .values() en lugar de serializadores
+# (authentication/projections.py); misma salida
+FAST_READ_PATHS = True
+
+# ETags por versión de roles, usuario actual y menú (authentication/etags.py)
+ETAG_TTL = 300  # Segundos; acota cuánto tarda otro worker en cambiar sus ETags
+ROLE_LIST_MAX_AGE = 30  # Cache-Control max-age de la lista de roles
+
+# Índice espacial de unidades (dashboard/spatial.py)
+UNIT_INDEX_CELL_DEG = 0.01  # Tamaño de celda (~1,1 km); cambiarlo requiere recalcular Unit.cell
+UNIT_INDEX_TTL = 30  # Segundos; recarga completa para ver cambios de otros procesos
+UNIT_NEAREST_MAX_KM = 100  # Radio máximo de búsqueda de unidades cercanas
+
+# Cola de despacho de incidentes (dashboard/dispatch.py)
+DISPATCH_ZONE_DEG = 0.1  # Tamaño de las zonas (~11 km)
+DISPATCH_QUEUE_TTL = 60  # Segundos; reconstrucción completa para ver cambios de otros procesos
+DISPATCH_CLAIM_TTL = 600  # Segundos tras los que una toma sin despachar vence
+
+# Ingesta de posiciones con escritura diferida (dashboard/ingestion.py)
+POSITION_BUFFER_SIZE = 1000  # Reportes pendientes que disparan una escritura
+POSITION_FLUSH_INTERVAL = 1.0  # Segundos máximos que un reporte espera en el búfer
+POSITION_BUFFER_MAX = 50000  # Tope de pendientes; por encima se responde 503
+POSITION_FLUSH_THREAD = True  # Hilo que vacía el búfer aunque no lleguen reportes
+POSITION_FLUSH_ATTEMPTS = 3  # Fallos seguidos tras los que se descarta el lote pendiente
+
+# Feed de cambios para las consolas (dashboard/events.py, /dashboard/events/)
+EVENTS_HISTORY_SIZE = 1000  # Eventos recientes para retomar desde Last-Event-ID
+EVENTS_QUEUE_SIZE = 100  # Pendientes por consola; al superarlo se envía 'resync'
+EVENTS_HEARTBEAT = 15  # Segundos entre comentarios de keep-alive del stream SSE
+EVENTS_RETRY_MS = 3000  # Espera sugerida al navegador antes de reconectarse
+EVENTS_POLL_TIMEOUT = 25  # Segundos máximos de espera del long-poll
+
+# Métricas por endpoint (authentication/metrics.py, /auth/metrics/)
+METRICS_ENABLED = True
+METRICS_SAMPLE_RATE = 0.1  # Fracción de peticiones medidas; 1.0 mide todas
+
+# Lista negra de tokens con filtro de Bloom (authentication/blacklist.py)
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000  # Entradas antes de reconstruir con más bits
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001  # Falsos positivos (se confirman en la base de datos)
+TOKEN_BLACKLIST_REFRESH_INTERVAL = 1  # Segundos; ventana para ver revocaciones de otros workers
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 3600  # Segundos; descarta entradas compactadas
+TOKEN_BLACKLIST_REVOKE_ACCESS = False  # True: logout también revoca el token de acceso
+
+# Máximo de elementos por petición en los endpoints masivos (authentication/bulk.py)
+BULK_MAX_ITEMS = 1000
@@ -0,0 +1,34 @@
+# backend/sqlite.py
+"""
+Perfil de conexión de SQLite para producción.
+
+Django (5.1+) ejecuta ``OPTIONS['init_command']`` al abrir cada conexión; ahí
+se aplican los ``SQLITE_PRAGMAS`` de settings.py:
+
+- ``journal_mode=WAL``: los lectores no bloquean al escritor ni viceversa.
+- ``synchronous=NORMAL``: con WAL sólo se sincroniza al hacer checkpoint;
+  un corte de energía puede perder las últimas transacciones, no corromper.
+- ``mmap_size``/``cache_size``: lecturas desde memoria en lugar de read().
+
+``timeout`` es el ``busy_timeout``: cuánto espera una escritura a que se
+libere el lock antes de fallar con "database is locked". Con
+``transaction_mode=IMMEDIATE`` las transacciones toman el lock de escritura al
+empezar; en modo DEFERRED dos transacciones que leen y luego escriben se
+bloquean mutuamente y una falla sin esperar el ``timeout``.
+"""
+
+
+def sqlite_options(pragmas, timeout, read_only=False):
+    """
+    ``OPTIONS`` de una base SQLite con los ``pragmas`` dados. Las conexiones
+    ``read_only`` rechazan escrituras (``query_only``) y no abren
+    transacciones de escritura.
+    """
+    pragmas = dict(pragmas, query_only='ON') if read_only else pragmas
+    options = {
+        'init_command': ';'.join('PRAGMA %s=%s' % item for item in pragmas.items()),
+        'timeout': timeout,
+    }
+    if not read_only:
+        options['transaction_mode'] = 'IMMEDIATE'
+    return options
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+
+from backend.routers import ReadConnectionRouter
+from backend.sqlite import sqlite_options
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            # La base de pruebas está en memoria: journal_mode y mmap_size no aplican
+            for pragma in ('synchronous', 'cache_size'):
+                with self.subTest(pragma=pragma):
+                    value = cursor.execute('PRAGMA %s' % pragma).fetchone()[0]
+                    expected = {'synchronous': 1}.get(pragma, settings.SQLITE_PRAGMAS[pragma])
+                    self.assertEqual(value, expected)
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], settings.SQLITE_BUSY_TIMEOUT * 1000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_read_only_options(self):
+        options = sqlite_options({'journal_mode': 'WAL'}, 5, read_only=True)
+        self.assertEqual(options['init_command'], 'PRAGMA journal_mode=WAL;PRAGMA query_only=ON')
+        self.assertNotIn('transaction_mode', options)
+
+
+class ReadConnectionRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadConnectionRouter()
+
+    def test_without_read_alias_uses_default_routing(self):
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_reads_go_to_read_alias_outside_transactions(self):
+        with mock.patch.dict(connections.settings, {'read': connections.settings['default']}):
+            self.assertEqual(self.router.db_for_read(User), 'read')
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_objects_read_from_read_alias_are_saved_to_default(self):
+        user = User(username='operador')
+        self.assertIsNone(self.router.db_for_write(User, instance=user))
+        user._state.db = 'read'
+        self.assertEqual(self.router.db_for_write(User, instance=user), 'default')
+        self.assertFalse(self.router.allow_migrate('read', 'auth'))
@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Incident, Unit
+
+
+@admin.register(Unit)
+class UnitAdmin(admin.ModelAdmin):
+    list_display = ('code', 'unit_type', 'status', 'latitude', 'longitude', 'position_updated_at')
+    list_filter = ('status', 'unit_type')
+    search_fields = ('code',)
+    readonly_fields = ('cell',)
+
+
+@admin.register(Incident)
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'priority', 'status', 'assigned_unit', 'claimed_by', 'created_at')
+    list_filter = ('status', 'priority')
+    search_fields = ('title',)
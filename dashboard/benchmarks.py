@@ -0,0 +1,231 @@
+# dashboard/benchmarks.py
+"""
+Benchmarks de la app dashboard. Ejecutar con ``python manage.py bench``.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from authentication.benchmarking import benchmark, measure, summarize
+from authentication.benchmarks import get_access_token, get_bench_user
+from .dispatch import DispatchQueue
+from .events import EventHub
+from .ingestion import PositionBuffer, parse_ping, position_buffer
+from .models import Incident, Unit, UnitPosition
+from .spatial import UnitIndex, haversine_km
+
+
+# Centro de Lima; las unidades se reparten en ~40 x 40 km
+CENTER = (-12.0464, -77.0428)
+
+
+def seed_units(count, rng, spread=0.2):
+    Unit.objects.bulk_create(
+        Unit(
+            code='U-%05d' % i,
+            unit_type=rng.choice(['ambulancia', 'patrulla', 'bomberos']),
+            status=Unit.AVAILABLE if rng.random() < 0.7 else Unit.ASSIGNED,
+            latitude=CENTER[0] + rng.uniform(-spread, spread),
+            longitude=CENTER[1] + rng.uniform(-spread, spread),
+        )
+        for i in range(count)
+    )
+
+
+@benchmark('nearest')
+def bench_nearest(iterations, sizes=(1000, 5000, 20000)):
+    """
+    Las 5 unidades disponibles más cercanas a un punto al azar: recorrido
+    completo de la tabla con haversine (antes) contra el índice de grilla
+    (después). El índice incluye el costo de mover una unidad por consulta,
+    como ocurre con los reportes de posición.
+    """
+    rng = random.Random(42)
+    results = []
+    for size in sizes:
+        Unit.objects.all().delete()
+        seed_units(size, rng)
+        index = UnitIndex(ttl=3600)
+        grid = index.grid
+        unit_ids = list(grid.entries)
+
+        def point():
+            return CENTER[0] + rng.uniform(-0.2, 0.2), CENTER[1] + rng.uniform(-0.2, 0.2)
+
+        def full_scan():
+            lat, lon = point()
+            rows = Unit.objects.filter(status=Unit.AVAILABLE, latitude__isnull=False).values_list(
+                'id', 'latitude', 'longitude'
+            )
+            return sorted((haversine_km(lat, lon, p_lat, p_lon), unit_id) for unit_id, p_lat, p_lon in rows)[:5]
+
+        def indexed():
+            lat, lon = point()
+            return grid.nearest(lat, lon, 5, statuses={Unit.AVAILABLE})
+
+        def indexed_with_move():
+            unit_id = rng.choice(unit_ids)
+            grid.update(unit_id, *point(), Unit.AVAILABLE, 'ambulancia')
+            return indexed()
+
+        scan_iterations = max(1, min(iterations, 200000 // size))
+        results.append(measure('haversine tabla completa, %d' % size, full_scan, scan_iterations))
+        results.append(measure('grilla, %d' % size, indexed, iterations))
+        results.append(measure('grilla + mover unidad, %d' % size, indexed_with_move, iterations))
+    return results
+
+
+@benchmark('ingestion')
+def bench_ingestion(iterations, units=500, batch_size=100):
+    """
+    Reportes de posición por segundo: un UPDATE + INSERT por reporte (antes)
+    contra el búfer de escritura diferida, llamado directamente y a través del
+    endpoint NDJSON. Cada operación medida es un lote de ``batch_size``
+    reportes; ops/s se expresa en reportes por segundo e incluye los flush.
+    """
+    rng = random.Random(3)
+    Unit.objects.all().delete()
+    seed_units(units, rng)
+    unit_ids = list(Unit.objects.values_list('id', flat=True))
+    batches = max(10, min(iterations, 200))
+
+    def items():
+        now = time.time()
+        return [
+            {'unit_id': rng.choice(unit_ids), 'latitude': CENTER[0] + rng.uniform(-0.2, 0.2),
+             'longitude': CENTER[1] + rng.uniform(-0.2, 0.2), 'recorded_at': now}
+            for _ in range(batch_size)
+        ]
+
+    def per_ping():
+        received_at = timezone.now()
+        for item in items():
+            unit_id, latitude, longitude, recorded_at, _ = parse_ping(item, received_at)[0]
+            unit = Unit(id=unit_id, latitude=latitude, longitude=longitude, position_updated_at=recorded_at)
+            unit.save(update_fields=['latitude', 'longitude', 'position_updated_at'])
+            UnitPosition.objects.create(unit_id=unit_id, latitude=latitude, longitude=longitude,
+                                        recorded_at=recorded_at, received_at=received_at)
+
+    client = Client()
+    client.cookies['access_token'] = get_access_token(get_bench_user())
+
+    def http():
+        body = '\n'.join(json.dumps(item) for item in items())
+        client.post('/dashboard/units/positions/', body, content_type='application/x-ndjson')
+
+    def run(label, func, buffer=None, count=batches):
+        start = time.perf_counter()
+        samples = []
+        for _ in range(count):
+            begin = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - begin)
+        if buffer is not None:
+            buffer.flush()
+        wall = time.perf_counter() - start
+        result = summarize(label, samples)
+        result['ops_per_sec'] = count * batch_size / wall
+        if buffer is not None:
+            lag = buffer.stats()['end_to_end_lag_ms']
+            result['label'] = '%s (lag p99 %.0fms)' % (label, lag['p99'])
+        return result
+
+    buffer = PositionBuffer(size=1000, interval=1.0)
+    with override_settings(POSITION_FLUSH_THREAD=False):
+        position_buffer.reset_stats()
+        return [
+            run('un UPDATE+INSERT por reporte', per_ping, count=max(5, batches // 10)),
+            run('búfer', lambda: buffer.add([parse_ping(item, timezone.now())[0] for item in items()]), buffer),
+            run('endpoint NDJSON + búfer', http, position_buffer),
+        ]
+
+
+@benchmark('events')
+def bench_events(iterations, sizes=(100, 1000)):
+    """
+    Feed de eventos: ``publish`` desde otro hilo (como las señales) y la
+    latencia hasta que cada consola suscrita recibe el evento, con 100 y
+    1000 suscripciones en un mismo event loop.
+    """
+    count = max(20, min(iterations, 200))
+    results = []
+
+    for size in sizes:
+        events_hub = EventHub(history_size=count, queue_size=count)
+        publish_samples, delivery_samples = [], []
+
+        async def consume(subscription):
+            received = 0
+            while received < count:
+                events = await subscription.get(timeout=10)
+                now = time.perf_counter()
+                for event in events:
+                    delivery_samples.append(now - event.data['sent'])
+                received += len(events)
+
+        def publish():
+            for incident_id in range(count):
+                start = time.perf_counter()
+                events_hub.publish('incident', 'incident:%d' % incident_id, {'sent': start})
+                publish_samples.append(time.perf_counter() - start)
+                time.sleep(0.001)
+
+        async def main():
+            subscriptions = [events_hub.subscribe() for _ in range(size)]
+            consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+            thread = threading.Thread(target=publish)
+            thread.start()
+            await asyncio.gather(*consumers)
+            thread.join()
+
+        asyncio.run(main())
+        results.append(summarize('%d suscripciones: publish' % size, publish_samples))
+        results.append(summarize('%d suscripciones: entrega' % size, delivery_samples))
+    return results
+
+
+@benchmark('dispatch')
+def bench_dispatch(iterations, size=20000):
+    """
+    Cola de despacho con ``size`` incidentes abiertos: los 20 primeros para
+    refrescar una consola y tomar el siguiente incidente, con ``ORDER BY``
+    sobre la tabla (antes) contra la cola en memoria (después). Ambas tomas
+    usan el mismo UPDATE condicional.
+    """
+    rng = random.Random(9)
+    Incident.objects.all().delete()
+    user = get_bench_user()
+    Incident.objects.bulk_create(
+        Incident(title='Incidente %d' % i, priority=rng.randint(1, 4),
+                 latitude=CENTER[0] + rng.uniform(-0.3, 0.3), longitude=CENTER[1] + rng.uniform(-0.3, 0.3))
+        for i in range(size)
+    )
+    queue = DispatchQueue(ttl=3600)
+    queue.load()
+    count = min(iterations, size // 4)
+
+    def pending():
+        return Incident.objects.filter(queue.claimable()).order_by('priority', 'created_at')
+
+    def claim_with_order_by():
+        for incident_id in pending().values_list('id', flat=True)[:5]:
+            now = timezone.now()
+            if Incident.objects.filter(queue.claimable(now), pk=incident_id).update(
+                    claimed_by_id=user.id, claimed_at=now, updated_at=now):
+                return incident_id
+
+    results = [
+        measure('primeros 20: ORDER BY', lambda: list(pending().values_list('id', flat=True)[:20]), count),
+        measure('primeros 20: cola', lambda: queue.peek(n=20), count),
+        measure('tomar: ORDER BY + UPDATE', claim_with_order_by, count, warmup=0),
+    ]
+    # Ambas tomas parten de los mismos incidentes libres
+    Incident.objects.update(claimed_by=None, claimed_at=None)
+    queue.load()
+    results.append(measure('tomar: cola + UPDATE', lambda: queue.claim(user.id), count, warmup=0))
+    return results
@@ -0,0 +1,261 @@
+# dashboard/dispatch.py
+"""
+Cola de despacho de incidentes pendientes.
+
+Los incidentes abiertos y sin tomar se guardan en memoria en un heap por
+zona (celdas de ``DISPATCH_ZONE_DEG`` grados) ordenado por prioridad y
+antigüedad, igual que ``Incident.Meta.ordering``. Tomar el siguiente
+incidente o listar los primeros ``n`` cuesta O(log n) / O(n log n) en lugar
+de un ``ORDER BY`` sobre la tabla en cada refresco de las consolas.
+
+Las entradas no se borran del heap: ``_entries`` guarda la versión vigente
+de cada incidente y las copias obsoletas se descartan al llegar a la cima
+(borrado perezoso); el heap se compacta cuando acumula demasiadas.
+
+La cola se mantiene con las señales de ``Incident`` y se reconstruye cada
+``DISPATCH_QUEUE_TTL`` segundos. Como otros procesos tienen su propia cola,
+``claim`` toma el incidente con un UPDATE condicional (concurrencia
+optimista): si otro operador lo tomó primero, no se actualiza ninguna fila y
+se pasa al siguiente. Así dos operadores nunca toman el mismo incidente.
+"""
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .spatial import cell_of
+
+
+class DispatchQueue:
+    def __init__(self, zone_deg=0.1, ttl=60, claim_ttl=600):
+        self.zone_deg = zone_deg
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self._lock = threading.RLock()
+        self._heaps = None  # zona -> heap de (prioridad, creado, id)
+        self._entries = {}  # id -> entrada vigente
+        self._zone_of_entry = {}
+        self._counts = {}  # zona -> incidentes vigentes
+        self._stale = 0
+        self._loaded_at = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            zone_deg=getattr(settings, 'DISPATCH_ZONE_DEG', 0.1),
+            ttl=getattr(settings, 'DISPATCH_QUEUE_TTL', 60),
+            claim_ttl=getattr(settings, 'DISPATCH_CLAIM_TTL', 600),
+        )
+
+    def zone_of(self, latitude, longitude):
+        return '%d:%d' % cell_of(latitude, longitude, self.zone_deg)
+
+    def claimable(self, now=None):
+        """
+        Filtro de los incidentes que se pueden tomar: abiertos y sin tomar o
+        con la toma vencida.
+        """
+        from .models import Incident
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.claim_ttl)
+        return Q(status=Incident.OPEN) & (Q(claimed_by__isnull=True) | Q(claimed_at__lt=cutoff))
+
+    def load(self):
+        from .models import Incident
+        rows = Incident.objects.filter(self.claimable()).values_list(
+            'id', 'priority', 'created_at', 'latitude', 'longitude'
+        )
+        with self._lock:
+            self._heaps, self._entries, self._zone_of_entry, self._counts = {}, {}, {}, {}
+            self._stale = 0
+            for incident_id, priority, created_at, latitude, longitude in rows.iterator(chunk_size=5000):
+                zone = self.zone_of(latitude, longitude)
+                entry = (priority, created_at.timestamp(), incident_id)
+                self._heaps.setdefault(zone, []).append(entry)
+                self._entries[incident_id] = entry
+                self._zone_of_entry[incident_id] = zone
+                self._counts[zone] = self._counts.get(zone, 0) + 1
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._heaps is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self.load()
+
+    def invalidate(self):
+        self._heaps = None
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+    def counts(self):
+        """
+        Incidentes pendientes por zona.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._counts)
+
+    def push(self, incident_id, priority, created_at, latitude, longitude):
+        """
+        Agrega un incidente o actualiza su prioridad o zona.
+        """
+        with self._lock:
+            if self._heaps is None:
+                return  # Se cargará completo en la próxima consulta
+            self._forget(incident_id)
+            zone = self.zone_of(latitude, longitude)
+            entry = (priority, created_at.timestamp(), incident_id)
+            heapq.heappush(self._heaps.setdefault(zone, []), entry)
+            self._entries[incident_id] = entry
+            self._zone_of_entry[incident_id] = zone
+            self._counts[zone] = self._counts.get(zone, 0) + 1
+
+    def discard(self, incident_id):
+        with self._lock:
+            if self._heaps is not None:
+                self._forget(incident_id)
+
+    def update(self, incident, now=None):
+        """
+        Refleja un incidente guardado: entra a la cola si se puede tomar y
+        sale si no.
+        """
+        from .models import Incident
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.claim_ttl)
+        claimed = incident.claimed_by_id is not None and (incident.claimed_at is None or incident.claimed_at >= cutoff)
+        if incident.status == Incident.OPEN and not claimed:
+            self.push(incident.id, incident.priority, incident.created_at, incident.latitude, incident.longitude)
+        else:
+            self.discard(incident.id)
+
+    def _remove(self, incident_id):
+        if self._entries.pop(incident_id, None) is None:
+            return False
+        zone = self._zone_of_entry.pop(incident_id)
+        self._counts[zone] -= 1
+        if not self._counts[zone]:
+            del self._counts[zone]
+        return True
+
+    def _forget(self, incident_id):
+        # La copia en el heap queda obsoleta; se descarta al llegar a la cima
+        if not self._remove(incident_id):
+            return
+        self._stale += 1
+        if self._stale > 1024 and self._stale > len(self._entries):
+            self._compact()
+
+    def _valid(self, entry, zone):
+        # Una entrada que se volvió a agregar igual deja dos copias válidas;
+        # quien las recorre descarta la segunda
+        incident_id = entry[2]
+        return self._entries.get(incident_id) == entry and self._zone_of_entry[incident_id] == zone
+
+    def _compact(self):
+        for zone, heap in list(self._heaps.items()):
+            heap[:] = list({entry for entry in heap if self._valid(entry, zone)})
+            if heap:
+                heapq.heapify(heap)
+            else:
+                del self._heaps[zone]
+        self._stale = 0
+
+    def _head(self, zone):
+        heap = self._heaps.get(zone)
+        while heap:
+            entry = heap[0]
+            if self._valid(entry, zone):
+                return entry
+            heapq.heappop(heap)
+            self._stale -= 1
+        return None
+
+    def _zones(self, zones):
+        return list(self._heaps) if zones is None else [zone for zone in zones if zone in self._heaps]
+
+    def peek(self, zones=None, n=10):
+        """
+        Ids de los ``n`` primeros incidentes de las zonas dadas (todas con
+        ``None``), en orden de despacho. Recorre los heaps como árboles con un
+        heap auxiliar, sin sacar ni ordenar nada más que lo retornado.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            frontier = []
+            for zone in self._zones(zones):
+                heap = self._heaps[zone]
+                if heap:
+                    frontier.append((heap[0], zone, 0))
+            heapq.heapify(frontier)
+            result, seen = [], set()
+            while frontier and len(result) < n:
+                entry, zone, position = heapq.heappop(frontier)
+                if entry[2] not in seen and self._valid(entry, zone):
+                    seen.add(entry[2])
+                    result.append(entry[2])
+                heap = self._heaps[zone]
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], zone, child))
+            return result
+
+    def pop(self, zones=None):
+        """
+        Saca y retorna el id del siguiente incidente de las zonas dadas, o
+        ``None`` si no hay.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            best = None
+            for zone in self._zones(zones):
+                entry = self._head(zone)
+                if entry is not None and (best is None or entry < best[0]):
+                    best = (entry, zone)
+            if best is None:
+                return None
+            entry, zone = best
+            heapq.heappop(self._heaps[zone])
+            self._remove(entry[2])
+            return entry[2]
+
+    def claim(self, user_id, zones=None):
+        """
+        Toma el siguiente incidente para ``user_id``. Retorna su id, o
+        ``None`` si no queda ninguno que se pueda tomar.
+        """
+        from .models import Incident
+        while True:
+            incident_id = self.pop(zones)
+            if incident_id is None:
+                return None
+            now = timezone.now()
+            claimed = Incident.objects.filter(self.claimable(now), pk=incident_id).update(
+                claimed_by_id=user_id, claimed_at=now, updated_at=now
+            )
+            if claimed:
+                return incident_id
+            # Otro proceso lo tomó (o se cerró) antes; se sigue con el próximo
+
+    def release(self, incident_id, user_id):
+        """
+        Devuelve a la cola un incidente tomado por ``user_id``. Retorna si se
+        liberó.
+        """
+        from .models import Incident
+        released = Incident.objects.filter(pk=incident_id, status=Incident.OPEN, claimed_by_id=user_id).update(
+            claimed_by=None, claimed_at=None, updated_at=timezone.now()
+        )
+        if released:
+            incident = Incident.objects.only('priority', 'created_at', 'latitude', 'longitude').get(pk=incident_id)
+            self.push(incident.id, incident.priority, incident.created_at, incident.latitude, incident.longitude)
+        return bool(released)
+
+
+dispatch_queue = DispatchQueue.from_settings()
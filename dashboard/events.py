@@ -0,0 +1,288 @@
+# dashboard/events.py
+"""
+Difusión de cambios de incidentes y unidades a las consolas conectadas.
+
+``EventHub`` recibe eventos desde cualquier hilo (señales, ingesta de
+posiciones) y los reparte a las suscripciones, que viven en el event loop de
+ASGI. Cada suscripción tiene una cola acotada que *coalesce* por objeto: si
+llega un evento de una unidad que aún tiene otro pendiente, sólo se conserva
+el más nuevo (los eventos llevan el estado completo). Si la cola se llena con
+objetos distintos se descartan los más antiguos y la consola recibe un evento
+``resync`` para que recargue el estado.
+
+Los ids de evento son ``<época>-<secuencia>``; el hub guarda los últimos
+``EVENTS_HISTORY_SIZE`` eventos para retomar desde ``Last-Event-ID``. Si el id
+es de otra época (el proceso se reinició) o ya salió del historial, también se
+envía ``resync``. El hub es por proceso: el feed debe servirse desde el mismo
+proceso que recibe los cambios (o agregar un broker entre procesos).
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+RESYNC = 'resync'
+
+
+class Event:
+    __slots__ = ('id', 'seq', 'type', 'key', 'data')
+
+    def __init__(self, event_id, seq, event_type, key, data):
+        self.id = event_id
+        self.seq = seq
+        self.type = event_type
+        self.key = key
+        self.data = data
+
+
+class Subscription:
+    """
+    Cola acotada de eventos de una consola. Sólo el hub la modifica (con su
+    lock); el consumidor espera ``ready`` en su event loop.
+    """
+
+    def __init__(self, hub, loop, types=None, maxsize=100):
+        self.hub = hub
+        self.loop = loop
+        self.types = types
+        self.maxsize = maxsize
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+        self.lagged = False
+        self.closed = False
+
+    def accepts(self, event):
+        return self.types is None or event.type.split('.')[0] in self.types
+
+    def push(self, event):
+        key = event.key or event.id
+        if key in self.pending:
+            # Se mueve al final para que los ids entregados sigan en orden
+            del self.pending[key]
+            self.coalesced += 1
+        elif len(self.pending) >= self.maxsize:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+            self.lagged = True
+        self.pending[key] = event
+
+    def drain(self):
+        """
+        Retira los eventos pendientes. Si se descartó alguno, sólo se retorna
+        ``resync``: la consola recargará el estado completo, que ya incluye
+        los pendientes.
+        """
+        with self.hub.lock:
+            if self.lagged:
+                events = [self.hub.resync_event()]
+            else:
+                events = list(self.pending.values())
+            self.pending.clear()
+            self.lagged = False
+            self.ready.clear()
+        return events
+
+    async def get(self, timeout=None):
+        """
+        Espera hasta ``timeout`` segundos y retorna los eventos pendientes
+        (lista vacía si no llegó ninguno).
+        """
+        if not self.pending and not self.lagged:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        return self.drain()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, history_size=1000, queue_size=100):
+        self.epoch = '%x' % int(time.time() * 1000)
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=history_size)
+        self._seq = itertools.count(1)
+        self._subscriptions = {}  # loop -> set de suscripciones
+        self.published = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            history_size=getattr(settings, 'EVENTS_HISTORY_SIZE', 1000),
+            queue_size=getattr(settings, 'EVENTS_QUEUE_SIZE', 100),
+        )
+
+    @property
+    def last_event_id(self):
+        return '%s-%d' % (self.epoch, self.published)
+
+    def resync_event(self):
+        # Lleva el id del último evento publicado: al retomar desde él no se
+        # repite lo que la recarga ya cubre
+        return Event(self.last_event_id, self.published, RESYNC, None, {'epoch': self.epoch})
+
+    @property
+    def subscriber_count(self):
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, types=None, last_event_id=None, maxsize=None):
+        """
+        Crea una suscripción en el event loop actual. Con ``last_event_id`` se
+        encolan primero los eventos del historial posteriores a ese id.
+        """
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, loop, types, maxsize or self.queue_size)
+        with self.lock:
+            if last_event_id:
+                self._replay(subscription, last_event_id)
+            self._subscriptions.setdefault(loop, set()).add(subscription)
+        if subscription.pending or subscription.lagged:
+            subscription.ready.set()
+        return subscription
+
+    def _replay(self, subscription, last_event_id):
+        epoch, _, seq = last_event_id.partition('-')
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = None
+        oldest = self.history[0].seq if self.history else self.published + 1
+        if epoch != self.epoch or seq is None or seq + 1 < oldest:
+            subscription.lagged = True
+            return
+        for event in self.history:
+            if event.seq > seq and subscription.accepts(event):
+                subscription.push(event)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self._subscriptions.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.loop]
+        subscription.closed = True
+
+    def publish(self, event_type, key, data):
+        """
+        Publica un evento desde cualquier hilo. ``key`` identifica el objeto
+        (p. ej. ``unit:12``) para coalescer eventos pendientes.
+        """
+        with self.lock:
+            seq = next(self._seq)
+            event = Event('%s-%d' % (self.epoch, seq), seq, event_type, key, data)
+            self.history.append(event)
+            self.published = seq
+            woken = {}
+            for loop, subscriptions in self._subscriptions.items():
+                targets = [subscription for subscription in subscriptions if subscription.accepts(event)]
+                for subscription in targets:
+                    subscription.push(event)
+                if targets:
+                    woken[loop] = targets
+        # Un solo aviso por event loop, no uno por suscripción
+        for loop, targets in woken.items():
+            if loop.is_closed():
+                self._discard_loop(loop)
+                continue
+            try:
+                loop.call_soon_threadsafe(_wake, targets)
+            except RuntimeError:
+                self._discard_loop(loop)
+        return event
+
+    def _discard_loop(self, loop):
+        # Las suscripciones de un event loop cerrado ya no tienen consumidor
+        with self.lock:
+            self._subscriptions.pop(loop, None)
+
+
+def _wake(subscriptions):
+    for subscription in subscriptions:
+        subscription.ready.set()
+
+
+hub = EventHub.from_settings()
+
+
+def unit_payload(unit):
+    return {
+        'id': unit.id,
+        'code': unit.code,
+        'unit_type': unit.unit_type,
+        'status': unit.status,
+        'latitude': unit.latitude,
+        'longitude': unit.longitude,
+        'position_updated_at': unit.position_updated_at,
+    }
+
+
+def incident_payload(incident):
+    return {
+        'id': incident.id,
+        'title': incident.title,
+        'priority': incident.priority,
+        'status': incident.status,
+        'latitude': incident.latitude,
+        'longitude': incident.longitude,
+        'assigned_unit': incident.assigned_unit_id,
+        'claimed_by': incident.claimed_by_id,
+        'updated_at': incident.updated_at,
+    }
+
+
+def publish_incident(incident):
+    hub.publish('incident', 'incident:%d' % incident.id, incident_payload(incident))
+
+
+def publish_unit(unit):
+    hub.publish('unit', 'unit:%d' % unit.id, unit_payload(unit))
+
+
+def publish_positions(units):
+    """
+    Posiciones escritas por la ingesta en lote; las unidades no traen todos
+    sus campos, así que se publica sólo la posición.
+    """
+    for unit in units:
+        hub.publish('unit.position', 'unit.position:%d' % unit.id, {
+            'id': unit.id,
+            'latitude': unit.latitude,
+            'longitude': unit.longitude,
+            'position_updated_at': unit.position_updated_at,
+        })
+
+
+def publish_deleted(kind, object_id):
+    hub.publish('%s.deleted' % kind, '%s:%d' % (kind, object_id), {'id': object_id})
+
+
+def parse_types(value):
+    """
+    ``?types=incident,unit`` -> ``{'incident', 'unit'}``; ``None`` es todos.
+    """
+    types = {kind.strip() for kind in (value or '').split(',') if kind.strip()}
+    return types or None
+
+
+def format_sse(event):
+    """
+    Serializa un evento en formato ``text/event-stream``.
+    """
+    data = json.dumps(event.data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return 'id: %s\nevent: %s\ndata: %s\n\n' % (event.id, event.type, data)
+
+
+def event_as_dict(event):
+    return {'id': event.id, 'type': event.type, 'data': event.data}
@@ -0,0 +1,371 @@
+# dashboard/ingestion.py
+"""
+Ingesta de posiciones GPS con escritura diferida.
+
+Los reportes (``pings``) se acumulan en memoria en ``PositionBuffer``: el
+historial completo y, por unidad, sólo el reporte más reciente. Cuando hay
+``POSITION_BUFFER_SIZE`` reportes pendientes o el más antiguo supera
+``POSITION_FLUSH_INTERVAL`` segundos, ``flush`` los escribe en una sola
+transacción: un INSERT múltiple sobre ``UnitPosition`` y un UPDATE múltiple
+de la última posición en ``Unit`` (sólo si es más nueva que la guardada).
+Un hilo en segundo plano vacía el búfer cuando no llegan más reportes.
+
+Los reportes pendientes se pierden si el proceso termina abruptamente; es el
+costo de no escribir cada reporte por separado. Si las escrituras no dan
+abasto y se acumulan ``POSITION_BUFFER_MAX`` reportes, ``add`` lanza
+``BufferFull`` y la vista responde 503.
+
+Un flush fallido no llega al cliente (sus reportes ya fueron aceptados): se
+registra el error y los reportes vuelven al búfer. Tras
+``POSITION_FLUSH_ATTEMPTS`` fallos seguidos el lote se descarta y se
+registra cuántos reportes se perdieron, para no reintentar para siempre un
+lote que no se puede escribir (p. ej. una unidad borrada a mitad del flush).
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authentication.metrics import Histogram
+from .events import publish_positions
+from .models import Unit, UnitPosition
+from .spatial import cell_key, unit_index
+
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """
+    Hay demasiados reportes pendientes de escribir.
+    """
+
+
+def parse_ping(item, received_at):
+    """
+    Valida un reporte ``{"unit_id", "latitude", "longitude", "recorded_at"}``.
+    ``recorded_at`` es opcional (ISO 8601 o segundos epoch). Retorna
+    ``(ping, None)`` o ``(None, errores)``; sin serializadores DRF para
+    mantener bajo el costo por reporte.
+    """
+    errors = {}
+    unit_id = item.get('unit_id')
+    if not isinstance(unit_id, int) or isinstance(unit_id, bool) or unit_id <= 0:
+        errors['unit_id'] = ['Se requiere un id de unidad válido.']
+    latitude, longitude = item.get('latitude'), item.get('longitude')
+    if not isinstance(latitude, (int, float)) or not -90 <= latitude <= 90:
+        errors['latitude'] = ['La latitud debe estar entre -90 y 90.']
+    if not isinstance(longitude, (int, float)) or not -180 <= longitude <= 180:
+        errors['longitude'] = ['La longitud debe estar entre -180 y 180.']
+
+    recorded_at = item.get('recorded_at')
+    try:
+        if recorded_at is None:
+            recorded_at = received_at
+        elif isinstance(recorded_at, (int, float)) and not isinstance(recorded_at, bool):
+            recorded_at = datetime.fromtimestamp(recorded_at, tz=dt_timezone.utc)
+        elif isinstance(recorded_at, str) and (parsed := parse_datetime(recorded_at)) is not None:
+            recorded_at = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+        else:
+            recorded_at = None
+    except (OverflowError, OSError, ValueError):
+        # Epoch fuera de rango (1e20, inf) o fecha bien formada pero inexistente
+        recorded_at = None
+    if recorded_at is None:
+        errors['recorded_at'] = ['Fecha inválida (ISO 8601 o segundos epoch).']
+
+    if errors:
+        return None, errors
+    return (unit_id, float(latitude), float(longitude), recorded_at, received_at), None
+
+
+def insert_history(pings):
+    """
+    Inserta los reportes en ``UnitPosition`` con un solo ``executemany``; con
+    miles de filas, compilar el INSERT de ``bulk_create`` cuesta más que
+    ejecutarlo.
+    """
+    if not pings:
+        return
+    connection = connections[router.db_for_write(UnitPosition)]
+    meta = UnitPosition._meta
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in ('unit', 'latitude', 'longitude', 'recorded_at', 'received_at')]
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    # Los reportes de un mismo lote comparten received_at (y a menudo
+    # recorded_at): cada fecha distinta se adapta una sola vez
+    prepared = {}
+
+    def prep(value):
+        if value not in prepared:
+            prepared[value] = fields[3].get_db_prep_value(value, connection)
+        return prepared[value]
+
+    params = [
+        (unit_id, latitude, longitude, prep(recorded_at), prep(received_at))
+        for unit_id, latitude, longitude, recorded_at, received_at in pings
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def update_positions(units):
+    """
+    Guarda la última posición de ``units`` con un solo ``executemany``.
+    ``bulk_update`` arma un CASE por campo y fila cuyo costo de compilación
+    domina con cientos de unidades. La condición sobre
+    ``position_updated_at`` evita retroceder una posición si otro proceso
+    escribió una más nueva.
+    """
+    if not units:
+        return
+    connection = connections[router.db_for_write(Unit)]
+    meta = Unit._meta
+    quote = connection.ops.quote_name
+    stamp = meta.get_field('position_updated_at')
+    column = quote(stamp.column)
+    sql = 'UPDATE %s SET %s = %%s, %s = %%s, %s = %%s, %s = %%s WHERE %s = %%s AND (%s IS NULL OR %s < %%s)' % (
+        quote(meta.db_table),
+        quote(meta.get_field('latitude').column),
+        quote(meta.get_field('longitude').column),
+        quote(meta.get_field('cell').column),
+        column, quote(meta.pk.column), column, column,
+    )
+    params = []
+    for unit in units:
+        updated_at = stamp.get_db_prep_value(unit.position_updated_at, connection)
+        params.append((unit.latitude, unit.longitude, unit.cell, updated_at, unit.id, updated_at))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+class PositionBuffer:
+    """
+    Búfer de escritura diferida de posiciones.
+    """
+
+    def __init__(self, size=1000, interval=1.0, max_pending=50000, max_attempts=3):
+        self.size = size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._failures = 0
+        self._lock = threading.Lock()
+        # Sólo un flush a la vez; los reportes siguen llegando mientras tanto
+        self._flush_lock = threading.Lock()
+        self._history = []
+        self._latest = {}
+        self._oldest = None
+        self._flusher = None
+        self._wakeup = threading.Event()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            size=getattr(settings, 'POSITION_BUFFER_SIZE', 1000),
+            interval=getattr(settings, 'POSITION_FLUSH_INTERVAL', 1.0),
+            max_pending=getattr(settings, 'POSITION_BUFFER_MAX', 50000),
+            max_attempts=getattr(settings, 'POSITION_FLUSH_ATTEMPTS', 3),
+        )
+
+    def reset_stats(self):
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.discarded = 0
+        # Tiempo en el búfer (llegada -> escritura) y de punta a punta
+        # (hora del dispositivo -> escritura), en microsegundos
+        self.buffer_lag_us = Histogram()
+        self.end_to_end_lag_us = Histogram()
+        self.flush_us = Histogram()
+
+    @property
+    def pending(self):
+        return len(self._history)
+
+    def add(self, pings):
+        """
+        Encola los reportes ya validados y vacía el búfer si se alcanzó el
+        umbral de tamaño o de tiempo.
+        """
+        with self._lock:
+            if len(self._history) + len(pings) > self.max_pending:
+                raise BufferFull('Demasiados reportes pendientes')
+            if self._oldest is None and pings:
+                self._oldest = time.monotonic()
+            self._history.extend(pings)
+            latest = self._latest
+            for ping in pings:
+                current = latest.get(ping[0])
+                if current is None or ping[3] >= current[3]:
+                    latest[ping[0]] = ping
+            self.received += len(pings)
+            due = len(self._history) >= self.size or (
+                self._oldest is not None and time.monotonic() - self._oldest >= self.interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Escribe los reportes pendientes. Retorna cuántos se guardaron.
+        """
+        with self._flush_lock:
+            with self._lock:
+                history, latest = self._history, self._latest
+                self._history, self._latest, self._oldest = [], {}, None
+            if not history:
+                return 0
+            start = time.perf_counter()
+            try:
+                written = self._write(history, latest)
+            except Exception:
+                self._failed(history, latest)
+                return 0
+            self._failures = 0
+            now = timezone.now()
+
+            self.flushes += 1
+            self.written += written
+            self.dropped += len(history) - written
+            self.flush_us.record((time.perf_counter() - start) * 1e6)
+            for ping in history:
+                self.buffer_lag_us.record((now - ping[4]).total_seconds() * 1e6)
+                self.end_to_end_lag_us.record((now - ping[3]).total_seconds() * 1e6)
+        return written
+
+    def _write(self, history, latest):
+        units = {
+            unit_id: (updated_at, status, unit_type)
+            for unit_id, updated_at, status, unit_type in
+            Unit.objects.filter(id__in=list(latest)).values_list('id', 'position_updated_at', 'status', 'unit_type')
+        }
+        # Los reportes de unidades inexistentes se descartan
+        positions = [ping for ping in history if ping[0] in units]
+        moved = [
+            Unit(id=unit_id, latitude=latitude, longitude=longitude, cell=cell_key(latitude, longitude),
+                 position_updated_at=recorded_at, status=units[unit_id][1], unit_type=units[unit_id][2])
+            for unit_id, latitude, longitude, recorded_at, _ in latest.values()
+            if unit_id in units and (units[unit_id][0] is None or recorded_at > units[unit_id][0])
+        ]
+        with transaction.atomic():
+            insert_history(positions)
+            update_positions(moved)
+
+        # La actualización no pasa por save(): se actualizan a mano el índice
+        # y las consolas conectadas
+        for unit in moved:
+            unit_index.update(unit)
+        publish_positions(moved)
+        return len(positions)
+
+    def _failed(self, history, latest):
+        # Se llama con _flush_lock tomado
+        self.failed_flushes += 1
+        self._failures += 1
+        if self._failures >= self.max_attempts:
+            self._failures = 0
+            self.discarded += len(history)
+            logger.exception('Se descartan %d posiciones tras %d intentos fallidos', len(history), self.max_attempts)
+        else:
+            logger.exception('Error al escribir %d posiciones; se reintentarán', len(history))
+            self._requeue(history, latest)
+
+    def _requeue(self, history, latest):
+        # Un flush fallido devuelve sus reportes al búfer para reintentarlos
+        with self._lock:
+            self._history[:0] = history
+            for unit_id, ping in latest.items():
+                current = self._latest.get(unit_id)
+                if current is None or ping[3] > current[3]:
+                    self._latest[unit_id] = ping
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def ensure_flusher(self):
+        """
+        Inicia (una vez) el hilo que vacía el búfer cada ``interval`` segundos
+        aunque no lleguen más reportes.
+        """
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._run_flusher, name='position-flusher', daemon=True)
+                    self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._wakeup.wait(self.interval):
+            try:
+                if self._history:
+                    self.flush()
+            except Exception:
+                logger.exception('Error al escribir posiciones')
+            finally:
+                close_old_connections()
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'received': self.received,
+            'written': self.written,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'discarded': self.discarded,
+            'buffer_lag_ms': self._summary(self.buffer_lag_us),
+            'end_to_end_lag_ms': self._summary(self.end_to_end_lag_us),
+            'flush_ms': self._summary(self.flush_us),
+        }
+
+    @staticmethod
+    def _summary(histogram):
+        return {
+            'count': histogram.count,
+            'p50': histogram.quantile(0.5) / 1000,
+            'p95': histogram.quantile(0.95) / 1000,
+            'p99': histogram.quantile(0.99) / 1000,
+            'max': histogram.max / 1000,
+        }
+
+
+position_buffer = PositionBuffer.from_settings()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        position_buffer.flush()
+    except Exception:
+        logger.exception('No se pudieron escribir las posiciones pendientes')
+
+
+def ingest(items):
+    """
+    Valida y encola una lista de reportes. Retorna ``(aceptados, errores)``,
+    donde cada error es ``{'index', 'errors'}``.
+    """
+    received_at = timezone.now()
+    pings, errors = [], []
+    for index, item in enumerate(items):
+        ping, item_errors = parse_ping(item, received_at)
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        else:
+            pings.append(ping)
+    if getattr(settings, 'POSITION_FLUSH_THREAD', True):
+        position_buffer.ensure_flusher()
+    position_buffer.add(pings)
+    return len(pings), errors
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Unit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('unit_type', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('available', 'Disponible'), ('assigned', 'Asignada'), ('out_of_service', 'Fuera de servicio')], default='available', max_length=20)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('cell', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('position_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Unidad',
+                'verbose_name_plural': 'Unidades',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('priority', models.PositiveSmallIntegerField(choices=[(1, 'Crítica'), (2, 'Alta'), (3, 'Media'), (4, 'Baja')], default=3)),
+                ('status', models.CharField(choices=[('open', 'Abierto'), ('dispatched', 'Despachado'), ('closed', 'Cerrado')], default='open', max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reported_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reported_incidents', to=settings.AUTH_USER_MODEL)),
+                ('assigned_unit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incidents', to='dashboard.unit')),
+            ],
+            options={
+                'verbose_name': 'Incidente',
+                'verbose_name_plural': 'Incidentes',
+                'ordering': ['priority', 'created_at'],
+            },
+        ),
+    ]
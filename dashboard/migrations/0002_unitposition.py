@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField()),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='dashboard.unit')),
+            ],
+            options={
+                'verbose_name': 'Posición de Unidad',
+                'verbose_name_plural': 'Posiciones de Unidades',
+                'indexes': [models.Index(fields=['unit', 'recorded_at'], name='dashboard_u_unit_id_8c7c1b_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,111 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class Unit(models.Model):
+    """
+    Unidad de respuesta (ambulancia, patrulla, bomberos...) con su última
+    posición reportada.
+
+    ``cell`` es la celda de la grilla espacial (ver dashboard/spatial.py) en la
+    que se encuentra la unidad; se recalcula al guardar y permite consultar por
+    vecindad en la base de datos sin recorrer toda la tabla.
+    """
+    AVAILABLE = 'available'
+    ASSIGNED = 'assigned'
+    OUT_OF_SERVICE = 'out_of_service'
+    STATUS_CHOICES = [
+        (AVAILABLE, 'Disponible'),
+        (ASSIGNED, 'Asignada'),
+        (OUT_OF_SERVICE, 'Fuera de servicio'),
+    ]
+
+    code = models.CharField(max_length=50, unique=True)
+    unit_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=AVAILABLE)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    cell = models.CharField(max_length=32, blank=True, db_index=True)
+    position_updated_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        from .spatial import cell_key
+        self.cell = cell_key(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'cell'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = 'Unidad'
+        verbose_name_plural = 'Unidades'
+        ordering = ['code']
+
+
+class Incident(models.Model):
+    """
+    Incidente reportado que requiere el despacho de una o más unidades.
+
+    Mientras está abierto y sin tomar, el incidente espera en la cola de
+    despacho (ver dashboard/dispatch.py). Un operador lo toma fijando
+    ``claimed_by``/``claimed_at``; la toma vence a los ``DISPATCH_CLAIM_TTL``
+    segundos si no se despacha.
+    """
+    PRIORITY_CHOICES = [
+        (1, 'Crítica'),
+        (2, 'Alta'),
+        (3, 'Media'),
+        (4, 'Baja'),
+    ]
+    OPEN = 'open'
+    DISPATCHED = 'dispatched'
+    CLOSED = 'closed'
+    STATUS_CHOICES = [
+        (OPEN, 'Abierto'),
+        (DISPATCHED, 'Despachado'),
+        (CLOSED, 'Cerrado'),
+    ]
+
+    title = models.CharField(max_length=200)
+    description = models.TextField(null=True, blank=True)
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=3)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=OPEN)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    reported_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='reported_incidents')
+    assigned_unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, related_name='incidents')
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_incidents')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = 'Incidente'
+        verbose_name_plural = 'Incidentes'
+        ordering = ['priority', 'created_at']
+        indexes = [models.Index(fields=['status', 'priority', 'created_at'])]
+
+
+class UnitPosition(models.Model):
+    """
+    Historial de posiciones reportadas por las unidades (sólo inserción).
+    La última posición conocida se guarda en ``Unit``; ver dashboard/ingestion.py.
+    """
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='positions')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()  # Hora del dispositivo
+    received_at = models.DateTimeField()  # Hora de llegada al servidor
+
+    class Meta:
+        verbose_name = 'Posición de Unidad'
+        verbose_name_plural = 'Posiciones de Unidades'
+        indexes = [models.Index(fields=['unit', 'recorded_at'])]
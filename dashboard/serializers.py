@@ -0,0 +1,48 @@
+from rest_framework import serializers
+
+from .models import Incident, Unit
+
+
+class UnitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Unit
+        fields = ['id', 'code', 'unit_type', 'status', 'latitude', 'longitude', 'position_updated_at']
+        read_only_fields = ['position_updated_at']
+
+
+class IncidentSerializer(serializers.ModelSerializer):
+    assigned_unit = UnitSerializer(read_only=True)
+
+    class Meta:
+        model = Incident
+        fields = ['id', 'title', 'description', 'priority', 'status', 'latitude', 'longitude',
+                  'reported_by', 'assigned_unit', 'claimed_by', 'claimed_at', 'created_at']
+        read_only_fields = ['status', 'reported_by', 'claimed_by', 'claimed_at', 'created_at']
+
+    def validate_latitude(self, value):
+        if not -90 <= value <= 90:
+            raise serializers.ValidationError('La latitud debe estar entre -90 y 90.')
+        return value
+
+    def validate_longitude(self, value):
+        if not -180 <= value <= 180:
+            raise serializers.ValidationError('La longitud debe estar entre -180 y 180.')
+        return value
+
+
+class PositionSerializer(serializers.Serializer):
+    """
+    Posición reportada por una unidad.
+    """
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
+
+class NearestUnitSerializer(UnitSerializer):
+    distance_km = serializers.SerializerMethodField()
+
+    class Meta(UnitSerializer.Meta):
+        fields = UnitSerializer.Meta.fields + ['distance_km']
+
+    def get_distance_km(self, obj):
+        return round(self.context['distances'][obj.id], 3)
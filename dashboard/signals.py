@@ -0,0 +1,62 @@
+# dashboard/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .dispatch import dispatch_queue
+from .events import hub, incident_payload, publish_deleted, publish_unit
+from .models import Incident, Unit
+from .spatial import unit_index
+
+
+@receiver(post_save, sender=Unit)
+def update_unit_index(sender, instance, **kwargs):
+    """
+    Cada posición o cambio de estado guardado se refleja en el índice espacial.
+    """
+    unit_index.update(instance)
+
+
+@receiver(post_delete, sender=Unit)
+def remove_from_unit_index(sender, instance, **kwargs):
+    unit_index.remove(instance.id)
+
+
+# Los eventos para las consolas (events.py) se publican al confirmar la
+# transacción, para no anunciar cambios que luego se revierten
+
+@receiver(post_save, sender=Unit)
+def publish_unit_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_unit(instance))
+
+
+@receiver(post_delete, sender=Unit)
+def publish_unit_deleted(sender, instance, **kwargs):
+    unit_id = instance.id
+    transaction.on_commit(lambda: publish_deleted('unit', unit_id))
+
+
+@receiver(post_save, sender=Incident)
+def publish_incident_change(sender, instance, **kwargs):
+    payload = incident_payload(instance)
+    transaction.on_commit(lambda: hub.publish('incident', 'incident:%d' % instance.id, payload))
+
+
+@receiver(post_delete, sender=Incident)
+def publish_incident_deleted(sender, instance, **kwargs):
+    incident_id = instance.id
+    transaction.on_commit(lambda: publish_deleted('incident', incident_id))
+
+
+@receiver(post_save, sender=Incident)
+def update_dispatch_queue(sender, instance, **kwargs):
+    """
+    La cola de despacho refleja los incidentes confirmados: entran al abrirse
+    y salen al tomarse, despacharse o cerrarse.
+    """
+    transaction.on_commit(lambda: dispatch_queue.update(instance))
+
+
+@receiver(post_delete, sender=Incident)
+def remove_from_dispatch_queue(sender, instance, **kwargs):
+    dispatch_queue.discard(instance.id)
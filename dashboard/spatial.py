@@ -0,0 +1,269 @@
+# dashboard/spatial.py
+"""
+Índice espacial en memoria para buscar las unidades más cercanas.
+
+Las posiciones se agrupan en una grilla de celdas de ``UNIT_INDEX_CELL_DEG``
+grados. ``GridIndex.nearest`` recorre anillos de celdas alrededor del punto y
+se detiene cuando las ``n`` mejores distancias (haversine) ya no pueden ser
+superadas por ninguna unidad de un anillo más externo; con unidades
+distribuidas en una ciudad sólo se revisan unas pocas celdas. La búsqueda
+está acotada: no pasa de ``UNIT_NEAREST_MAX_KM``, y si un anillo tiene más
+celdas que las ocupadas se revisan directamente las ocupadas, así que una
+unidad lejana o un filtro con pocas coincidencias no obligan a recorrer
+millones de celdas vacías. Un filtro sin ninguna unidad retorna enseguida.
+
+``unit_index`` contiene todas las unidades con posición. Se mantiene al día
+con las señales de ``Unit`` (ver signals.py) y se recarga completo cada
+``UNIT_INDEX_TTL`` segundos para incorporar cambios de otros procesos.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def get_cell_size():
+    return getattr(settings, 'UNIT_INDEX_CELL_DEG', 0.01)
+
+
+def cell_of(latitude, longitude, size=None):
+    size = size or get_cell_size()
+    return int(math.floor(latitude / size)), int(math.floor(longitude / size))
+
+
+def cell_key(latitude, longitude):
+    """
+    Clave de texto de la celda (columna ``Unit.cell``); vacía sin posición.
+    """
+    if latitude is None or longitude is None:
+        return ''
+    return '%d:%d' % cell_of(latitude, longitude)
+
+
+def neighbor_keys(latitude, longitude, rings=1):
+    """
+    Claves de las celdas a ``rings`` anillos o menos del punto, para filtrar
+    en la base de datos (``Unit.objects.filter(cell__in=...)``).
+    """
+    row, col = cell_of(latitude, longitude)
+    return [
+        '%d:%d' % (row + i, col + j)
+        for i in range(-rings, rings + 1)
+        for j in range(-rings, rings + 1)
+    ]
+
+
+class GridIndex:
+    """
+    Grilla de celdas ``(fila, columna) -> {id: entrada}``. Cada entrada es
+    ``(latitud, longitud, status, unit_type)``.
+    """
+
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size or get_cell_size()
+        self.cells = {}
+        self.entries = {}
+        self._cell_of_entry = {}
+        # (status, unit_type) -> unidades; descarta enseguida los filtros vacíos
+        self.counts = Counter()
+        # Extensión ocupada (fila/columna mín. y máx.); sólo crece, acota la búsqueda
+        self.bounds = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, unit_id, latitude, longitude, status, unit_type):
+        """
+        Agrega o mueve una unidad. Sin posición, la unidad sale del índice.
+        """
+        if latitude is None or longitude is None:
+            self.remove(unit_id)
+            return
+        cell = cell_of(latitude, longitude, self.cell_size)
+        with self._lock:
+            previous = self._cell_of_entry.get(unit_id)
+            if previous is not None:
+                self._uncount(self.entries[unit_id])
+            if previous is not None and previous != cell:
+                bucket = self.cells[previous]
+                del bucket[unit_id]
+                if not bucket:
+                    del self.cells[previous]
+            entry = (latitude, longitude, status, unit_type)
+            self.cells.setdefault(cell, {})[unit_id] = entry
+            self.entries[unit_id] = entry
+            self._cell_of_entry[unit_id] = cell
+            self.counts[status, unit_type] += 1
+            if self.bounds is None:
+                self.bounds = (cell[0], cell[0], cell[1], cell[1])
+            else:
+                min_row, max_row, min_col, max_col = self.bounds
+                self.bounds = (min(min_row, cell[0]), max(max_row, cell[0]),
+                               min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def remove(self, unit_id):
+        with self._lock:
+            cell = self._cell_of_entry.pop(unit_id, None)
+            if cell is None:
+                return
+            self._uncount(self.entries.pop(unit_id))
+            bucket = self.cells[cell]
+            del bucket[unit_id]
+            if not bucket:
+                del self.cells[cell]
+
+    def _uncount(self, entry):
+        key = entry[2], entry[3]
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+    def matches(self, statuses=None, unit_type=None):
+        """
+        ``True`` si alguna unidad pasa el filtro.
+        """
+        return any(
+            (statuses is None or status in statuses) and (unit_type is None or kind == unit_type)
+            for status, kind in list(self.counts)
+        )
+
+    def _ring(self, row, col, k):
+        if k == 0:
+            yield row, col
+            return
+        for j in range(col - k, col + k + 1):
+            yield row - k, j
+            yield row + k, j
+        for i in range(row - k + 1, row + k):
+            yield i, col - k
+            yield i, col + k
+
+    def _ring_bound_km(self, latitude, k):
+        """
+        Distancia mínima a cualquier punto fuera de los anillos ``0..k``.
+        """
+        if k <= 0:
+            return 0.0
+        span = k * self.cell_size
+        # Las celdas se angostan en longitud hacia los polos
+        shrink = math.cos(math.radians(min(90.0, abs(latitude) + span)))
+        return span * KM_PER_DEGREE * max(0.0, min(1.0, shrink))
+
+    def nearest(self, latitude, longitude, n=5, statuses=None, unit_type=None, max_km=None):
+        """
+        Las ``n`` unidades más cercanas como lista de ``(distancia_km, id)``
+        ordenada, filtrando opcionalmente por status y tipo. Con ``max_km``
+        se ignoran las unidades más lejanas.
+        """
+        if n <= 0 or not self.cells or not self.matches(statuses, unit_type):
+            return []
+        row, col = cell_of(latitude, longitude, self.cell_size)
+        cells = self.cells
+        min_row, max_row, min_col, max_col = self.bounds
+        max_k = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+        best = []  # heap de (-distancia, id) con las n mejores
+
+        def visit(bucket):
+            for unit_id, (lat, lon, status, kind) in list(bucket.items()):
+                if statuses is not None and status not in statuses:
+                    continue
+                if unit_type is not None and kind != unit_type:
+                    continue
+                distance = haversine_km(latitude, longitude, lat, lon)
+                if max_km is not None and distance > max_km:
+                    continue
+                if len(best) < n:
+                    heapq.heappush(best, (-distance, unit_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, unit_id))
+
+        for k in range(max_k + 1):
+            if 8 * k > len(cells):
+                # El anillo tiene más celdas que las ocupadas: se revisan las
+                # ocupadas que faltan en lugar de seguir con anillos vacíos
+                for (i, j), bucket in list(cells.items()):
+                    if max(abs(i - row), abs(j - col)) >= k:
+                        visit(bucket)
+                break
+            for cell in self._ring(row, col, k):
+                bucket = cells.get(cell)
+                if bucket:
+                    visit(bucket)
+            bound = self._ring_bound_km(latitude, k)
+            if max_km is not None and bound >= max_km:
+                break
+            if len(best) == n and -best[0][0] <= bound:
+                break
+        return sorted((-distance, unit_id) for distance, unit_id in best)
+
+
+class UnitIndex:
+    """
+    ``GridIndex`` de las unidades, cargado bajo demanda desde la base de datos.
+    """
+
+    def __init__(self, ttl=30, max_km=None):
+        self.ttl = ttl
+        self.max_km = max_km
+        self._grid = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(ttl=getattr(settings, 'UNIT_INDEX_TTL', 30),
+                   max_km=getattr(settings, 'UNIT_NEAREST_MAX_KM', None))
+
+    def load(self):
+        from .models import Unit
+        grid = GridIndex()
+        rows = Unit.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            'id', 'latitude', 'longitude', 'status', 'unit_type'
+        )
+        for unit_id, latitude, longitude, status, unit_type in rows.iterator(chunk_size=5000):
+            grid.update(unit_id, latitude, longitude, status, unit_type)
+        self._grid, self._loaded_at = grid, time.monotonic()
+        return grid
+
+    @property
+    def grid(self):
+        grid = self._grid
+        if grid is None or time.monotonic() - self._loaded_at >= self.ttl:
+            with self._lock:
+                grid = self._grid
+                if grid is None or time.monotonic() - self._loaded_at >= self.ttl:
+                    grid = self.load()
+        return grid
+
+    def update(self, unit):
+        if self._grid is not None:
+            self._grid.update(unit.id, unit.latitude, unit.longitude, unit.status, unit.unit_type)
+
+    def remove(self, unit_id):
+        if self._grid is not None:
+            self._grid.remove(unit_id)
+
+    def invalidate(self):
+        self._grid = None
+
+    def nearest(self, latitude, longitude, n=5, statuses=None, unit_type=None):
+        return self.grid.nearest(latitude, longitude, n, statuses, unit_type, self.max_km)
+
+
+unit_index = UnitIndex.from_settings()
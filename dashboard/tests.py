@@ -1,3 +1,452 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.blacklist import revoke_token
+from authentication.serializers import CustomTokenObtainPairSerializer
+from authentication.testing import QueryBudgetMixin
+from .dispatch import DispatchQueue, dispatch_queue
+from .events import RESYNC, EventHub, hub
+from .ingestion import PositionBuffer, parse_ping, position_buffer
+from .models import Incident, Unit, UnitPosition
+from .spatial import GridIndex, cell_key, haversine_km, unit_index
+
+
+# Centro de Lima como referencia para los datos de prueba
+CENTER = (-12.0464, -77.0428)
+
+
+def random_point(rng, spread=0.2):
+    return CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread)
+
+
+class GridIndexTests(TestCase):
+    def test_nearest_matches_full_scan(self):
+        rng = random.Random(7)
+        grid = GridIndex(cell_size=0.01)
+        points = {}
+        for unit_id in range(2000):
+            lat, lon = random_point(rng)
+            status = Unit.AVAILABLE if unit_id % 3 else Unit.ASSIGNED
+            grid.update(unit_id, lat, lon, status, 'ambulancia')
+            points[unit_id] = (lat, lon, status)
+
+        for _ in range(50):
+            lat, lon = random_point(rng, spread=0.3)
+            expected = sorted(
+                (haversine_km(lat, lon, p_lat, p_lon), unit_id)
+                for unit_id, (p_lat, p_lon, status) in points.items() if status == Unit.AVAILABLE
+            )[:5]
+            self.assertEqual(grid.nearest(lat, lon, 5, statuses={Unit.AVAILABLE}), expected)
+
+    def test_outlier_and_empty_filters_stay_bounded(self):
+        grid = GridIndex(cell_size=0.01)
+        for unit_id in range(100):
+            grid.update(unit_id, *random_point(random.Random(unit_id)), Unit.AVAILABLE, 'ambulancia')
+        grid.update(100, 0.0, 0.0, Unit.AVAILABLE, 'patrulla')  # ~1500 km de Lima
+        with mock.patch.object(grid, '_ring', wraps=grid._ring) as ring:
+            self.assertEqual(grid.nearest(*CENTER, n=5, unit_type='bomberos'), [])
+            self.assertEqual(ring.call_count, 0)
+            # Menos coincidencias que n: revisa las celdas ocupadas, no los anillos vacíos
+            self.assertEqual([unit_id for _, unit_id in grid.nearest(*CENTER, n=5, unit_type='patrulla')], [100])
+            self.assertLess(ring.call_count, 20)
+            self.assertEqual(grid.nearest(*CENTER, n=5, unit_type='patrulla', max_km=100), [])
+        # Lejos de todas las unidades
+        self.assertEqual(len(grid.nearest(40.0, 0.0, n=5)), 5)
+
+    def test_update_moves_and_remove_drops_units(self):
+        grid = GridIndex(cell_size=0.01)
+        grid.update(1, *CENTER, Unit.AVAILABLE, 'patrulla')
+        grid.update(2, CENTER[0] + 0.05, CENTER[1], Unit.AVAILABLE, 'patrulla')
+        self.assertEqual(grid.nearest(*CENTER, n=1)[0][1], 1)
+
+        grid.update(1, CENTER[0] + 0.5, CENTER[1], Unit.AVAILABLE, 'patrulla')
+        self.assertEqual(grid.nearest(*CENTER, n=1)[0][1], 2)
+        self.assertEqual(sum(len(bucket) for bucket in grid.cells.values()), 2)
+
+        grid.remove(2)
+        self.assertEqual([unit_id for _, unit_id in grid.nearest(*CENTER, n=5)], [1])
+        grid.update(1, None, None, Unit.AVAILABLE, 'patrulla')
+        self.assertEqual(grid.nearest(*CENTER, n=5), [])
+
+
+class NearestUnitsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        unit_index.invalidate()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.near = Unit.objects.create(code='A-1', unit_type='ambulancia',
+                                        latitude=CENTER[0] + 0.001, longitude=CENTER[1])
+        self.far = Unit.objects.create(code='A-2', unit_type='ambulancia',
+                                       latitude=CENTER[0] + 0.05, longitude=CENTER[1])
+        self.busy = Unit.objects.create(code='A-3', unit_type='ambulancia', status=Unit.ASSIGNED,
+                                        latitude=CENTER[0], longitude=CENTER[1])
+        self.incident = Incident.objects.create(title='Choque', latitude=CENTER[0], longitude=CENTER[1])
+
+    def test_cell_is_stored_on_save(self):
+        self.assertEqual(self.near.cell, cell_key(self.near.latitude, self.near.longitude))
+        self.near.latitude += 1
+        self.near.save(update_fields=['latitude'])
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.cell, cell_key(self.near.latitude, self.near.longitude))
+
+    def test_nearest_available_units_for_incident(self):
+        url = '/dashboard/incidents/%d/nearest-units/' % self.incident.id
+        self.client.get(url)  # carga el índice
+        with self.assertMaxQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([unit['code'] for unit in response.json()], ['A-1', 'A-2'])
+        self.assertLess(response.json()[0]['distance_km'], response.json()[1]['distance_km'])
+
+    def test_reported_position_updates_index(self):
+        response = self.client.post('/dashboard/units/%d/position/' % self.far.id,
+                                    {'latitude': CENTER[0], 'longitude': CENTER[1]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/dashboard/units/nearest/', {'lat': CENTER[0], 'lon': CENTER[1], 'n': 1})
+        self.assertEqual(response.json()[0]['code'], 'A-2')
+
+    def test_invalid_point(self):
+        response = self.client.get('/dashboard/units/nearest/', {'lat': 'x', 'lon': CENTER[1]})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(POSITION_FLUSH_THREAD=False)
+class PositionIngestionTests(TestCase):
+    def setUp(self):
+        position_buffer.flush()
+        position_buffer.reset_stats()
+        unit_index.invalidate()
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.client.cookies['access_token'] = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.unit = Unit.objects.create(code='P-1', unit_type='patrulla', latitude=CENTER[0], longitude=CENTER[1])
+
+    def pings(self, *items):
+        now = timezone.now()
+        return [parse_ping(item, now)[0] for item in items]
+
+    def test_flush_keeps_history_and_latest_position(self):
+        buffer = PositionBuffer(size=100, interval=60)
+        now = timezone.now().timestamp()
+        buffer.add(self.pings(
+            {'unit_id': self.unit.id, 'latitude': -12.1, 'longitude': -77.1, 'recorded_at': now - 2},
+            {'unit_id': self.unit.id, 'latitude': -12.3, 'longitude': -77.3, 'recorded_at': now},
+            {'unit_id': self.unit.id, 'latitude': -12.2, 'longitude': -77.2, 'recorded_at': now - 1},
+            {'unit_id': 999999, 'latitude': 0, 'longitude': 0},
+        ))
+        self.assertEqual(UnitPosition.objects.count(), 0)
+
+        with self.assertNumQueries(5):  # unidades, savepoint, insert, update, release
+            self.assertEqual(buffer.flush(), 3)
+        self.unit.refresh_from_db()
+        self.assertEqual((self.unit.latitude, self.unit.longitude), (-12.3, -77.3))
+        self.assertEqual(self.unit.cell, cell_key(-12.3, -77.3))
+        self.assertEqual(UnitPosition.objects.filter(unit=self.unit).count(), 3)
+        stats = buffer.stats()
+        self.assertEqual((stats['written'], stats['dropped'], stats['pending']), (3, 1, 0))
+        self.assertEqual(stats['buffer_lag_ms']['count'], 4)
+
+        # Un reporte atrasado va al historial pero no pisa la última posición
+        buffer.add(self.pings({'unit_id': self.unit.id, 'latitude': -12.9, 'longitude': -77.9,
+                               'recorded_at': now - 10}))
+        buffer.flush()
+        self.unit.refresh_from_db()
+        self.assertEqual(self.unit.latitude, -12.3)
+        self.assertEqual(UnitPosition.objects.count(), 4)
+
+    def test_flushes_on_size_threshold(self):
+        buffer = PositionBuffer(size=2, interval=60)
+        buffer.add(self.pings({'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1}))
+        self.assertEqual(buffer.pending, 1)
+        buffer.add(self.pings({'unit_id': self.unit.id, 'latitude': 2, 'longitude': 2}))
+        self.assertEqual(buffer.pending, 0)
+        self.assertEqual(UnitPosition.objects.count(), 2)
+
+    def test_ndjson_endpoint(self):
+        body = '\n'.join(json.dumps(item) for item in [
+            {'unit_id': self.unit.id, 'latitude': CENTER[0] + 0.3, 'longitude': CENTER[1]},
+            {'unit_id': self.unit.id, 'latitude': 'norte', 'longitude': CENTER[1]},
+        ])
+        response = self.client.post('/dashboard/units/positions/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+
+        position_buffer.flush()
+        self.assertEqual(unit_index.nearest(CENTER[0] + 0.3, CENTER[1], n=1)[0][1], self.unit.id)
+        stats = self.client.get('/dashboard/units/positions/stats/').json()
+        self.assertEqual(stats['written'], 1)
+
+    def test_invalid_dates_are_item_errors(self):
+        now = timezone.now()
+        for value in (1e20, float('inf'), float('nan'), '2024-02-30T00:00:00', 'ayer'):
+            with self.subTest(recorded_at=value):
+                ping, errors = parse_ping({'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1,
+                                           'recorded_at': value}, now)
+                self.assertIsNone(ping)
+                self.assertEqual(list(errors), ['recorded_at'])
+
+        items = [
+            {'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1, 'recorded_at': 1e20},
+            {'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1, 'recorded_at': '2024-02-30T00:00:00'},
+            {'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1},
+        ]
+        response = self.client.post('/dashboard/units/positions/', items, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [0, 1])
+
+    def test_failed_flush_requeues_then_discards(self):
+        buffer = PositionBuffer(size=100, interval=60, max_attempts=2)
+        buffer.add(self.pings({'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1}))
+        with mock.patch.object(buffer, '_write', side_effect=RuntimeError('FK')), \
+                self.assertLogs('dashboard.ingestion', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+            self.assertEqual(buffer.pending, 1)
+            self.assertEqual(buffer.flush(), 0)
+        stats = buffer.stats()
+        self.assertEqual((stats['pending'], stats['failed_flushes'], stats['discarded']), (0, 2, 1))
+
+        # Tras un flush exitoso se reinicia la cuenta de fallos
+        buffer.add(self.pings({'unit_id': self.unit.id, 'latitude': 2, 'longitude': 2}))
+        with mock.patch.object(buffer, '_write', side_effect=RuntimeError('FK')), \
+                self.assertLogs('dashboard.ingestion', 'ERROR'):
+            buffer.flush()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer._failures, 0)
+
+    def test_rejects_when_buffer_is_full(self):
+        with self.settings(BULK_MAX_ITEMS=10):
+            position_buffer.max_pending, previous = 1, position_buffer.max_pending
+            try:
+                items = [{'unit_id': self.unit.id, 'latitude': 1, 'longitude': 1}] * 2
+                response = self.client.post('/dashboard/units/positions/', items, content_type='application/json')
+            finally:
+                position_buffer.max_pending = previous
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(position_buffer.pending, 0)
+
+
+class EventHubTests(TestCase):
+    async def test_fan_out_to_many_subscribers(self):
+        events_hub = EventHub(history_size=100, queue_size=100)
+        subscriptions = [events_hub.subscribe() for _ in range(1000)]
+        total = 50
+
+        async def consume(subscription):
+            received = []
+            while len(received) < total:
+                received.extend(await subscription.get(timeout=5))
+            return [event.seq for event in received]
+
+        consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+
+        def publish():
+            for incident_id in range(total):
+                events_hub.publish('incident', 'incident:%d' % incident_id, {'id': incident_id})
+
+        # Se publica desde otro hilo, como lo hacen las señales y la ingesta
+        thread = threading.Thread(target=publish)
+        thread.start()
+        results = await asyncio.wait_for(asyncio.gather(*consumers), timeout=30)
+        thread.join()
+        expected = list(range(1, total + 1))
+        self.assertTrue(all(result == expected for result in results))
+
+        for subscription in subscriptions:
+            subscription.close()
+        self.assertEqual(events_hub.subscriber_count, 0)
+
+    async def test_slow_subscriber_coalesces_then_resyncs(self):
+        events_hub = EventHub(history_size=100, queue_size=3)
+        subscription = events_hub.subscribe(types={'unit'})
+        for _ in range(5):
+            events_hub.publish('unit', 'unit:1', {'id': 1})
+        events_hub.publish('incident', 'incident:1', {'id': 1})
+        events_hub.publish('unit', 'unit:2', {'id': 2})
+        events = await subscription.get(timeout=1)
+        self.assertEqual([(event.key, event.seq) for event in events], [('unit:1', 5), ('unit:2', 7)])
+        self.assertEqual(subscription.coalesced, 4)
+
+        for unit_id in range(10, 15):
+            events_hub.publish('unit', 'unit:%d' % unit_id, {'id': unit_id})
+        events = await subscription.get(timeout=1)
+        self.assertEqual([event.type for event in events], [RESYNC])
+        self.assertEqual(events[0].id, events_hub.last_event_id)
+        self.assertEqual(subscription.dropped, 2)
+
+    async def test_resume_from_last_event_id(self):
+        events_hub = EventHub(history_size=5, queue_size=100)
+        for incident_id in range(8):
+            events_hub.publish('incident', 'incident:%d' % incident_id, {'id': incident_id})
+
+        subscription = events_hub.subscribe(last_event_id='%s-6' % events_hub.epoch)
+        self.assertEqual([event.seq for event in await subscription.get(timeout=1)], [7, 8])
+
+        # Fuera del historial, o de otro proceso/reinicio: hay que resincronizar
+        for last_event_id in ('%s-1' % events_hub.epoch, 'otra-7', 'basura'):
+            with self.subTest(last_event_id=last_event_id):
+                subscription = events_hub.subscribe(last_event_id=last_event_id)
+                self.assertEqual([event.type for event in await subscription.get(timeout=1)], [RESYNC])
+
+
+class EventFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'x')
+        self.token = str(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.async_client = AsyncClient()
+        self.async_client.cookies['access_token'] = self.token
+
+    def test_model_changes_are_published_on_commit(self):
+        start = hub.published
+        with self.captureOnCommitCallbacks(execute=True):
+            unit = Unit.objects.create(code='A-1', unit_type='ambulancia', latitude=CENTER[0], longitude=CENTER[1])
+            Incident.objects.create(title='Choque', latitude=CENTER[0], longitude=CENTER[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.delete()
+        events = [event for event in hub.history if event.seq > start]
+        self.assertEqual([event.type for event in events], ['unit', 'incident', 'unit.deleted'])
+        self.assertEqual(events[0].data['code'], 'A-1')
+
+    async def test_stream_requires_token(self):
+        response = await AsyncClient().get('/dashboard/events/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_delivers_events(self):
+        response = await self.async_client.get('/dashboard/events/?types=incident')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+
+        hub.publish('unit', 'unit:1', {'id': 1})
+        event = hub.publish('incident', 'incident:1', {'id': 1, 'title': 'Incendio'})
+        chunk = (await asyncio.wait_for(anext(chunks), timeout=5)).decode()
+        self.assertEqual(chunk, 'id: %s\nevent: incident\ndata: {"id":1,"title":"Incendio"}\n\n' % event.id)
+        await chunks.aclose()
+
+    async def test_stream_closes_when_token_expires(self):
+        token = AccessToken(self.token)
+        # El middleware valida el token al conectar; para el stream ya venció
+        with mock.patch('dashboard.views.time.time', return_value=token['exp'] + 1):
+            response = await self.async_client.get('/dashboard/events/')
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].startswith(b'retry:'))
+
+    @override_settings(TOKEN_BLACKLIST_REVOKE_ACCESS=True, EVENTS_HEARTBEAT=0.05)
+    async def test_stream_closes_when_token_is_revoked(self):
+        response = await self.async_client.get('/dashboard/events/')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        await sync_to_async(revoke_token)(AccessToken(self.token))
+        remaining = await asyncio.wait_for(self.drain(chunks), timeout=5)
+        self.assertTrue(all(chunk == b': ping\n\n' for chunk in remaining))
+
+    @staticmethod
+    async def drain(chunks):
+        return [chunk async for chunk in chunks]
+
+    async def test_long_poll_resumes_from_cursor(self):
+        cursor = hub.last_event_id
+        first = hub.publish('incident', 'incident:1', {'id': 1})
+        second = hub.publish('incident', 'incident:2', {'id': 2})
+        response = await self.async_client.get('/dashboard/events/poll/', {'last_event_id': cursor})
+        body = response.json()
+        self.assertEqual([event['id'] for event in body['events']], [first.id, second.id])
+        self.assertEqual(body['last_event_id'], second.id)
+
+        response = await self.async_client.get('/dashboard/events/poll/', {
+            'last_event_id': body['last_event_id'], 'timeout': '0.05'
+        })
+        self.assertEqual(response.json(), {'events': [], 'last_event_id': second.id})
+
+
+class DispatchQueueTests(TestCase):
+    def setUp(self):
+        dispatch_queue.invalidate()
+        self.operators = [User.objects.create_user('op%d' % i, 'op%d@example.com' % i, 'x') for i in range(2)]
+        rng = random.Random(11)
+        for i in range(40):
+            latitude, longitude = random_point(rng, 0.3)
+            Incident.objects.create(title='Incidente %d' % i, priority=rng.randint(1, 4),
+                                    latitude=latitude, longitude=longitude)
+
+    def expected_order(self, queue, zones=None):
+        incidents = Incident.objects.filter(status=Incident.OPEN, claimed_by__isnull=True).order_by('priority', 'created_at', 'id')
+        return [incident.id for incident in incidents
+                if zones is None or queue.zone_of(incident.latitude, incident.longitude) in zones]
+
+    def test_peek_and_pop_follow_priority_and_age(self):
+        queue = DispatchQueue(zone_deg=0.1, ttl=3600)
+        self.assertEqual(queue.peek(n=100), self.expected_order(queue))
+        zones = sorted(queue.counts())[:2]
+        self.assertEqual(queue.peek(zones, n=100), self.expected_order(queue, zones))
+
+        rng = random.Random(5)
+        for incident in Incident.objects.order_by('?')[:20]:
+            incident.priority = rng.randint(1, 4)
+            incident.latitude, incident.longitude = random_point(rng, 0.3)
+            incident.status = rng.choice([Incident.OPEN, Incident.OPEN, Incident.CLOSED])
+            incident.save()
+            queue.update(incident)
+            queue.update(incident)  # Reagregar la misma entrada no la duplica
+        expected = self.expected_order(queue)
+        self.assertEqual(queue.peek(n=100), expected)
+        self.assertEqual(sum(queue.counts().values()), len(expected))
+        self.assertEqual([queue.pop() for _ in range(5)], expected[:5])
+
+    def test_claim_never_hands_out_the_same_incident(self):
+        # Dos procesos con su propia cola ven el mismo primer incidente
+        first, second = DispatchQueue(ttl=3600), DispatchQueue(ttl=3600)
+        expected = self.expected_order(first)
+        self.assertEqual(first.peek(n=1), second.peek(n=1))
+
+        claimed = [first.claim(self.operators[0].id), second.claim(self.operators[1].id)]
+        self.assertEqual(claimed, expected[:2])
+        incident = Incident.objects.get(pk=expected[0])
+        self.assertEqual(incident.claimed_by, self.operators[0])
+
+        # Una toma vencida se puede volver a tomar
+        Incident.objects.filter(pk=expected[1]).update(claimed_at=timezone.now() - timezone.timedelta(hours=1))
+        third = DispatchQueue(ttl=3600)
+        self.assertEqual(third.claim(self.operators[0].id), expected[1])
+
+    def test_signals_keep_queue_in_sync(self):
+        dispatch_queue.peek()
+        with self.captureOnCommitCallbacks(execute=True):
+            urgent = Incident.objects.create(title='Incendio', priority=1, latitude=CENTER[0], longitude=CENTER[1])
+        self.assertIn(urgent.id, dispatch_queue.peek(n=100))
+        self.assertEqual(dispatch_queue.peek(n=100), self.expected_order(dispatch_queue))
+        with self.captureOnCommitCallbacks(execute=True):
+            urgent.status = Incident.DISPATCHED
+            urgent.save()
+        self.assertNotIn(urgent.id, dispatch_queue.peek(n=100))
+
+    def test_claim_and_release_endpoints(self):
+        self.client.cookies['access_token'] = str(
+            CustomTokenObtainPairSerializer.get_token(self.operators[0]).access_token
+        )
+        expected = self.expected_order(dispatch_queue)
+        response = self.client.get('/dashboard/dispatch/queue/', {'n': 3})
+        self.assertEqual([incident['id'] for incident in response.json()['incidents']], expected[:3])
+
+        response = self.client.post('/dashboard/dispatch/claim/', {}, content_type='application/json')
+        self.assertEqual(response.json()['id'], expected[0])
+        self.assertEqual(response.json()['claimed_by'], self.operators[0].id)
+
+        response = self.client.post('/dashboard/dispatch/%d/release/' % expected[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dispatch_queue.peek(n=1), [expected[0]])
+        response = self.client.post('/dashboard/dispatch/%d/release/' % expected[0])
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/dashboard/dispatch/claim/', {'zones': ['0:0']}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,25 @@
+from django.urls import path
+from dashboard import views
+
+urlpatterns = [
+    # Incidentes
+    path('incidents/', views.incident_list, name='incident-list'),
+    path('incidents/create/', views.create_incident, name='incident-create'),
+    path('incidents/<int:incident_id>/nearest-units/', views.incident_nearest_units, name='incident-nearest-units'),
+
+    # Cola de despacho
+    path('dispatch/queue/', views.dispatch_queue_view, name='dispatch-queue'),
+    path('dispatch/claim/', views.claim_incident, name='dispatch-claim'),
+    path('dispatch/<int:incident_id>/release/', views.release_incident, name='dispatch-release'),
+
+    # Unidades
+    path('units/', views.unit_list, name='unit-list'),
+    path('units/nearest/', views.nearest_units, name='unit-nearest'),
+    path('units/<int:unit_id>/position/', views.report_position, name='unit-position'),
+    path('units/positions/', views.ingest_positions, name='unit-positions-ingest'),
+    path('units/positions/stats/', views.ingestion_stats, name='unit-positions-stats'),
+
+    # Cambios en vivo para las consolas
+    path('events/', views.event_feed, name='event-feed'),
+    path('events/poll/', views.event_poll, name='event-poll'),
+]
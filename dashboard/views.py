@@ -1,3 +1,287 @@
-from django.shortcuts import render
+import time
 
-# Create your views here.
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from authentication.async_views import async_authenticated
+from authentication.blacklist import revoke_access_tokens_enabled, revoked_tokens
+from authentication.parsers import NDJSONParser
+from authentication.queries import plan_queryset
+from authentication.routes import RoutePolicyPermission
+from authentication.views import get_bulk_items
+from .dispatch import dispatch_queue
+from .events import event_as_dict, format_sse, hub, parse_types, publish_incident
+from .ingestion import BufferFull, ingest, position_buffer
+from .models import Incident, Unit
+from .serializers import IncidentSerializer, NearestUnitSerializer, PositionSerializer, UnitSerializer
+from .spatial import unit_index
+
+
+# Máximo de unidades por consulta de cercanía
+MAX_NEAREST = 50
+
+
+def get_nearest_limit(request, default=5):
+    try:
+        limit = int(request.query_params.get('n', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_NEAREST))
+
+
+def nearest_units_response(latitude, longitude, request):
+    """
+    Unidades disponibles más cercanas al punto, ordenadas por distancia. La
+    búsqueda usa el índice espacial; sólo se consultan las ``n`` unidades
+    encontradas.
+    """
+    nearest = unit_index.nearest(
+        latitude, longitude,
+        n=get_nearest_limit(request),
+        statuses={Unit.AVAILABLE},
+        unit_type=request.query_params.get('unit_type') or None,
+    )
+    distances = {unit_id: distance for distance, unit_id in nearest}
+    units = Unit.objects.in_bulk(list(distances))
+    ordered = [units[unit_id] for _, unit_id in nearest if unit_id in units]
+    serializer = NearestUnitSerializer(ordered, many=True, context={'distances': distances})
+    return Response(serializer.data)
+
+
+# Vista para listar incidentes (?status=open|dispatched|closed)
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def incident_list(request):
+    incidents = plan_queryset(Incident.objects.all(), IncidentSerializer)
+    incident_status = request.query_params.get('status')
+    if incident_status:
+        incidents = incidents.filter(status=incident_status)
+    serializer = IncidentSerializer(incidents, many=True)
+    return Response(serializer.data)
+
+
+# Vista para registrar un incidente
+@api_view(['POST'])
+@permission_classes([RoutePolicyPermission])
+def create_incident(request):
+    serializer = IncidentSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(reported_by_id=request.user.id)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_zones(value):
+    """
+    Zonas de la cola de despacho en ``value`` (lista o texto separado por
+    comas); ``None`` son todas.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    zones = [zone.strip() for zone in value or [] if isinstance(zone, str) and zone.strip()]
+    return zones or None
+
+
+# Cola de despacho: los próximos ?n incidentes (?zone=z1,z2) y los pendientes
+# por zona. Sale de la cola en memoria, sin ORDER BY sobre la tabla.
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def dispatch_queue_view(request):
+    incident_ids = dispatch_queue.peek(get_zones(request.query_params.get('zone')), n=get_nearest_limit(request, 20))
+    incidents = plan_queryset(Incident.objects.filter(id__in=incident_ids), IncidentSerializer).in_bulk()
+    ordered = [incidents[incident_id] for incident_id in incident_ids if incident_id in incidents]
+    return Response({
+        'zones': dispatch_queue.counts(),
+        'incidents': IncidentSerializer(ordered, many=True).data,
+    })
+
+
+# Vista para que un operador tome el siguiente incidente de sus zonas
+# ({"zones": [...]} opcional). Dos operadores nunca reciben el mismo.
+@api_view(['POST'])
+@permission_classes([RoutePolicyPermission])
+def claim_incident(request):
+    incident_id = dispatch_queue.claim(request.user.id, get_zones(request.data.get('zones')))
+    if incident_id is None:
+        return Response({
+            'status': 'error',
+            'message': 'No hay incidentes pendientes'
+        }, status=status.HTTP_404_NOT_FOUND)
+    incident = plan_queryset(Incident.objects.all(), IncidentSerializer).get(pk=incident_id)
+    publish_incident(incident)
+    return Response(IncidentSerializer(incident).data)
+
+
+# Vista para devolver a la cola un incidente tomado por el operador
+@api_view(['POST'])
+@permission_classes([RoutePolicyPermission])
+def release_incident(request, incident_id):
+    if not dispatch_queue.release(incident_id, request.user.id):
+        return Response({
+            'status': 'error',
+            'message': 'El incidente no está tomado por este usuario'
+        }, status=status.HTTP_404_NOT_FOUND)
+    publish_incident(Incident.objects.get(pk=incident_id))
+    return Response({'status': 'success'})
+
+
+# Unidades disponibles más cercanas a un incidente (?n=5&unit_type=...)
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def incident_nearest_units(request, incident_id):
+    incident = get_object_or_404(Incident.objects.only('latitude', 'longitude'), pk=incident_id)
+    return nearest_units_response(incident.latitude, incident.longitude, request)
+
+
+# Vista para listar unidades
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def unit_list(request):
+    serializer = UnitSerializer(Unit.objects.all(), many=True)
+    return Response(serializer.data)
+
+
+# Unidades disponibles más cercanas a un punto (?lat=..&lon=..&n=5)
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def nearest_units(request):
+    serializer = PositionSerializer(data={
+        'latitude': request.query_params.get('lat'),
+        'longitude': request.query_params.get('lon'),
+    })
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return nearest_units_response(serializer.validated_data['latitude'], serializer.validated_data['longitude'], request)
+
+
+# Vista para que una unidad reporte su posición
+@api_view(['POST'])
+@permission_classes([RoutePolicyPermission])
+def report_position(request, unit_id):
+    serializer = PositionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    unit = get_object_or_404(Unit, pk=unit_id)
+    unit.latitude = serializer.validated_data['latitude']
+    unit.longitude = serializer.validated_data['longitude']
+    unit.position_updated_at = timezone.now()
+    # save() recalcula la celda; la señal post_save actualiza el índice
+    unit.save(update_fields=['latitude', 'longitude', 'position_updated_at', 'updated_at'])
+    return Response(UnitSerializer(unit).data)
+
+
+# Ingesta de posiciones en lote (arreglo JSON o NDJSON, un reporte por
+# elemento). Los reportes se escriben en diferido (ver ingestion.py), por eso
+# la respuesta es 202.
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@permission_classes([RoutePolicyPermission])
+def ingest_positions(request):
+    items, error = get_bulk_items(request)
+    if error:
+        return error
+    try:
+        accepted, errors = ingest(items)
+    except BufferFull:
+        return Response({
+            'status': 'error',
+            'message': 'Ingesta saturada, intente de nuevo en unos segundos'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+    return Response({
+        'status': 'accepted' if not errors else 'partial',
+        'accepted': accepted,
+        'errors': errors
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+# Estado del búfer de ingesta: pendientes, escritos y retraso (ms)
+@api_view(['GET'])
+@permission_classes([RoutePolicyPermission])
+def ingestion_stats(request):
+    return Response(position_buffer.stats())
+
+
+async def stream_events(subscription, heartbeat, retry_ms, token=None):
+    """
+    Cuerpo del stream SSE: los eventos de la suscripción y un comentario
+    cada ``heartbeat`` segundos para que los proxies no corten la conexión.
+    Al desconectarse el cliente, Django cancela el stream y la suscripción
+    se cierra.
+
+    El token sólo se valida al conectar, así que el stream se cierra cuando
+    ``token`` vence y, con ``TOKEN_BLACKLIST_REVOKE_ACCESS``, cuando se revoca
+    (se verifica cada ``heartbeat`` segundos). El navegador reconecta y la
+    nueva conexión necesita un token válido.
+    """
+    expires_at = token['exp'] if token is not None else None
+    next_check = time.time() + heartbeat
+    try:
+        yield 'retry: %d\n\n' % retry_ms
+        while True:
+            timeout = heartbeat if expires_at is None else min(heartbeat, expires_at - time.time())
+            if timeout <= 0:
+                return
+            events = await subscription.get(timeout)
+            if token is not None and time.time() >= next_check:
+                next_check = time.time() + heartbeat
+                if revoke_access_tokens_enabled() and await revoked_tokens.ais_revoked(token[jwt_settings.JTI_CLAIM]):
+                    return
+            if events:
+                yield ''.join(format_sse(event) for event in events)
+            else:
+                yield ': ping\n\n'
+    finally:
+        subscription.close()
+
+
+# Feed de cambios de incidentes y unidades (Server-Sent Events, requiere ASGI).
+# ?types=incident,unit filtra por tipo; el navegador envía Last-Event-ID al
+# reconectarse y se retoma desde ahí (ver events.py).
+@require_GET
+@async_authenticated
+async def event_feed(request):
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    subscription = hub.subscribe(parse_types(request.GET.get('types')), last_event_id)
+    response = StreamingHttpResponse(
+        stream_events(
+            subscription,
+            heartbeat=getattr(settings, 'EVENTS_HEARTBEAT', 15),
+            retry_ms=getattr(settings, 'EVENTS_RETRY_MS', 3000),
+            token=request.auth,
+        ),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx no debe acumular el stream
+    return response
+
+
+# Alternativa long-poll al feed SSE: espera hasta ?timeout segundos el primer
+# lote de eventos posteriores a ?last_event_id. La respuesta trae el cursor
+# para la siguiente consulta.
+@require_GET
+@async_authenticated
+async def event_poll(request):
+    max_timeout = getattr(settings, 'EVENTS_POLL_TIMEOUT', 25)
+    try:
+        timeout = min(float(request.GET.get('timeout', max_timeout)), max_timeout)
+    except ValueError:
+        timeout = max_timeout
+    last_event_id = request.GET.get('last_event_id') or hub.last_event_id
+    subscription = hub.subscribe(parse_types(request.GET.get('types')), last_event_id)
+    try:
+        events = await subscription.get(max(0.0, timeout))
+    finally:
+        subscription.close()
+    return JsonResponse({
+        'events': [event_as_dict(event) for event in events],
+        'last_event_id': events[-1].id if events else last_event_id,
+    })
@@ -46,6 +46,18 @@ export const authAPI = {
         }
     },
 
+    async refreshToken() {
+        try {
+            const response = await api.post('/api/auth/refresh/')
+            return response.data
+        } catch (error) {
+            throw {
+                message: error.response?.data?.message || 'Sesión expirada',
+                status: error.response?.status
+            }
+        }
+    },
+
     async getUserInfo() {
         try {
             const response = await api.get('/api/auth/info/')